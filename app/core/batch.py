@@ -0,0 +1,411 @@
+"""批处理（同一工作流处理多张输入图像）"""
+import asyncio
+import glob
+import os
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from app.models.workflow import Workflow
+from app.models.run import NodeStatus, RunStatus
+from app.core.nodes.base import NodeContext
+from app.core.plan import ExecutionPlan
+from app.core.stacking import StackedRunner
+from app.core.workflow import WorkflowEngine
+
+logger = logging.getLogger(__name__)
+
+
+def expand_inputs(
+    paths: Optional[List[str]] = None,
+    upload_ids: Optional[List[str]] = None,
+    pattern: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """
+    展开批处理输入为输入节点的参数
+
+    Returns:
+        [{"path", "upload_id"}]，按 paths、upload_ids、通配符匹配结果（排序后）的顺序
+    """
+    inputs = [{"path": path, "upload_id": ""} for path in paths or []]
+    inputs.extend({"path": "", "upload_id": upload_id} for upload_id in upload_ids or [])
+    if pattern:
+        inputs.extend(
+            {"path": path, "upload_id": ""}
+            for path in sorted(glob.glob(pattern, recursive=True))
+            if os.path.isfile(path)
+        )
+    return inputs
+
+
+def resolve_input_node(plan: ExecutionPlan, input_node: Optional[str] = None, node_type: str = "ImageInput") -> str:
+    """确定批处理（或流式处理）替换输入的输入节点"""
+    candidates = [
+        node_id for node_id, step in plan.steps.items()
+        if step.node_type == node_type and step.alias_of is None
+    ]
+    if input_node is not None:
+        if input_node not in plan.steps or plan.steps[input_node].node_type != node_type:
+            raise ValueError(f"节点 {input_node} 不是 {node_type} 节点")
+        if plan.steps[input_node].alias_of is not None:
+            # 与其他输入节点参数相同的输入节点已被合并，替换它的参数不会生效
+            raise ValueError(f"节点 {input_node} 与节点 {plan.steps[input_node].alias_of} 的输入相同，已被合并")
+        return input_node
+    if len(candidates) != 1:
+        raise ValueError(
+            f"工作流中没有 {node_type} 节点" if not candidates else f"工作流包含多个 {node_type} 节点，请指定 input_node"
+        )
+    return candidates[0]
+
+
+def write_outputs(node_outputs: Dict[str, Any], directory: str, prefix: str, format: str = "png") -> List[str]:
+    """
+    编码并保存运行输出中的图像
+
+    Args:
+        node_outputs: 运行的节点输出 {node_id: [NodeOutput]}
+        directory: 保存目录
+        prefix: 文件名前缀
+        format: 图像格式（png/jpg）
+
+    Returns:
+        保存的文件路径，文件名为 {prefix}_{node_id}_{output_name}.{format}
+    """
+    files = []
+    for node_id, outputs in node_outputs.items():
+        for output in outputs:
+            image = output.value
+            if not isinstance(image, np.ndarray) or image.ndim not in (2, 3):
+                continue
+            if image.dtype == np.bool_:
+                image = image.astype(np.uint8) * 255
+            ok, buffer = cv2.imencode(f".{format}", image)
+            if not ok:
+                raise ValueError(f"无法编码节点 {node_id} 的输出 {output.output_name}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{prefix}_{node_id}_{output.output_name}.{format}")
+            buffer.tofile(path)
+            files.append(path)
+    return files
+
+
+class BatchRunner:
+    """
+    批处理执行器
+
+    工作流只编译一次，每项只替换输入节点的参数（ExecutionPlan.with_params）；
+    所有项在一个后台任务中按读取、计算、写出三个阶段流水执行，各项作为独立的运行记录状态和输出。
+    """
+
+    def __init__(self, engine: WorkflowEngine):
+        self.engine = engine
+        self.stacker = StackedRunner(engine.executor)
+        self.batches: Dict[str, Dict[str, Any]] = {}  # batch_id -> batch_data
+
+    def create(
+        self,
+        workflow: Workflow,
+        batch_id: str,
+        inputs: List[Dict[str, str]],
+        input_node: Optional[str] = None,
+        outputs: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        创建批处理（编译计划并确定输入节点，参数错误时抛出 ValueError）
+
+        Args:
+            workflow: 工作流定义
+            batch_id: 批处理ID
+            inputs: 各项输入节点的参数（见 expand_inputs）
+            input_node: 替换输入的 ImageInput 节点ID
+            outputs: 需要输出的节点ID
+
+        Returns:
+            批处理数据
+        """
+        if not inputs:
+            raise ValueError("批处理没有输入")
+        plan = self.engine.select_plan(workflow, outputs)
+        input_node = resolve_input_node(plan, input_node)
+
+        batch_data = {
+            "batch_id": batch_id,
+            "workflow_id": workflow.workflow_id,
+            "status": RunStatus.PENDING,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total": len(inputs),
+            "completed": 0,
+            "failed": 0,
+            "workflow": workflow,
+            "plan": plan,
+            "input_node": input_node,
+            "outputs": outputs,
+            "items": [
+                {
+                    "index": index,
+                    "input": params["upload_id"] or params["path"],
+                    "params": params,
+                    "run_id": f"{batch_id}.{index}",
+                    "status": RunStatus.PENDING,
+                    "error": None,
+                    "duration": None,
+                    "files": [],
+                }
+                for index, params in enumerate(inputs)
+            ],
+        }
+        self.batches[batch_id] = batch_data
+        return batch_data
+
+    async def run(
+        self,
+        batch_id: str,
+        max_concurrent: int = 4,
+        readers: int = 2,
+        writers: int = 2,
+        prefetch: int = 4,
+        stack_size: int = 8,
+        save_format: Optional[str] = None,
+        output_dir: str = "outputs",
+        keep_outputs: bool = True,
+        **options: Any,
+    ) -> Dict[str, Any]:
+        """
+        执行批处理
+
+        读取、计算、写出分为三个阶段流水执行，阶段之间以有界队列连接：读取阶段预先解码后续项的
+        输入图像，计算阶段执行工作流，写出阶段编码并保存结果。吞吐量取决于最慢的阶段，
+        而不是各阶段耗时之和；队列容量限制了同时驻留内存的图像数量。
+
+        输入图像尺寸相同的项按 stack_size 分组，组内支持批量执行的节点对堆栈只执行一次（见 StackedRunner），
+        其余节点逐项执行；批量执行失败时整组改为逐项执行。
+
+        Args:
+            batch_id: 批处理ID
+            max_concurrent: 同时计算的项数
+            readers: 同时读取解码的项数
+            writers: 同时编码写出的项数
+            prefetch: 各阶段之间队列的容量（预读的项数）
+            stack_size: 堆叠为一组批量执行的最大项数，1 表示不堆叠
+            save_format: 结果的保存格式（png/jpg），None 表示不保存
+            output_dir: 保存目录，结果写入 {output_dir}/{batch_id}/
+            keep_outputs: 是否在内存中保留各项运行的节点输出；大批量处理并保存结果时可关闭，
+                各项结束（写出）后即释放输出，运行状态和日志仍可查询
+            **options: 传给 WorkflowEngine.execute 的其余参数
+
+        Returns:
+            批处理数据
+        """
+        batch = self.batches[batch_id]
+        if batch["status"] != RunStatus.CANCELLED:
+            batch["status"] = RunStatus.RUNNING
+        batch["started_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        start_time = time.time()
+
+        pending = iter(batch["items"])
+        decoded: asyncio.Queue = asyncio.Queue(maxsize=max(1, prefetch))
+        grouped: asyncio.Queue = asyncio.Queue(maxsize=1)
+        encoded: asyncio.Queue = asyncio.Queue(maxsize=max(1, prefetch))
+        item_starts: Dict[int, float] = {}
+        directory = os.path.join(output_dir, batch_id)
+        computers = max(1, max_concurrent)
+        writers = max(1, writers) if save_format else 0
+        execution_order = batch["plan"].live_order(batch["outputs"])
+        # 输入节点下游没有支持批量执行的节点时不分组
+        stacking = stack_size > 1 and bool(
+            self.stacker.stacked_nodes(batch["plan"], execution_order, batch["input_node"])
+        )
+
+        def finish(item: Dict[str, Any], status: RunStatus, error: Optional[str]):
+            self._finish_item(batch, item, status, error, item_starts)
+            if not keep_outputs:
+                self._release_outputs(item["run_id"])
+
+        async def reader():
+            for item in pending:
+                if batch["status"] == RunStatus.CANCELLED:
+                    item["status"] = RunStatus.CANCELLED
+                    continue
+                item["status"] = RunStatus.RUNNING
+                item_starts[item["index"]] = time.time()
+                plan = batch["plan"].with_params({batch["input_node"]: item["params"]})
+                try:
+                    outputs = await self._read_item(plan, batch["input_node"], options.get("input_data"))
+                except Exception as e:
+                    self._record_read_failure(batch, item, str(e), item_starts)
+                    self._finish_item(batch, item, RunStatus.FAILED, str(e), item_starts)
+                    continue
+                await decoded.put((item, plan, outputs))
+
+        async def grouper():
+            # 按输入图像的尺寸和数据类型分组，组满即交给计算阶段，结束时提交未满的组
+            buckets: Dict[Tuple[Any, ...], List[Any]] = {}
+            while (entry := await decoded.get()) is not None:
+                image = entry[2].get("image")
+                if not stacking or not isinstance(image, np.ndarray):
+                    await grouped.put([entry])
+                    continue
+                key = (image.shape, image.dtype.str)
+                bucket = buckets.setdefault(key, [])
+                bucket.append(entry)
+                if len(bucket) >= stack_size:
+                    await grouped.put(buckets.pop(key))
+            for bucket in buckets.values():
+                await grouped.put(bucket)
+
+        async def computer():
+            while (group := await grouped.get()) is not None:
+                preloaded = [{batch["input_node"]: outputs} for _, _, outputs in group]
+                if len(group) > 1:
+                    try:
+                        preloaded = await self.stacker.run(
+                            batch["plan"],
+                            execution_order,
+                            batch["input_node"],
+                            [outputs["image"] for _, _, outputs in group],
+                            options.get("input_data"),
+                        )
+                    except Exception as e:
+                        logger.warning(f"批处理 {batch_id} 批量执行失败，改为逐项执行: {e}")
+
+                for (item, plan, _), item_preloaded in zip(group, preloaded):
+                    if batch["status"] == RunStatus.CANCELLED:
+                        item["status"] = RunStatus.CANCELLED
+                        continue
+                    result = await self.engine.execute(
+                        batch["workflow"],
+                        item["run_id"],
+                        outputs=batch["outputs"],
+                        plan=plan,
+                        preloaded=item_preloaded,
+                        **options,
+                    )
+                    if result["status"] == RunStatus.COMPLETED and save_format:
+                        await encoded.put((item, result))
+                    else:
+                        finish(item, result["status"], result.get("error"))
+
+        async def writer():
+            while (entry := await encoded.get()) is not None:
+                item, result = entry
+                try:
+                    item["files"] = await asyncio.to_thread(
+                        write_outputs, result["node_outputs"], directory, f"{item['index']:04d}", save_format
+                    )
+                    finish(item, RunStatus.COMPLETED, None)
+                except Exception as e:
+                    finish(item, RunStatus.FAILED, f"写出结果失败: {e}")
+
+        async def stage(workers: List[Any], queue: asyncio.Queue, consumers: int):
+            # 本阶段全部结束后通知下游阶段的每个 worker 退出
+            await asyncio.gather(*workers)
+            for _ in range(consumers):
+                await queue.put(None)
+
+        count = len(batch["items"])
+        tasks = [
+            asyncio.create_task(stage([reader() for _ in range(max(1, min(readers, count)))], decoded, 1)),
+            asyncio.create_task(stage([grouper()], grouped, computers)),
+            asyncio.create_task(stage([computer() for _ in range(computers)], encoded, writers)),
+            *(asyncio.create_task(writer()) for _ in range(writers)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+            if batch["status"] != RunStatus.CANCELLED:
+                batch["status"] = RunStatus.COMPLETED
+        except asyncio.CancelledError:
+            # 执行批处理的任务被取消（如导入任务停止）
+            batch["status"] = RunStatus.CANCELLED
+            raise
+        except Exception as e:
+            batch["status"] = RunStatus.FAILED
+            batch["error"] = str(e)
+            logger.error(f"批处理 {batch_id} 失败: {e}", exc_info=True)
+        finally:
+            # 任一阶段异常时停止其余阶段，避免阻塞在队列上
+            for task in tasks:
+                task.cancel()
+            batch["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+        logger.info(
+            f"批处理 {batch_id} 结束：{batch['completed']}/{batch['total']} 成功，"
+            f"{batch['failed']} 失败，耗时 {time.time() - start_time:.2f}s"
+        )
+        return batch
+
+    async def _read_item(
+        self, plan: ExecutionPlan, input_node: str, input_data: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """读取阶段：在执行器的 IO 线程池中执行输入节点（读取并解码图像）"""
+        step = plan.steps[input_node]
+        context = NodeContext(node_id=input_node, inputs={}, params=step.params, input_data=input_data or {})
+        return await self.engine.executor.run(step.node_impl, context)
+
+    def _record_read_failure(
+        self, batch: Dict[str, Any], item: Dict[str, Any], error: str, item_starts: Dict[int, float]
+    ):
+        """读取阶段失败的项没有经过引擎执行，为其登记失败的运行记录，可与其他项一样通过运行 API 查询"""
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        started_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(item_starts.get(item["index"], time.time())))
+        input_node = batch["input_node"]
+        self.engine.runs[item["run_id"]] = {
+            "run_id": item["run_id"],
+            "workflow_id": batch["workflow"].workflow_id,
+            "status": RunStatus.FAILED,
+            "created_at": started_at,
+            "started_at": started_at,
+            "completed_at": now,
+            "error": error,
+            "node_statuses": {input_node: NodeStatus.FAILED},
+            "node_outputs": {},
+            "node_cache": {},
+            "logs": [{"node_id": input_node, "type": "error", "message": error, "timestamp": now}],
+        }
+
+    @staticmethod
+    def _finish_item(
+        batch: Dict[str, Any],
+        item: Dict[str, Any],
+        status: RunStatus,
+        error: Optional[str],
+        item_starts: Dict[int, float],
+    ):
+        """记录单项结果"""
+        item["status"] = status
+        item["error"] = error
+        item["duration"] = time.time() - item_starts.get(item["index"], time.time())
+        if status == RunStatus.COMPLETED:
+            batch["completed"] += 1
+        else:
+            batch["failed"] += 1
+
+    def _release_outputs(self, run_id: str):
+        """释放单项运行保留的节点输出（状态和日志保留）"""
+        run_data = self.engine.get_run(run_id)
+        if run_data is not None:
+            run_data["node_outputs"] = {}
+            run_data["node_cache"] = {}
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """获取批处理"""
+        return self.batches.get(batch_id)
+
+    def cancel_batch(self, batch_id: str):
+        """取消批处理（尚未开始的项不再执行）"""
+        batch = self.batches.get(batch_id)
+        if batch is not None and batch["status"] in (RunStatus.PENDING, RunStatus.RUNNING):
+            batch["status"] = RunStatus.CANCELLED
+
+    def remove_batch(self, batch_id: str):
+        """删除批处理及其各项的运行记录（批处理仍在执行时抛出 ValueError）"""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return
+        if not batch.get("completed_at"):
+            raise ValueError(f"批处理 {batch_id} 尚未结束")
+        del self.batches[batch_id]
+        for item in batch["items"]:
+            self.engine.runs.pop(item["run_id"], None)
@@ -0,0 +1,358 @@
+"""节点输出缓存（跨运行复用）"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 缓存键格式版本，节点实现或序列化方式变化时递增以废弃旧的磁盘缓存
+CACHE_KEY_VERSION = "1"
+
+
+def canonical_params(params: Dict[str, Any]) -> str:
+    """参数的规范化 JSON 表示（键排序，与参数书写顺序无关）"""
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+
+
+def node_cache_key(
+    node_type: str,
+    params: Dict[str, Any],
+    input_keys: Dict[str, str],
+    external_state: Optional[str] = None,
+) -> str:
+    """
+    计算节点输出的缓存键
+
+    由节点类型、规范化参数、各输入值的键以及节点依赖的外部状态组成。
+    输入值的键由上游节点的缓存键派生，无需对图像内容重复计算哈希。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(CACHE_KEY_VERSION.encode())
+    h.update(b"\0" + node_type.encode("utf-8"))
+    h.update(b"\0" + canonical_params(params).encode("utf-8"))
+    for port in sorted(input_keys):
+        h.update(f"\0{port}={input_keys[port]}".encode("utf-8"))
+    if external_state is not None:
+        h.update(b"\0" + external_state.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _update_hash(h: "hashlib._Hash", value: Any):
+    """将值的内容写入哈希（不支持的类型抛出 TypeError）"""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            raise TypeError("不支持 object 类型数组")
+        h.update(f"nd:{value.dtype.str}:{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for key in sorted(value, key=str):
+            h.update(f"{key!s}:".encode("utf-8"))
+            _update_hash(h, value[key])
+        h.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[")
+        for item in value:
+            _update_hash(h, item)
+            h.update(b",")
+        h.update(b"]")
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        h.update(json.dumps(value).encode("utf-8"))
+    else:
+        raise TypeError(f"不支持的类型: {type(value).__name__}")
+
+
+def hash_value(value: Any) -> Optional[str]:
+    """
+    计算值的内容哈希（用于非确定性节点的输出）
+
+    Returns:
+        哈希字符串，值中包含无法哈希的对象时返回 None
+    """
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        _update_hash(h, value)
+    except TypeError:
+        return None
+    return "v:" + h.hexdigest()
+
+
+def _estimate_size(value: Any) -> int:
+    """估算输出占用的字节数"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_estimate_size(item) for item in value.values()) + 64
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(item) for item in value) + 64
+    return 64
+
+
+def _freeze(value: Any) -> Any:
+    """
+    准备存入缓存的值
+
+    数组复制后将副本设为只读：节点原本的输出仍可写，继续传给下游和记录为运行输出，
+    下游原地修改不会污染缓存；复制也避免缓存通过视图间接持有更大的底层数组。
+    """
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.flags.writeable = False
+        return value
+    if isinstance(value, dict):
+        return {key: _freeze(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_freeze(item) for item in value]
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """
+    准备交给调用方的缓存值
+
+    数组复制为可写的副本：命中缓存的输出与重新计算的输出一样可由下游原地修改
+    （如 PythonSnippet 脚本），缓存中的只读数组保持不变。
+    """
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class NodeOutputCache:
+    """
+    节点输出缓存
+
+    - 内存层：按字节数上限做 LRU 淘汰
+    - 磁盘层（可选）：每个条目一个目录，数组保存为 .npy，其余输出保存为 JSON，
+      重启后仍可命中；按总字节数上限淘汰最久未使用的条目
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 512 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 4 * 1024 * 1024 * 1024,
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 内存层字节数上限
+            disk_dir: 磁盘层目录，None 表示不启用磁盘层
+            max_disk_bytes: 磁盘层字节数上限
+        """
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(self._entry_size(path) for path in self.disk_dir.iterdir() if path.is_dir())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存的节点输出
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            节点输出（数组为可写的副本），未命中返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                outputs = entry[0]
+        if entry is not None:
+            return _thaw(outputs)
+
+        outputs = self._load_from_disk(key)
+        with self._lock:
+            if outputs is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+
+        # 磁盘命中后提升到内存层
+        self._put_memory(key, outputs)
+        return _thaw(outputs)
+
+    def put(self, key: str, outputs: Dict[str, Any]):
+        """
+        缓存节点输出
+
+        Args:
+            key: 缓存键
+            outputs: 节点输出
+        """
+        outputs = _freeze(outputs)
+        self._put_memory(key, outputs)
+        with self._lock:
+            self._stats["stores"] += 1
+        if self.disk_dir:
+            self._save_to_disk(key, outputs)
+
+    def _put_memory(self, key: str, outputs: Dict[str, Any]):
+        """写入内存层并按字节数淘汰"""
+        size = _estimate_size(outputs)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (outputs, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.disk_dir / key
+
+    @staticmethod
+    def _entry_size(path: Path) -> int:
+        return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+    def _save_to_disk(self, key: str, outputs: Dict[str, Any]):
+        """写入磁盘层（无法序列化的输出跳过）"""
+        entry_dir = self._entry_dir(key)
+        if entry_dir.exists():
+            return
+
+        tmp_dir = self.disk_dir / f".tmp-{key}-{threading.get_ident()}"
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            meta = {}
+            for index, (port, value) in enumerate(outputs.items()):
+                if isinstance(value, np.ndarray) and value.dtype != object:
+                    file_name = f"{index}.npy"
+                    np.save(tmp_dir / file_name, value, allow_pickle=False)
+                    meta[port] = {"type": "ndarray", "file": file_name}
+                else:
+                    json.dumps(value)
+                    meta[port] = {"type": "json", "value": value}
+            with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            # 原子替换，避免读到写了一半的条目
+            os.replace(tmp_dir, entry_dir)
+        except (TypeError, ValueError, OSError) as e:
+            logger.debug(f"节点输出无法写入磁盘缓存 {key}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        with self._lock:
+            self._disk_bytes += self._entry_size(entry_dir)
+        self._evict_disk()
+
+    def _load_from_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        """从磁盘层读取"""
+        if not self.disk_dir:
+            return None
+        entry_dir = self._entry_dir(key)
+        meta_file = entry_dir / "meta.json"
+        if not meta_file.exists():
+            return None
+
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            outputs = {}
+            for port, info in meta.items():
+                if info["type"] == "ndarray":
+                    array = np.load(entry_dir / info["file"], allow_pickle=False)
+                    array.flags.writeable = False
+                    outputs[port] = array
+                else:
+                    outputs[port] = info["value"]
+            # 更新修改时间，作为磁盘层的 LRU 依据
+            os.utime(meta_file)
+            return outputs
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取磁盘缓存失败 {key}: {e}")
+            return None
+
+    def _evict_disk(self):
+        """磁盘层超出上限时淘汰最久未使用的条目"""
+        with self._lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+        entries = []
+        for path in self.disk_dir.iterdir():
+            meta_file = path / "meta.json"
+            if path.is_dir() and meta_file.exists():
+                entries.append((meta_file.stat().st_mtime, path))
+        entries.sort()
+
+        for _, path in entries:
+            with self._lock:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    return
+            size = self._entry_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self._disk_bytes -= size
+                self._stats["disk_evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": self.disk_dir is not None,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self, disk: bool = False):
+        """
+        清空缓存
+
+        Args:
+            disk: 是否同时清空磁盘层
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for name in self._stats:
+                self._stats[name] = 0
+        if disk and self.disk_dir:
+            for path in self.disk_dir.iterdir():
+                shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self._disk_bytes = 0
@@ -55,16 +55,12 @@ class CodeGenerator:
             node = node_map[node_id]
             node_impl = self.node_registry.get(node.type)
 
-            # 收集输入变量
+            # 收集输入变量（端口名称已在依赖图中解析）
             input_vars = {}
-            for link in workflow.links:
-                if link.to.node == node_id:
-                    from_node_id = link.from_.node
-                    from_port = link.from_.port
-                    to_port = link.to.port
-
-                    if from_node_id in var_map and from_port in var_map[from_node_id]:
-                        input_vars[to_port] = var_map[from_node_id][from_port]
+            for edge in graph[node_id]["inputs"]:
+                from_vars = var_map.get(edge["from_node"], {})
+                if edge["from_port"] in from_vars:
+                    input_vars[edge["to_port"]] = from_vars[edge["from_port"]]
 
             # 生成节点代码
             context = type('NodeContext', (), {
@@ -76,8 +72,8 @@ class CodeGenerator:
 
             code_template = node_impl.get_code_template(context)
             
-            # 处理特殊输入（ImageInput）
-            if node.type == "ImageInput":
+            # 处理特殊输入（ImageInput、VideoInput）
+            if node.type in ("ImageInput", "VideoInput"):
                 lines.append(f"    # {node_impl.name} (节点: {node_id})")
                 code_lines = code_template.strip().split("\n")
                 for line in code_lines:
@@ -118,9 +114,7 @@ class CodeGenerator:
         final_outputs = []
         for node_id in execution_order:
             node = node_map[node_id]
-            if node.type == "ImageViewer" or not any(
-                link.from_.node == node_id for link in workflow.links
-            ):
+            if node.type == "ImageViewer" or not graph[node_id]["dependents"]:
                 # 这是输出节点
                 if node_id in var_map:
                     for port, var_name in var_map[node_id].items():
@@ -213,11 +207,9 @@ class CodeGenerator:
             else:
                 # 找到输入
                 inputs = []
-                for link in workflow.links:
-                    if link.to.node == node_id:
-                        from_node_id = link.from_.node
-                        if from_node_id in var_map:
-                            inputs.append(var_map[from_node_id])
+                for edge in graph[node_id]["inputs"]:
+                    if edge["from_node"] in var_map:
+                        inputs.append(var_map[edge["from_node"]])
                 
                 if inputs:
                     input_var = inputs[0] if len(inputs) == 1 else inputs[0]
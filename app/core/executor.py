@@ -0,0 +1,219 @@
+"""节点执行器"""
+import asyncio
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Union
+import logging
+
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionKind, ExecutionBackend
+from app.utils.shared_memory import pack_arrays, unpack_arrays, release_blocks
+
+logger = logging.getLogger(__name__)
+
+
+def _run_node_sync(node_impl: BaseNode, context: NodeContext) -> Dict[str, Any]:
+    """在工作线程中同步执行节点（节点的 execute 为协程）"""
+    return asyncio.run(node_impl.execute(context))
+
+
+def _run_batch_sync(node_impl: BaseNode, context: NodeContext) -> Dict[str, Any]:
+    """在工作线程中同步批量执行节点"""
+    return asyncio.run(node_impl.execute_batch(context))
+
+
+def _run_node_in_process(
+    node_impl: BaseNode,
+    node_id: str,
+    packed_inputs: Dict[str, Any],
+    params: Dict[str, Any],
+    input_data: Dict[str, Any],
+) -> bytes:
+    """
+    在子进程中执行节点
+
+    输入中的图像以共享内存句柄传入并零拷贝挂载；输出图像写入新的共享内存块，
+    由父进程读取后销毁。结果在子进程内 pickle，打包或 pickle 失败时由子进程销毁已创建的输出块。
+    """
+    input_blocks = []
+    output_blocks = []
+    try:
+        inputs = unpack_arrays(packed_inputs, input_blocks)
+        context = NodeContext(node_id=node_id, inputs=inputs, params=params, input_data=input_data)
+        outputs = asyncio.run(node_impl.execute(context))
+        try:
+            result = pickle.dumps(pack_arrays(outputs, output_blocks))
+        except BaseException:
+            release_blocks(output_blocks, unlink=True)
+            raise
+        # 释放对输入视图的引用后才能关闭共享内存块
+        del inputs, context, outputs
+        return result
+    finally:
+        release_blocks(input_blocks)
+        release_blocks(output_blocks)
+
+
+def _discard_process_result(future: Future):
+    """销毁已不再等待的子进程结果中的输出共享内存块（等待方被取消时使用）"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    blocks = []
+    unpack_arrays(pickle.loads(future.result()), blocks)
+    release_blocks(blocks, unlink=True)
+
+
+class NodeExecutor:
+    """
+    节点执行器
+
+    根据节点声明的执行类型选择执行位置：
+    - CPU 密集节点在计算线程池中执行（cv2 会释放 GIL，可真正并行）；
+      持有 GIL 的节点可选择进程池后端，图像经共享内存传递
+    - IO 密集节点在独立的 IO 线程池中执行，避免与计算争抢线程
+    - 轻量节点直接在事件循环中执行，省去线程切换开销
+    """
+
+    def __init__(
+        self,
+        cpu_workers: Optional[int] = None,
+        io_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+    ):
+        """
+        初始化执行器
+
+        Args:
+            cpu_workers: 计算线程池大小，默认 CPU 核数
+            io_workers: IO 线程池大小，默认 4
+            process_workers: 进程池大小，默认 CPU 核数（首次使用时创建）
+        """
+        self.cpu_workers = cpu_workers or os.cpu_count() or 4
+        self.io_workers = io_workers or 4
+        self.process_workers = process_workers or os.cpu_count() or 4
+        self._pools: Dict[Union[ExecutionKind, ExecutionBackend], Executor] = {}
+
+    def _get_pool(self, kind: Union[ExecutionKind, ExecutionBackend]) -> Executor:
+        """获取（按需创建）对应类型的执行池"""
+        pool = self._pools.get(kind)
+        if pool is None:
+            if kind == ExecutionBackend.PROCESS:
+                # spawn 避免在多线程进程中 fork
+                pool = ProcessPoolExecutor(
+                    max_workers=self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            elif kind == ExecutionKind.IO:
+                pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="node-io")
+            else:
+                pool = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix="node-cpu")
+            self._pools[kind] = pool
+        return pool
+
+    def resolve_backend(
+        self,
+        node_impl: BaseNode,
+        backend: Optional[Union[ExecutionBackend, str]] = None,
+    ) -> Optional[ExecutionBackend]:
+        """
+        确定节点的执行后端：运行级指定优先，其次为节点类型声明，默认线程池
+
+        Returns:
+            执行后端，非 CPU 节点返回 None
+        """
+        if node_impl.execution_kind != ExecutionKind.CPU:
+            return None
+        if backend:
+            return ExecutionBackend(backend)
+        return node_impl.execution_backend or ExecutionBackend.THREAD
+
+    async def run(
+        self,
+        node_impl: BaseNode,
+        context: NodeContext,
+        backend: Optional[Union[ExecutionBackend, str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        执行节点
+
+        Args:
+            node_impl: 节点实现
+            context: 执行上下文
+            backend: 运行级指定的执行后端（覆盖节点类型声明）
+
+        Returns:
+            节点输出
+        """
+        kind = node_impl.execution_kind
+        if kind == ExecutionKind.TRIVIAL:
+            return await node_impl.execute(context)
+
+        if self.resolve_backend(node_impl, backend) == ExecutionBackend.PROCESS:
+            return await self._run_in_process(node_impl, context)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(kind), _run_node_sync, node_impl, context)
+
+    async def run_batch(self, node_impl: BaseNode, context: NodeContext) -> Dict[str, Any]:
+        """
+        批量执行节点（输入为同尺寸图像的堆栈，在线程池中执行）
+
+        Args:
+            node_impl: 节点实现
+            context: 执行上下文
+
+        Returns:
+            堆叠的节点输出
+        """
+        kind = node_impl.execution_kind
+        if kind == ExecutionKind.TRIVIAL:
+            return await node_impl.execute_batch(context)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_pool(kind), _run_batch_sync, node_impl, context)
+
+    async def _run_in_process(self, node_impl: BaseNode, context: NodeContext) -> Dict[str, Any]:
+        """
+        在进程池中执行节点，图像输入输出经共享内存传递
+
+        等待被取消时子进程仍会执行完，其输出块在结果返回后销毁；
+        子进程异常退出导致进程池损坏时丢弃该进程池，下次使用时重新创建。
+        """
+        input_blocks = []
+        pool = self._get_pool(ExecutionBackend.PROCESS)
+        try:
+            packed_inputs = pack_arrays(context.inputs, input_blocks)
+            future = pool.submit(
+                _run_node_in_process,
+                node_impl,
+                context.node_id,
+                packed_inputs,
+                context.params,
+                context.input_data,
+            )
+            try:
+                result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(_discard_process_result)
+                raise
+        except BrokenProcessPool:
+            if self._pools.get(ExecutionBackend.PROCESS) is pool:
+                del self._pools[ExecutionBackend.PROCESS]
+                pool.shutdown(wait=False)
+                logger.warning("进程池已损坏（子进程异常退出），下次使用时重新创建")
+            raise
+        finally:
+            release_blocks(input_blocks, unlink=True)
+
+        output_blocks = []
+        try:
+            return unpack_arrays(pickle.loads(result), output_blocks, copy=True)
+        finally:
+            release_blocks(output_blocks, unlink=True)
+
+    def shutdown(self, wait: bool = True):
+        """关闭所有执行池"""
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait)
+        self._pools.clear()
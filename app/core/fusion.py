@@ -0,0 +1,349 @@
+"""节点融合（编译计划时把相邻节点合并为一个执行步骤）"""
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.core.nodes.base import BaseNode, NodeContext
+from app.core.plan import PlanStep
+
+
+def find_chains(
+    order: List[str],
+    steps: Dict[str, PlanStep],
+    accept: Callable[[PlanStep], bool],
+    min_length: int = 2,
+) -> List[List[str]]:
+    """
+    查找可融合的线性链
+
+    链上相邻节点经 image 端口直连，且除最后一个节点外只有一个下游；
+    别名步骤和查看器/输出节点不参与融合。
+
+    Args:
+        order: 拓扑顺序
+        steps: 计划步骤
+        accept: 节点是否可加入链
+        min_length: 链的最小长度
+
+    Returns:
+        节点ID链列表（按执行顺序）
+    """
+    def eligible(node_id: str) -> bool:
+        step = steps[node_id]
+        return (
+            step.alias_of is None
+            and not step.node_impl.is_sink
+            and step.node_impl.deterministic
+            and list(step.node_impl.input_ports) == ["image"]
+            and list(step.node_impl.output_ports) == ["image"]
+            and accept(step)
+        )
+
+    chains = []
+    visited = set()
+    for node_id in order:
+        if node_id in visited or not eligible(node_id):
+            continue
+        chain = [node_id]
+        current = steps[node_id]
+        while len(current.dependents) == 1:
+            next_id = current.dependents[0]
+            next_step = steps[next_id]
+            if (
+                next_id in visited
+                or not eligible(next_id)
+                or len(next_step.inputs) != 1
+                or next_step.inputs[0].from_node != current.node_id
+                or next_step.inputs[0].from_port != "image"
+            ):
+                break
+            chain.append(next_id)
+            current = next_step
+        visited.update(chain)
+        if len(chain) >= min_length:
+            chains.append(chain)
+    return chains
+
+
+def merge_chain(
+    order: List[str],
+    steps: Dict[str, PlanStep],
+    chain: List[str],
+    node_impl: BaseNode,
+    params: Dict[str, Any],
+) -> Tuple[List[str], Dict[str, PlanStep]]:
+    """
+    把线性链合并为一个步骤
+
+    合并后的步骤使用最后一个节点的ID（下游连接不变），输入和依赖取自链首节点；
+    链上其余节点保留在步骤表中（记录 fused_into），但不再出现在执行顺序里。
+
+    Returns:
+        (新的拓扑顺序, 新的步骤表)
+    """
+    head, last = steps[chain[0]], chain[-1]
+    steps = dict(steps)
+    for dep_id in head.dependencies:
+        dep = steps[dep_id]
+        steps[dep_id] = dep.model_copy(
+            update={"dependents": tuple(last if d == head.node_id else d for d in dep.dependents)}
+        )
+    # 链上的节点本身可能是已融合的步骤，其成员一并归入新步骤
+    fused = []
+    for node_id in chain:
+        fused.extend(steps[node_id].fused)
+        if node_id != last:
+            fused.append(node_id)
+    for member_id in fused:
+        steps[member_id] = steps[member_id].model_copy(update={"fused_into": last})
+    steps[last] = steps[last].model_copy(update={
+        "node_type": node_impl.node_type,
+        "node_impl": node_impl,
+        "params": params,
+        "inputs": head.inputs,
+        "dependencies": head.dependencies,
+        "fused": tuple(fused),
+    })
+    members = set(chain[:-1])
+    return [node_id for node_id in order if node_id not in members], steps
+
+
+class PointwiseChainNode(BaseNode):
+    """
+    融合的逐像素节点链
+
+    uint8 输入时把连续可查表的节点复合为一张 256 项查找表，只用一次 cv2.LUT；
+    某个节点对当前输入无法查表（如多通道灰度化）时先应用已累积的查找表，再按原方式执行该节点。
+    """
+
+    def __init__(self, members: List[Tuple[BaseNode, Dict[str, Any]]]):
+        self.members = members
+
+    @property
+    def node_type(self) -> str:
+        return "PointwiseChain"
+
+    @property
+    def name(self) -> str:
+        return "逐像素融合"
+
+    @property
+    def description(self) -> str:
+        return " → ".join(node_impl.name for node_impl, _ in self.members)
+
+    @property
+    def is_pointwise(self) -> bool:
+        return True
+
+    @property
+    def input_ports(self) -> Dict[str, str]:
+        return {"image": "输入图像"}
+
+    @property
+    def output_ports(self) -> Dict[str, str]:
+        return {"image": "输出图像"}
+
+    @property
+    def param_schema(self) -> Dict[str, Any]:
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, context: NodeContext) -> Dict[str, Any]:
+        image = context.inputs.get("image")
+        if image is None:
+            raise ValueError("缺少输入图像")
+
+        lut = None
+        for node_impl, params in self.members:
+            if image.dtype == np.uint8:
+                channels = 1 if image.ndim == 2 else image.shape[2]
+                table = node_impl.pointwise_lut(params, channels)
+                if table is not None:
+                    table = table.reshape(-1)
+                    # 复合查找表：先查前面的表，再查当前节点的表
+                    lut = table if lut is None else table[lut]
+                    continue
+            if lut is not None:
+                image = cv2.LUT(image, lut)
+                lut = None
+            node_context = NodeContext(
+                node_id=context.node_id, inputs={"image": image}, params=params, input_data=context.input_data
+            )
+            image = (await node_impl.execute(node_context))["image"]
+
+        if lut is not None:
+            image = cv2.LUT(image, lut)
+        return {"image": image}
+
+
+# 形态学基本操作: (操作, 矩形核边长, 锚点)，锚点在 x、y 方向相同
+MorphOp = Tuple[str, int, int]
+
+
+def morphology_ops(node_type: str, params: Dict[str, Any]) -> List[MorphOp]:
+    """把形态学节点展开为基本的腐蚀/膨胀序列（OpenCV 默认锚点为 k // 2）"""
+    size = params.get("kernel_size", 3)
+    if node_type == "Erode":
+        return [("erode", size, size // 2)] * max(params.get("iterations", 1), 0)
+    if node_type == "Dilate":
+        return [("dilate", size, size // 2)] * max(params.get("iterations", 1), 0)
+    if node_type == "Open":
+        return [("erode", size, size // 2), ("dilate", size, size // 2)]
+    return [("dilate", size, size // 2), ("erode", size, size // 2)]
+
+
+def simplify_morphology(ops: List[MorphOp]) -> List[MorphOp]:
+    """
+    化简腐蚀/膨胀序列（结果逐位一致）
+
+    - 连续的同类操作合并为一次：矩形核的 Minkowski 和仍是矩形，
+      边长为 (k1 - 1) + (k2 - 1) + 1，锚点相加；1x1 核为恒等操作
+    - 对称核（奇数边长、中心锚点）上开运算和闭运算是幂等的：
+      腐蚀-膨胀-腐蚀-膨胀 化简为 腐蚀-膨胀，膨胀-腐蚀-膨胀-腐蚀 同理
+    """
+    merged: List[MorphOp] = []
+    for op in ops:
+        if op[1] <= 1:
+            continue
+        if merged and merged[-1][0] == op[0]:
+            name, size, anchor = merged.pop()
+            op = (name, size + op[1] - 1, anchor + op[2])
+        merged.append(op)
+
+    result: List[MorphOp] = []
+    for op in merged:
+        result.append(op)
+        if len(result) >= 4:
+            a, b, c, d = result[-4:]
+            symmetric = a[1] % 2 == 1 and a[2] == a[1] // 2
+            if symmetric and a == c and b == d and a[1:] == b[1:] and a[0] != b[0]:
+                del result[-2:]
+    return result
+
+
+class MorphologyChainNode(BaseNode):
+    """
+    融合的形态学节点链
+
+    编译时把链展开并化简为腐蚀/膨胀序列，相邻且核相同的腐蚀+膨胀用一次 cv2.morphologyEx（开/闭运算）完成。
+    """
+
+    def __init__(self, ops: List[MorphOp], names: List[str]):
+        self.ops = ops
+        self.names = names
+
+    @property
+    def node_type(self) -> str:
+        return "MorphologyChain"
+
+    @property
+    def name(self) -> str:
+        return "形态学融合"
+
+    @property
+    def description(self) -> str:
+        return " → ".join(self.names)
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        return sum(max(anchor, size - 1 - anchor) for _, size, anchor in self.ops)
+
+    @property
+    def input_ports(self) -> Dict[str, str]:
+        return {"image": "输入图像"}
+
+    @property
+    def output_ports(self) -> Dict[str, str]:
+        return {"image": "输出图像"}
+
+    @property
+    def param_schema(self) -> Dict[str, Any]:
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, context: NodeContext) -> Dict[str, Any]:
+        image = context.inputs.get("image")
+        if image is None:
+            raise ValueError("缺少输入图像")
+
+        index = 0
+        while index < len(self.ops):
+            name, size, anchor = self.ops[index]
+            kernel = np.ones((size, size), np.uint8)
+            following = self.ops[index + 1] if index + 1 < len(self.ops) else None
+            if following is not None and following[0] != name and following[1:] == (size, anchor):
+                op = cv2.MORPH_OPEN if name == "erode" else cv2.MORPH_CLOSE
+                image = cv2.morphologyEx(image, op, kernel, anchor=(anchor, anchor))
+                index += 2
+                continue
+            morph = cv2.erode if name == "erode" else cv2.dilate
+            image = morph(image, kernel, anchor=(anchor, anchor))
+            index += 1
+
+        if not self.ops:
+            image = image.copy()
+        return {"image": image}
+
+
+class CropPushdownNode(BaseNode):
+    """
+    下推到上游节点之前的裁剪
+
+    上游节点的输出像素只取决于输入的局部邻域时，先从输入中取出裁剪区域外扩 halo 像素的窗口，
+    在窗口上依次执行上游节点，最后裁掉外扩部分。每个节点只会使窗口边缘（未贴合图像边界的一侧）
+    邻域半径以内的像素失真，外扩量为各节点邻域半径之和，因此裁剪区域内与整幅图像处理逐位一致。
+    """
+
+    def __init__(self, crop: Tuple[BaseNode, Dict[str, Any]], members: List[Tuple[BaseNode, Dict[str, Any]]], halo: int):
+        self.crop = crop
+        self.members = members
+        self.halo = halo
+
+    @property
+    def node_type(self) -> str:
+        return "CropPushdown"
+
+    @property
+    def name(self) -> str:
+        return "裁剪下推"
+
+    @property
+    def description(self) -> str:
+        return " → ".join(node_impl.name for node_impl, _ in [*self.members, self.crop])
+
+    @property
+    def input_ports(self) -> Dict[str, str]:
+        return {"image": "输入图像"}
+
+    @property
+    def output_ports(self) -> Dict[str, str]:
+        return {"image": "输出图像"}
+
+    @property
+    def param_schema(self) -> Dict[str, Any]:
+        return {"type": "object", "properties": {}}
+
+    async def _run(self, members: List[Tuple[BaseNode, Dict[str, Any]]], image: Any, context: NodeContext) -> Any:
+        """依次执行节点"""
+        for node_impl, params in members:
+            node_context = NodeContext(
+                node_id=context.node_id, inputs={"image": image}, params=params, input_data=context.input_data
+            )
+            image = (await node_impl.execute(node_context))["image"]
+        return image
+
+    async def execute(self, context: NodeContext) -> Dict[str, Any]:
+        image = context.inputs.get("image")
+        if image is None:
+            raise ValueError("缺少输入图像")
+
+        params = self.crop[1]
+        x, y = params.get("x", 0), params.get("y", 0)
+        w, h = params.get("width", 100), params.get("height", 100)
+        height, width = image.shape[:2]
+        # 负坐标（按切片语义从末尾计算）或裁剪区域为空时按原顺序处理整幅图像
+        if min(x, y, w, h) < 0 or x >= width or y >= height or w == 0 or h == 0:
+            return {"image": await self._run([*self.members, self.crop], image, context)}
+
+        x0, y0 = max(x - self.halo, 0), max(y - self.halo, 0)
+        x1, y1 = min(x + w + self.halo, width), min(y + h + self.halo, height)
+        region = await self._run(self.members, image[y0:y1, x0:x1], context)
+        return {"image": region[y - y0:y - y0 + h, x - x0:x - x0 + w]}
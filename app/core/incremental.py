@@ -0,0 +1,147 @@
+"""脏矩形增量执行（相邻帧只有局部变化时只重新计算变化区域）"""
+from typing import Dict, List, Any, Optional, Set, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from app.core.nodes.base import NodeContext
+from app.core.executor import NodeExecutor
+from app.core.plan import ExecutionPlan
+from app.core.tiling import TileGroup, TiledRunner
+
+logger = logging.getLogger(__name__)
+
+
+def dirty_rects(
+    previous: np.ndarray, current: np.ndarray, cell: int = 32, threshold: int = 0
+) -> List[Tuple[int, int, int, int]]:
+    """
+    计算两帧之间变化的区域
+
+    逐像素差异（各通道取最大）超过 threshold 的像素按 cell 大小的格子汇总，
+    相连的变化格子合并为一个矩形。
+
+    Returns:
+        变化区域 [(y, x, h, w)]
+    """
+    diff = cv2.absdiff(previous, current)
+    if diff.ndim == 3:
+        diff = diff.max(axis=2)
+    height, width = diff.shape
+    rows, cols = -(-height // cell), -(-width // cell)
+    changed = np.zeros((rows * cell, cols * cell), dtype=bool)
+    changed[:height, :width] = diff > threshold
+    cells = changed.reshape(rows, cell, cols, cell).any(axis=(1, 3)).astype(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(cells, connectivity=8)
+    rects = []
+    for x, y, w, h, _ in stats[1:count]:
+        top, left = int(y) * cell, int(x) * cell
+        rects.append((top, left, min(int(h) * cell, height - top), min(int(w) * cell, width - left)))
+    return rects
+
+
+class DirtyRectRunner:
+    """
+    脏矩形增量执行器
+
+    输入节点下游只取决于局部邻域的节点（与分块执行相同，见 TiledRunner）组成局部子图。新帧与上一帧
+    只有局部变化时，对每个变化区域外扩两倍累计邻域半径取窗口执行局部子图，把各节点在
+    变化区域外扩自身累计邻域半径范围内的结果写入上一帧输出的副本，结果与整帧处理逐位一致
+    （threshold 为 0 时）。局部子图之外的节点（如 FindContours）由调用方整帧执行。
+    """
+
+    def __init__(
+        self,
+        executor: NodeExecutor,
+        cell: int = 32,
+        threshold: int = 0,
+        max_dirty_ratio: float = 0.5,
+    ):
+        """
+        Args:
+            executor: 节点执行器
+            cell: 汇总变化像素的格子边长
+            threshold: 视为变化的最小像素差（大于 0 时结果为近似）
+            max_dirty_ratio: 需要重新计算的面积超过整帧的该比例时改为整帧执行
+        """
+        self.executor = executor
+        self.cell = cell
+        self.threshold = threshold
+        self.max_dirty_ratio = max_dirty_ratio
+        self.group: Optional[TileGroup] = None
+        self._frame: Optional[np.ndarray] = None
+        self._outputs: Dict[str, np.ndarray] = {}
+
+    def prepare(self, plan: ExecutionPlan, execution_order: List[str], retained: Set[str]):
+        """确定局部子图（execution_order 包含输入节点）"""
+        groups = TiledRunner(self.executor).groups(plan, execution_order, retained)
+        self.group = groups[0] if groups else None
+
+    @property
+    def nodes(self) -> Set[str]:
+        """局部子图中的节点"""
+        return set(self.group.order) if self.group else set()
+
+    async def run(
+        self,
+        plan: ExecutionPlan,
+        frame: np.ndarray,
+        input_data: Dict[str, Any],
+        backend: Optional[str] = None,
+    ) -> Tuple[Optional[Dict[str, Dict[str, Any]]], float]:
+        """
+        增量执行局部子图
+
+        Returns:
+            (局部子图边界节点的输出, 重新计算的面积占整帧的比例)；
+            需要整帧执行时输出为 None，比例为 1
+        """
+        if self.group is None or self._frame is None or self._frame.shape != frame.shape:
+            return None, 1.0
+
+        height, width = frame.shape[:2]
+        rects = dirty_rects(self._frame, frame, self.cell, self.threshold)
+        halo = self.group.halo
+        windows = [
+            (max(y - 2 * halo, 0), max(x - 2 * halo, 0), min(y + h + 2 * halo, height), min(x + w + 2 * halo, width))
+            for y, x, h, w in rects
+        ]
+        ratio = sum((y1 - y0) * (x1 - x0) for y0, x0, y1, x1 in windows) / float(height * width)
+        if ratio > self.max_dirty_ratio:
+            return None, 1.0
+
+        outputs = {node_id: image.copy() for node_id, image in self._outputs.items()} if rects else dict(self._outputs)
+        for (y, x, h, w), (y0, x0, y1, x1) in zip(rects, windows):
+            values = {self.group.source_id: np.ascontiguousarray(frame[y0:y1, x0:x1])}
+            for node_id in self.group.order:
+                step = plan.steps[node_id]
+                context = NodeContext(
+                    node_id=node_id,
+                    inputs={"image": values[step.inputs[0].from_node]},
+                    params=step.params,
+                    input_data=input_data,
+                )
+                values[node_id] = (await self.executor.run(step.node_impl, context, backend))["image"]
+
+            for node_id, image in outputs.items():
+                # 该节点输出可能变化的范围：变化区域外扩其累计邻域半径
+                reach = self.group.reach[node_id]
+                py0, px0 = max(y - reach, 0), max(x - reach, 0)
+                py1, px1 = min(y + h + reach, height), min(x + w + reach, width)
+                image[py0:py1, px0:px1] = values[node_id][py0 - y0:py1 - y0, px0 - x0:px1 - x0]
+
+        self._frame = frame
+        self._outputs = outputs
+        return {node_id: {"image": image} for node_id, image in outputs.items()}, ratio
+
+    def update(self, frame: np.ndarray, values: Dict[str, Dict[str, Any]]):
+        """整帧执行后记录该帧及局部子图边界节点的输出，作为下一帧的基准"""
+        if self.group is None:
+            return
+        self._frame = frame
+        self._outputs = {
+            node_id: values[node_id]["image"]
+            for node_id in self.group.frontier
+            if node_id != self.group.source_id and node_id in values
+        }
@@ -1,6 +1,8 @@
 """节点基类"""
 from typing import Dict, Any, Optional
 from abc import ABC, abstractmethod
+from enum import Enum
+import numpy as np
 from pydantic import BaseModel
 
 
@@ -12,6 +14,24 @@ class NodeContext(BaseModel):
     input_data: Dict[str, Any]
 
 
+class ExecutionKind(str, Enum):
+    """节点执行类型"""
+    CPU = "cpu"  # CPU 密集：在计算线程池中执行
+    IO = "io"  # IO 密集：在 IO 线程池中执行
+    TRIVIAL = "trivial"  # 轻量/透传：直接在事件循环中执行
+
+
+class ExecutionBackend(str, Enum):
+    """CPU 节点的执行后端"""
+    THREAD = "thread"  # 线程池：适合释放 GIL 的 OpenCV 计算
+    PROCESS = "process"  # 进程池：适合长时间持有 GIL 的纯 Python 计算
+
+
+def scale_length(value: float, scale: float, minimum: int = 0) -> int:
+    """按比例缩放像素长度（四舍五入，不小于 minimum）"""
+    return max(int(round(value * scale)), minimum)
+
+
 class BaseNode(ABC):
     """节点基类"""
 
@@ -51,6 +71,142 @@ class BaseNode(ABC):
         """参数schema定义"""
         pass
 
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        """执行类型（决定节点由哪个执行器运行）"""
+        return ExecutionKind.CPU
+
+    @property
+    def execution_backend(self) -> Optional[ExecutionBackend]:
+        """首选执行后端（仅对 CPU 节点生效，None 表示使用线程池）"""
+        return None
+
+    @property
+    def deterministic(self) -> bool:
+        """相同参数和输入是否总产生相同输出（False 时不参与跨运行缓存）"""
+        return True
+
+    def external_state(self, params: Dict[str, Any]) -> Optional[str]:
+        """
+        节点依赖的外部状态标识（参与缓存键计算）
+
+        Args:
+            params: 节点参数
+
+        Returns:
+            外部状态标识，如输入文件的修改时间和大小；无外部依赖时返回 None
+        """
+        return None
+
+    @property
+    def is_sink(self) -> bool:
+        """是否为查看器/输出节点（运行结束后保留其输出）"""
+        return False
+
+    @property
+    def passthrough_ports(self) -> Dict[str, str]:
+        """原样透传的端口 {output_port: input_port}，优化时这类节点直接复用上游输出而不执行"""
+        return {}
+
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        """
+        推断输出图像的通道数（用于编译期优化）
+
+        Args:
+            params: 节点参数
+            input_channels: 各输入端口图像的通道数（未知为 None）
+
+        Returns:
+            输出图像的通道数，未知时返回 None
+        """
+        return None
+
+    @property
+    def is_pointwise(self) -> bool:
+        """是否为逐像素映射节点（image 输入、image 输出，相邻的逐像素节点可融合为一次查表）"""
+        return False
+
+    def pointwise_lut(self, params: Dict[str, Any], channels: int) -> Optional[np.ndarray]:
+        """
+        uint8 图像的逐像素查找表
+
+        Args:
+            params: 节点参数
+            channels: 输入图像的通道数
+
+        Returns:
+            256 项 uint8 查找表（各通道共用）；当前输入无法查表时返回 None，按 execute 执行
+        """
+        return None
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        """
+        输出像素依赖的输入邻域半径（用于把裁剪区域向上游传播）
+
+        Args:
+            params: 节点参数
+
+        Returns:
+            邻域半径（像素），逐像素节点为 0；输出不只取决于局部邻域（如缩放）时返回 None
+        """
+        return 0 if self.is_pointwise else None
+
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        """
+        代理分辨率运行时换算参数
+
+        图像按 scale 缩小后，坐标、尺寸、核大小等以像素为单位的参数按同一比例换算，
+        使代理结果与全分辨率结果在比例上一致。
+
+        Args:
+            params: 已校验的节点参数
+            scale: 缩放比例（0-1）
+
+        Returns:
+            换算后的参数（默认原样返回）
+        """
+        return params
+
+    def tile_source(self, params: Dict[str, Any], directory: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        分块执行时提供整幅输出图像（输入节点）
+
+        返回内存映射数组，分块执行只读入每块需要的区域；不支持分块读取时返回 None，按 execute 执行。
+
+        Args:
+            params: 节点参数
+            directory: 内存映射临时文件目录
+        """
+        return None
+
+    def supports_batch(self, params: Dict[str, Any]) -> bool:
+        """
+        是否支持批量执行（一次处理同尺寸图像沿第一维堆叠的 (N,H,W[,C]) 数组）
+
+        Args:
+            params: 节点参数
+        """
+        return self.is_pointwise
+
+    async def execute_batch(self, context: NodeContext) -> Dict[str, Any]:
+        """
+        批量执行节点
+
+        context.inputs["image"] 为 (N,H,W[,C]) 堆栈，输出同样沿第一维堆叠。默认把堆栈沿高度拼接为一幅
+        (N*H,W[,C]) 图像执行一次 execute，适用于逐像素节点（输出与像素位置无关，结果与逐张执行一致）。
+
+        Args:
+            context: 执行上下文
+
+        Returns:
+            输出字典 {output_port_name: 堆叠的输出}
+        """
+        stack = context.inputs["image"]
+        count, height = stack.shape[:2]
+        tall = np.ascontiguousarray(stack).reshape(count * height, *stack.shape[2:])
+        outputs = await self.execute(context.model_copy(update={"inputs": {**context.inputs, "image": tall}}))
+        return {port: value.reshape(count, height, *value.shape[1:]) for port, value in outputs.items()}
+
     @abstractmethod
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         """
@@ -1,7 +1,7 @@
 """数据节点"""
 from typing import Dict, Any
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionKind
 
 
 class JSONInputNode(BaseNode):
@@ -27,6 +27,10 @@ class JSONInputNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"data": "输出JSON数据"}
 
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        return ExecutionKind.TRIVIAL
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -81,6 +85,18 @@ class JSONOutputNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"data": "输出JSON数据"}
 
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        return ExecutionKind.TRIVIAL
+
+    @property
+    def is_sink(self) -> bool:
+        return True
+
+    @property
+    def passthrough_ports(self) -> Dict[str, str]:
+        return {"data": "data"}
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {"type": "object", "properties": {}}
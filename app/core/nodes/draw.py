@@ -3,7 +3,7 @@ import cv2
 import numpy as np
 from typing import Dict, Any, List
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, scale_length
 
 
 class DrawRectangleNode(BaseNode):
@@ -43,6 +43,13 @@ class DrawRectangleNode(BaseNode):
             },
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        params = dict(params)
+        for name in ("x", "y", "width", "height"):
+            params[name] = scale_length(params.get(name, 0), scale)
+        params["thickness"] = scale_length(params.get("thickness", 2), scale, 1)
+        return params
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -144,6 +151,14 @@ class DrawTextNode(BaseNode):
             "required": ["text"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        params = dict(params)
+        params["x"] = scale_length(params.get("x", 10), scale)
+        params["y"] = scale_length(params.get("y", 30), scale)
+        params["font_scale"] = params.get("font_scale", 1.0) * scale
+        params["thickness"] = scale_length(params.get("thickness", 1), scale, 1)
+        return params
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -211,6 +226,12 @@ class OverlayNode(BaseNode):
             },
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        params = dict(params)
+        params["x"] = scale_length(params.get("x", 0), scale)
+        params["y"] = scale_length(params.get("y", 0), scale)
+        return params
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image1 = context.inputs.get("image1")
         image2 = context.inputs.get("image2")
@@ -1,9 +1,9 @@
 """几何/轮廓节点"""
 import cv2
 import numpy as np
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionBackend
 
 
 class FindContoursNode(BaseNode):
@@ -115,6 +115,10 @@ class BoundingRectNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"rects": "矩形列表（JSON）", "image": "绘制矩形后的图像（如果提供输入图像）"}
 
+    @property
+    def execution_backend(self) -> Optional[ExecutionBackend]:
+        return ExecutionBackend.PROCESS
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -185,6 +189,10 @@ class MinAreaRectNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"rects": "旋转矩形列表（JSON）"}
 
+    @property
+    def execution_backend(self) -> Optional[ExecutionBackend]:
+        return ExecutionBackend.PROCESS
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {"type": "object", "properties": {}}
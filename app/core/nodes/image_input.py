@@ -1,12 +1,18 @@
 """图像输入节点"""
+import os
 import cv2
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import base64
 from io import BytesIO
 from PIL import Image
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionKind, scale_length
+from app.utils.image import memmap_array
+
+
+# 代理分辨率读取时解码器可直接缩小的倍数（JPEG 按 DCT 块缩小解码，远快于全尺寸解码）
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
 
 
 class ImageInputNode(BaseNode):
@@ -32,6 +38,14 @@ class ImageInputNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        return ExecutionKind.IO
+
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        # cv2.imread 默认按三通道 BGR 读取
+        return 3
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -51,25 +65,95 @@ class ImageInputNode(BaseNode):
             "required": [],
         }
 
-    async def execute(self, context: NodeContext) -> Dict[str, Any]:
-        """执行节点"""
-        path = context.params.get("path", "")
-        upload_id = context.params.get("upload_id", "")
+    def _resolve_path(self, params: Dict[str, Any]) -> str:
+        """解析图像文件路径（上传文件优先）"""
+        path = params.get("path", "")
+        upload_id = params.get("upload_id", "")
 
         if upload_id:
             # 从上传目录读取
-            import os
             upload_path = os.path.join("uploads", upload_id)
             if os.path.exists(upload_path):
                 path = upload_path
 
+        return path
+
+    def external_state(self, params: Dict[str, Any]) -> Optional[str]:
+        """输入文件的路径、修改时间和大小，文件被替换后缓存自动失效"""
+        path = self._resolve_path(params)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        # 读取时缩小，下游节点处理代理分辨率的图像
+        return {**params, "preview_scale": scale}
+
+    def _read(self, path: str, scale: float = 1.0, mmap: bool = False) -> np.ndarray:
+        """读取图像，scale < 1 时缩小到代理分辨率"""
+        if path.lower().endswith(".npy"):
+            image = np.load(path, mmap_mode="r" if mmap and scale >= 1 else None)
+        elif scale < 1:
+            return self._read_reduced(path, scale)
+        else:
+            image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"无法读取图像: {path}")
+        if scale < 1:
+            size = (scale_length(image.shape[1], scale, 1), scale_length(image.shape[0], scale, 1))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def _read_reduced(self, path: str, scale: float) -> np.ndarray:
+        """按代理分辨率读取：先由解码器缩小解码，再缩放到精确尺寸"""
+        try:
+            # 只读取文件头获取原始尺寸
+            with Image.open(path) as f:
+                width, height = f.size
+        except Exception:
+            width = height = None
+
+        flag = cv2.IMREAD_COLOR
+        if width is not None:
+            flag = next((reduced for factor, reduced in _REDUCED_FLAGS if factor * scale <= 1), flag)
+        image = cv2.imread(path, flag)
+        if image is None:
+            raise ValueError(f"无法读取图像: {path}")
+        if width is None:
+            width, height = image.shape[1], image.shape[0]
+        elif (width > height) != (image.shape[1] > image.shape[0]):
+            # 解码时已按 EXIF 方向旋转
+            width, height = height, width
+        size = (scale_length(width, scale, 1), scale_length(height, scale, 1))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def tile_source(self, params: Dict[str, Any], directory: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        以内存映射方式提供图像
+
+        .npy 文件直接映射；其它格式解码一次后写入临时文件映射，解码后的整幅图像随即释放。
+        """
+        path = self._resolve_path(params)
+        if not path:
+            return None
+        image = self._read(path, params.get("preview_scale", 1.0), mmap=True)
+        if isinstance(image, np.memmap):
+            return image
+        store = memmap_array(image.shape, image.dtype, directory)
+        store[:] = image
+        return store
+
+    async def execute(self, context: NodeContext) -> Dict[str, Any]:
+        """执行节点"""
+        path = self._resolve_path(context.params)
+
         if not path:
             raise ValueError("请提供图像路径或上传文件")
 
-        # 读取图像
-        image = cv2.imread(path)
-        if image is None:
-            raise ValueError(f"无法读取图像: {path}")
+        # 读取图像（.npy 为分块执行准备的原始数组），代理分辨率运行时读取后缩小
+        image = self._read(path, context.params.get("preview_scale", 1.0))
 
         return {"image": image}
 
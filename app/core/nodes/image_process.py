@@ -1,9 +1,12 @@
 """基本图像处理节点"""
 import cv2
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionKind, scale_length
+
+# uint8 全部取值，对其执行逐像素操作即得到查找表
+_UINT8_RAMP = np.arange(256, dtype=np.uint8).reshape(1, 256)
 
 
 class ResizeNode(BaseNode):
@@ -29,6 +32,9 @@ class ResizeNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -45,6 +51,12 @@ class ResizeNode(BaseNode):
             "required": ["width", "height"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        params = dict(params)
+        params["width"] = scale_length(params.get("width", 640), scale, 1)
+        params["height"] = scale_length(params.get("height", 480), scale, 1)
+        return params
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -89,6 +101,13 @@ class CropNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        return ExecutionKind.TRIVIAL
+
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -102,6 +121,14 @@ class CropNode(BaseNode):
             "required": ["x", "y", "width", "height"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        params = dict(params)
+        for name in ("x", "y"):
+            params[name] = int(round(params.get(name, 0) * scale))
+        for name in ("width", "height"):
+            params[name] = scale_length(params.get(name, 100), scale, 1)
+        return params
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -148,10 +175,21 @@ class GrayscaleNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return 1
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {"type": "object", "properties": {}}
 
+    @property
+    def is_pointwise(self) -> bool:
+        return True
+
+    def pointwise_lut(self, params: Dict[str, Any], channels: int) -> Optional[np.ndarray]:
+        # 单通道图像原样输出；多通道需要按通道加权，不能查表
+        return _UINT8_RAMP.copy() if channels == 1 else None
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -195,6 +233,9 @@ class ThresholdNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -211,6 +252,16 @@ class ThresholdNode(BaseNode):
             "required": ["threshold"],
         }
 
+    @property
+    def is_pointwise(self) -> bool:
+        return True
+
+    def pointwise_lut(self, params: Dict[str, Any], channels: int) -> Optional[np.ndarray]:
+        # 各通道独立按同一阈值处理
+        thresh_type = getattr(cv2, params.get("type", "THRESH_BINARY"))
+        _, lut = cv2.threshold(_UINT8_RAMP, params.get("threshold", 127), params.get("max_value", 255), thresh_type)
+        return lut
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -255,6 +306,12 @@ class BlurNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        return params.get("kernel_size", 5) // 2
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -265,6 +322,9 @@ class BlurNode(BaseNode):
             "required": ["kernel_size"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        return {**params, "kernel_size": scale_length(params.get("kernel_size", 5), scale, 1)}
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -304,6 +364,17 @@ class GaussianBlurNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        kernel_size = params.get("kernel_size", 5)
+        if kernel_size > 0:
+            return kernel_size // 2
+        # 核大小为 0 时 OpenCV 按标准差推算（不超过 4 倍标准差）
+        sigma = max(params.get("sigma_x", 0), params.get("sigma_y", 0))
+        return int(sigma * 4) + 1 if sigma > 0 else None
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -316,6 +387,16 @@ class GaussianBlurNode(BaseNode):
             "required": ["kernel_size"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        params = dict(params)
+        kernel_size = params.get("kernel_size", 5)
+        if kernel_size > 0:
+            # 高斯核边长须为奇数
+            params["kernel_size"] = scale_length(kernel_size, scale, 1) | 1
+        params["sigma_x"] = params.get("sigma_x", 0) * scale
+        params["sigma_y"] = params.get("sigma_y", 0) * scale
+        return params
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
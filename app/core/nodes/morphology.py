@@ -1,9 +1,22 @@
 """形态学操作节点"""
 import cv2
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, scale_length
+
+
+def _scale_kernel(params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+    """代理分辨率下按比例缩小核（空核保持 OpenCV 默认的 3x3 核）"""
+    kernel_size = params.get("kernel_size", 3)
+    if kernel_size < 1:
+        return params
+    return {**params, "kernel_size": scale_length(kernel_size, scale, 1)}
+
+
+def _kernel_reach(kernel_size: int) -> int:
+    """矩形核（默认锚点在中心）单次操作的邻域半径；空核按 OpenCV 默认的 3x3 核计算"""
+    return (kernel_size if kernel_size >= 1 else 3) // 2
 
 
 class ErodeNode(BaseNode):
@@ -29,6 +42,12 @@ class ErodeNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        return max(params.get("iterations", 1), 0) * _kernel_reach(params.get("kernel_size", 3))
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -40,6 +59,9 @@ class ErodeNode(BaseNode):
             "required": ["kernel_size"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        return _scale_kernel(params, scale)
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -84,6 +106,12 @@ class DilateNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        return max(params.get("iterations", 1), 0) * _kernel_reach(params.get("kernel_size", 3))
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -95,6 +123,9 @@ class DilateNode(BaseNode):
             "required": ["kernel_size"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        return _scale_kernel(params, scale)
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -139,6 +170,13 @@ class OpenNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        # 腐蚀、膨胀各一次
+        return 2 * _kernel_reach(params.get("kernel_size", 3))
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -149,6 +187,9 @@ class OpenNode(BaseNode):
             "required": ["kernel_size"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        return _scale_kernel(params, scale)
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
@@ -191,6 +232,13 @@ class CloseNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像"}
 
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
+    def spatial_halo(self, params: Dict[str, Any]) -> Optional[int]:
+        # 腐蚀、膨胀各一次
+        return 2 * _kernel_reach(params.get("kernel_size", 3))
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -201,6 +249,9 @@ class CloseNode(BaseNode):
             "required": ["kernel_size"],
         }
 
+    def scale_params(self, params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+        return _scale_kernel(params, scale)
+
     async def execute(self, context: NodeContext) -> Dict[str, Any]:
         image = context.inputs.get("image")
         if image is None:
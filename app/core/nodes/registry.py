@@ -2,6 +2,7 @@
 from typing import Dict, Type, List
 from app.core.nodes.base import BaseNode
 from app.core.nodes.image_input import ImageInputNode
+from app.core.nodes.video_input import VideoInputNode
 from app.core.nodes.image_process import (
     ResizeNode,
     CropNode,
@@ -32,7 +33,7 @@ from app.core.nodes.concat import (
     TileNode,
 )
 from app.core.nodes.data import JSONInputNode, JSONOutputNode
-from app.core.nodes.viewer import ImageViewerNode, DiffViewerNode
+from app.core.nodes.viewer import ImageViewerNode, DiffViewerNode, OutputNode
 from app.core.nodes.script import PythonSnippetNode
 
 
@@ -50,6 +51,7 @@ class NodeRegistry:
         """注册所有内置节点"""
         nodes = [
             ImageInputNode(),
+            VideoInputNode(),
             ResizeNode(),
             CropNode(),
             GrayscaleNode(),
@@ -73,6 +75,7 @@ class NodeRegistry:
             JSONOutputNode(),
             ImageViewerNode(),
             DiffViewerNode(),
+            OutputNode(),
             PythonSnippetNode(),
         ]
 
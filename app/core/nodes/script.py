@@ -30,6 +30,11 @@ class PythonSnippetNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"result": "执行结果"}
 
+    @property
+    def deterministic(self) -> bool:
+        # 用户代码可能依赖随机数、时间或外部文件
+        return False
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {
@@ -0,0 +1,146 @@
+"""视频输入节点"""
+from typing import Dict, Any, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from app.core.nodes.base import NodeContext, scale_length
+from app.core.nodes.image_input import ImageInputNode
+
+
+class VideoInputNode(ImageInputNode):
+    """
+    视频输入节点（路径解析和外部状态与图像输入相同）
+
+    单次运行输出 frame_index 指定的一帧，便于编辑和调试工作流；
+    流式处理时由 StreamRunner 通过 iter_frames 逐帧读取，整段视频不载入内存。
+    """
+
+    @property
+    def node_type(self) -> str:
+        return "VideoInput"
+
+    @property
+    def name(self) -> str:
+        return "视频输入"
+
+    @property
+    def description(self) -> str:
+        return "从视频文件读取帧"
+
+    @property
+    def param_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "视频文件路径",
+                    "default": "",
+                },
+                "upload_id": {
+                    "type": "string",
+                    "description": "上传文件ID",
+                    "default": "",
+                },
+                "frame_index": {
+                    "type": "integer",
+                    "description": "单次运行时读取的帧序号",
+                    "default": 0,
+                },
+                "frame_step": {
+                    "type": "integer",
+                    "description": "流式处理时每隔多少帧取一帧",
+                    "default": 1,
+                },
+                "max_frames": {
+                    "type": "integer",
+                    "description": "流式处理的最大帧数（0 表示全部）",
+                    "default": 0,
+                },
+            },
+            "required": [],
+        }
+
+    def tile_source(self, params: Dict[str, Any], directory: Optional[str] = None) -> Optional[np.ndarray]:
+        return None
+
+    def _open(self, params: Dict[str, Any]) -> cv2.VideoCapture:
+        path = self._resolve_path(params)
+        if not path:
+            raise ValueError("请提供视频路径或上传文件")
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"无法打开视频: {path}")
+        return capture
+
+    @staticmethod
+    def _scale(frame: np.ndarray, scale: float) -> np.ndarray:
+        if scale >= 1:
+            return frame
+        size = (scale_length(frame.shape[1], scale, 1), scale_length(frame.shape[0], scale, 1))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def frame_rate(self, params: Dict[str, Any]) -> float:
+        """视频帧率（考虑 frame_step），无法获取时为 25"""
+        capture = self._open(params)
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        finally:
+            capture.release()
+        return fps / max(1, params.get("frame_step", 1))
+
+    def iter_frames(self, params: Dict[str, Any]) -> Iterator[np.ndarray]:
+        """
+        逐帧读取视频（按 frame_step 取帧，最多 max_frames 帧）
+
+        生成器持有视频句柄，读完或关闭时释放。
+        """
+        step = max(1, params.get("frame_step", 1))
+        max_frames = params.get("max_frames", 0)
+        scale = params.get("preview_scale", 1.0)
+        capture = self._open(params)
+        try:
+            count = 0
+            index = 0
+            while not max_frames or count < max_frames:
+                # 跳过的帧只 grab 不解码
+                if index % step:
+                    if not capture.grab():
+                        break
+                    index += 1
+                    continue
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                index += 1
+                count += 1
+                yield self._scale(frame, scale)
+        finally:
+            capture.release()
+
+    async def execute(self, context: NodeContext) -> Dict[str, Any]:
+        """执行节点（读取 frame_index 指定的一帧）"""
+        capture = self._open(context.params)
+        try:
+            frame_index = context.params.get("frame_index", 0)
+            if frame_index:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ok, frame = capture.read()
+        finally:
+            capture.release()
+        if not ok:
+            raise ValueError(f"无法读取第 {context.params.get('frame_index', 0)} 帧")
+        return {"image": self._scale(frame, context.params.get("preview_scale", 1.0))}
+
+    def get_code_template(self, context: NodeContext) -> str:
+        path = self._resolve_path(context.params) or context.params.get("path", "")
+        frame_index = context.params.get("frame_index", 0)
+        return f"""# 读取视频帧
+capture = cv2.VideoCapture("{path}")
+capture.set(cv2.CAP_PROP_POS_FRAMES, {frame_index})
+ok, image = capture.read()
+capture.release()
+if not ok:
+    raise ValueError("无法读取视频帧")
+"""
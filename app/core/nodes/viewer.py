@@ -1,7 +1,7 @@
 """查看器节点"""
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from app.core.nodes.base import BaseNode, NodeContext
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionKind
 
 
 class ImageViewerNode(BaseNode):
@@ -27,6 +27,21 @@ class ImageViewerNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"image": "输出图像（透传）"}
 
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        return ExecutionKind.TRIVIAL
+
+    @property
+    def is_sink(self) -> bool:
+        return True
+
+    @property
+    def passthrough_ports(self) -> Dict[str, str]:
+        return {"image": "image"}
+
+    def output_channels(self, params: Dict[str, Any], input_channels: Dict[str, Optional[int]]) -> Optional[int]:
+        return input_channels.get("image")
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {"type": "object", "properties": {}}
@@ -68,6 +83,10 @@ class DiffViewerNode(BaseNode):
     def output_ports(self) -> Dict[str, str]:
         return {"diff": "差异图像"}
 
+    @property
+    def is_sink(self) -> bool:
+        return True
+
     @property
     def param_schema(self) -> Dict[str, Any]:
         return {"type": "object", "properties": {}}
@@ -97,3 +116,60 @@ if image1.shape != image2.shape:
 diff = cv2.absdiff(image1, image2)
 """
 
+
+
+class OutputNode(BaseNode):
+    """输出标记节点"""
+
+    @property
+    def node_type(self) -> str:
+        return "Output"
+
+    @property
+    def name(self) -> str:
+        return "输出"
+
+    @property
+    def description(self) -> str:
+        return "标记工作流的输出（透传任意数据），未连接到查看器或输出节点的分支不会执行"
+
+    @property
+    def input_ports(self) -> Dict[str, str]:
+        return {"value": "输入数据"}
+
+    @property
+    def output_ports(self) -> Dict[str, str]:
+        return {"value": "输出数据（透传）"}
+
+    @property
+    def execution_kind(self) -> ExecutionKind:
+        return ExecutionKind.TRIVIAL
+
+    @property
+    def is_sink(self) -> bool:
+        return True
+
+    @property
+    def passthrough_ports(self) -> Dict[str, str]:
+        return {"value": "value"}
+
+    @property
+    def param_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "输出名称", "default": "output"},
+            },
+        }
+
+    async def execute(self, context: NodeContext) -> Dict[str, Any]:
+        value = context.inputs.get("value")
+        if value is None:
+            raise ValueError("缺少输入数据")
+
+        return {"value": value}
+
+    def get_code_template(self, context: NodeContext) -> str:
+        return """# 输出（透传）
+# 数据已通过输入传递
+"""
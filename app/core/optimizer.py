@@ -0,0 +1,359 @@
+"""执行计划优化器（基于规则的改写）"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from app.core.plan import PlanStep, OptimizationRecord, eliminate_common_steps
+from app.core.fusion import (
+    CropPushdownNode,
+    MorphologyChainNode,
+    PointwiseChainNode,
+    find_chains,
+    merge_chain,
+    morphology_ops,
+    simplify_morphology,
+)
+
+logger = logging.getLogger(__name__)
+
+# 优化级别：off 不做改写；safe 只做结果逐位一致的改写；aggressive 额外启用有损改写
+OPTIMIZATION_LEVELS = ("off", "safe", "aggressive")
+
+RewriteResult = Tuple[List[str], Dict[str, PlanStep], List[OptimizationRecord]]
+
+
+class OptimizationRule(ABC):
+    """优化规则"""
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """规则名称"""
+        pass
+
+    @property
+    @abstractmethod
+    def description(self) -> str:
+        """规则描述"""
+        pass
+
+    @property
+    def aggressive(self) -> bool:
+        """是否为有损改写（仅在 aggressive 级别启用）"""
+        return False
+
+    @abstractmethod
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        """
+        应用规则
+
+        Args:
+            order: 拓扑顺序
+            steps: 计划步骤
+
+        Returns:
+            (新的拓扑顺序, 新的步骤表, 生效的改写记录)
+        """
+        pass
+
+    def record(self, nodes: List[str], detail: str = "") -> OptimizationRecord:
+        """生成改写记录"""
+        return OptimizationRecord(rule=self.name, nodes=tuple(nodes), detail=detail)
+
+
+def infer_channels(order: List[str], steps: Dict[str, PlanStep]) -> Dict[str, Optional[int]]:
+    """按拓扑顺序推断各节点输出图像的通道数（未知为 None）"""
+    channels: Dict[str, Optional[int]] = {}
+    for node_id in order:
+        step = steps[node_id]
+        if step.alias_of:
+            channels[node_id] = channels.get(step.alias_of)
+            continue
+        input_channels = {edge.to_port: channels.get(edge.from_node) for edge in step.inputs}
+        channels[node_id] = step.node_impl.output_channels(step.params, input_channels)
+    return channels
+
+
+class CommonStepRule(OptimizationRule):
+    """合并类型、参数和输入都相同的节点"""
+
+    @property
+    def name(self) -> str:
+        return "common_steps"
+
+    @property
+    def description(self) -> str:
+        return "相同类型、参数和输入的节点只执行一次"
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        result = eliminate_common_steps(order, steps)
+        records = [
+            self.record([node_id, step.alias_of], f"与 {step.alias_of} 相同")
+            for node_id, step in result.items()
+            if step.alias_of and not steps[node_id].alias_of
+        ]
+        return order, result, records
+
+
+class PassThroughRule(OptimizationRule):
+    """透传节点（查看器/输出节点）改为别名，直接复用上游输出"""
+
+    @property
+    def name(self) -> str:
+        return "passthrough"
+
+    @property
+    def description(self) -> str:
+        return "ImageViewer、JSONOutput、Output 等透传节点不再作为执行步骤"
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        steps = dict(steps)
+        records = []
+        for node_id in order:
+            step = steps[node_id]
+            ports = step.node_impl.passthrough_ports
+            if not ports or step.alias_of:
+                continue
+            edges = {edge.to_port: edge for edge in step.inputs}
+            sources = {edges[port].from_node for port in ports.values() if port in edges}
+            # 所有透传端口都需连接到同一个上游
+            if len(sources) != 1 or len(edges) != len(set(ports.values())):
+                continue
+            source = sources.pop()
+            steps[node_id] = step.model_copy(update={
+                "alias_of": source,
+                "alias_ports": {out_port: edges[in_port].from_port for out_port, in_port in ports.items()},
+            })
+            records.append(self.record([node_id], f"透传 {source} 的输出"))
+        return order, steps, records
+
+
+class GrayscaleNoOpRule(OptimizationRule):
+    """单通道输入上的灰度化是空操作"""
+
+    @property
+    def name(self) -> str:
+        return "grayscale_noop"
+
+    @property
+    def description(self) -> str:
+        return "输入已是单通道图像时跳过 Grayscale"
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        channels = infer_channels(order, steps)
+        steps = dict(steps)
+        records = []
+        for node_id in order:
+            step = steps[node_id]
+            if step.node_type != "Grayscale" or step.alias_of or len(step.inputs) != 1:
+                continue
+            edge = step.inputs[0]
+            if channels.get(edge.from_node) != 1:
+                continue
+            steps[node_id] = step.model_copy(update={
+                "alias_of": edge.from_node,
+                "alias_ports": {"image": edge.from_port},
+            })
+            records.append(self.record([node_id], f"{edge.from_node} 的输出已是单通道"))
+        return order, steps, records
+
+
+class PointwiseFusionRule(OptimizationRule):
+    """连续的逐像素节点融合为一次查表"""
+
+    @property
+    def name(self) -> str:
+        return "pointwise_fusion"
+
+    @property
+    def description(self) -> str:
+        return "连续的逐像素节点（Grayscale、Threshold 等）合并为一次 cv2.LUT"
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        records = []
+        for chain in find_chains(order, steps, lambda step: step.node_impl.is_pointwise):
+            node_impl = PointwiseChainNode([(steps[n].node_impl, steps[n].params) for n in chain])
+            params = {"chain": [[steps[n].node_type, steps[n].params] for n in chain]}
+            order, steps = merge_chain(order, steps, chain, node_impl, params)
+            records.append(self.record(chain))
+        return order, steps, records
+
+
+class MorphologyFusionRule(OptimizationRule):
+    """连续的形态学节点合并，迭代折叠为更大的核"""
+
+    _NODE_TYPES = ("Erode", "Dilate", "Open", "Close")
+
+    @property
+    def name(self) -> str:
+        return "morphology_fusion"
+
+    @property
+    def description(self) -> str:
+        return "Erode/Dilate/Open/Close 链化简为最少的 erode/dilate/morphologyEx 调用"
+
+    def _accept(self, step: PlanStep) -> bool:
+        # 空核在 OpenCV 中表示默认的 3x3 核，不参与化简
+        return (
+            step.node_type in self._NODE_TYPES
+            and step.params.get("kernel_size", 3) >= 1
+            and step.params.get("iterations", 1) >= 0
+        )
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        records = []
+        for chain in find_chains(order, steps, self._accept, min_length=1):
+            ops = [op for n in chain for op in morphology_ops(steps[n].node_type, steps[n].params)]
+            simplified = simplify_morphology(ops)
+            # 单个节点且无可折叠的迭代时保持原样
+            if len(chain) == 1 and simplified == ops:
+                continue
+            node_impl = MorphologyChainNode(simplified, [steps[n].node_impl.name for n in chain])
+            params = {"chain": [[steps[n].node_type, steps[n].params] for n in chain]}
+            order, steps = merge_chain(order, steps, chain, node_impl, params)
+            records.append(self.record(chain, f"{len(ops)} 次操作化简为 {len(simplified)} 次"))
+        return order, steps, records
+
+
+class CropPushdownRule(OptimizationRule):
+    """从 Crop 向上游传播裁剪区域，上游的逐像素/邻域节点只处理裁剪区域及其邻域"""
+
+    @property
+    def name(self) -> str:
+        return "crop_pushdown"
+
+    @property
+    def description(self) -> str:
+        return "Crop 之前的 Threshold、GaussianBlur、形态学等节点只计算裁剪区域外扩核半径的窗口"
+
+    @staticmethod
+    def _upstream(steps: Dict[str, PlanStep], step: PlanStep) -> Optional[PlanStep]:
+        """可并入裁剪的上游节点：经 image 端口直连、只有这一个下游且输出只取决于局部邻域"""
+        if len(step.inputs) != 1 or step.inputs[0].to_port != "image" or step.inputs[0].from_port != "image":
+            return None
+        source = steps[step.inputs[0].from_node]
+        if (
+            source.alias_of
+            or source.node_impl.is_sink
+            or not source.node_impl.deterministic
+            or source.dependents != (step.node_id,)
+            or list(source.node_impl.input_ports) != ["image"]
+            or list(source.node_impl.output_ports) != ["image"]
+            or source.node_impl.spatial_halo(source.params) is None
+        ):
+            return None
+        return source
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        records = []
+        for node_id in list(order):
+            step = steps[node_id]
+            if step.node_type != "Crop" or step.alias_of:
+                continue
+            chain = []
+            source = self._upstream(steps, step)
+            while source is not None:
+                chain.insert(0, source.node_id)
+                source = self._upstream(steps, source)
+            if not chain:
+                continue
+
+            halo = sum(steps[n].node_impl.spatial_halo(steps[n].params) for n in chain)
+            node_impl = CropPushdownNode(
+                (step.node_impl, step.params), [(steps[n].node_impl, steps[n].params) for n in chain], halo
+            )
+            params = {"crop": step.params, "chain": [[steps[n].node_type, steps[n].params] for n in chain]}
+            order, steps = merge_chain(order, steps, [*chain, node_id], node_impl, params)
+            records.append(self.record([*chain, node_id], f"外扩 {halo} 像素"))
+        return order, steps, records
+
+
+class ResizeCollapseRule(OptimizationRule):
+    """连续的 Resize 只保留最后一次（有损：跳过中间尺寸的重采样）"""
+
+    @property
+    def name(self) -> str:
+        return "resize_collapse"
+
+    @property
+    def description(self) -> str:
+        return "连续的 Resize 合并为一次，直接缩放到最终尺寸"
+
+    @property
+    def aggressive(self) -> bool:
+        return True
+
+    def apply(self, order: List[str], steps: Dict[str, PlanStep]) -> RewriteResult:
+        records = []
+        for chain in find_chains(order, steps, lambda step: step.node_type == "Resize"):
+            last = steps[chain[-1]]
+            order, steps = merge_chain(order, steps, chain, last.node_impl, last.params)
+            records.append(self.record(chain, f"直接缩放到 {last.params.get('width')}x{last.params.get('height')}"))
+        return order, steps, records
+
+
+def default_rules() -> List[OptimizationRule]:
+    """内置规则（按应用顺序）"""
+    return [
+        CommonStepRule(),
+        PassThroughRule(),
+        GrayscaleNoOpRule(),
+        ResizeCollapseRule(),
+        PointwiseFusionRule(),
+        MorphologyFusionRule(),
+        CropPushdownRule(),
+    ]
+
+
+class PlanOptimizer:
+    """
+    执行计划优化器
+
+    按顺序对编译后的计划应用改写规则，记录每条生效的改写。
+    规则可通过 register 扩展。
+    """
+
+    def __init__(self, rules: Optional[List[OptimizationRule]] = None):
+        self.rules = list(rules) if rules is not None else default_rules()
+
+    def register(self, rule: OptimizationRule, before: Optional[str] = None):
+        """
+        注册规则
+
+        Args:
+            rule: 规则
+            before: 插入到该名称的规则之前，默认追加到末尾
+        """
+        names = [r.name for r in self.rules]
+        if before in names:
+            self.rules.insert(names.index(before), rule)
+        else:
+            self.rules.append(rule)
+
+    def optimize(self, order: List[str], steps: Dict[str, PlanStep], level: str = "safe") -> RewriteResult:
+        """
+        优化计划
+
+        Args:
+            order: 拓扑顺序
+            steps: 计划步骤
+            level: 优化级别 off/safe/aggressive
+
+        Returns:
+            (新的拓扑顺序, 新的步骤表, 生效的改写记录)
+        """
+        if level not in OPTIMIZATION_LEVELS:
+            raise ValueError(f"未知优化级别: {level}")
+
+        records: List[OptimizationRecord] = []
+        if level == "off":
+            return order, steps, records
+
+        for rule in self.rules:
+            if rule.aggressive and level != "aggressive":
+                continue
+            order, steps, fired = rule.apply(order, steps)
+            if fired:
+                logger.debug(f"优化规则 {rule.name} 生效 {len(fired)} 次")
+            records.extend(fired)
+        return order, steps, records
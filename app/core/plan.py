@@ -0,0 +1,317 @@
+"""工作流执行计划"""
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from app.models.workflow import Workflow
+from app.core.nodes.base import BaseNode
+
+
+class PlanInput(BaseModel):
+    """计划中的输入边（端口名称已解析）"""
+    model_config = ConfigDict(frozen=True)
+
+    from_node: str
+    from_port: str
+    to_port: str
+
+
+class PlanStep(BaseModel):
+    """计划中的单个执行步骤"""
+    model_config = ConfigDict(frozen=True, arbitrary_types_allowed=True)
+
+    node_id: str
+    node_type: str
+    node_impl: BaseNode
+    params: Dict[str, Any]
+    inputs: Tuple[PlanInput, ...] = ()
+    dependencies: Tuple[str, ...] = ()
+    dependents: Tuple[str, ...] = ()
+    alias_of: Optional[str] = None  # 与该节点完全相同，直接复用其输出
+    alias_ports: Optional[Dict[str, str]] = None  # 只复用部分端口 {output_port: alias_of 的端口}
+    fused: Tuple[str, ...] = ()  # 融合到本步骤中的节点（不单独执行）
+    fused_into: Optional[str] = None  # 已融合到该步骤
+
+
+class OptimizationRecord(BaseModel):
+    """一次生效的优化改写"""
+    model_config = ConfigDict(frozen=True)
+
+    rule: str
+    nodes: Tuple[str, ...]
+    detail: str = ""
+
+
+class ExecutionPlan(BaseModel):
+    """
+    编译后的执行计划（不可变）
+
+    包含拓扑顺序、绑定的节点实现、已解析的端口连接和已校验的参数，
+    同一版本的工作流在多次运行和批处理中复用。
+    """
+    model_config = ConfigDict(frozen=True)
+
+    workflow_id: str
+    version: str
+    order: Tuple[str, ...]
+    steps: Dict[str, PlanStep]
+    sinks: Tuple[str, ...] = ()  # 查看器/输出节点
+    level: str = "off"  # 优化级别
+    optimizations: Tuple[OptimizationRecord, ...] = ()  # 生效的优化改写
+    preview_scale: Optional[float] = None  # 代理分辨率的缩放比例（参数已按比例换算）
+
+    def explain(self) -> Dict[str, Any]:
+        """计划说明：优化级别、生效的改写和每个节点的执行方式"""
+        nodes = {}
+        for node_id, step in self.steps.items():
+            if step.fused_into:
+                mode = "fused"
+            elif step.alias_of:
+                mode = "alias"
+            else:
+                mode = "execute"
+            nodes[node_id] = {
+                "node_type": step.node_type,
+                "mode": mode,
+                "alias_of": step.alias_of,
+                "fused": list(step.fused),
+                "fused_into": step.fused_into,
+            }
+        return {
+            "workflow_id": self.workflow_id,
+            "version": self.version,
+            "level": self.level,
+            "order": list(self.order),
+            "optimizations": [record.model_dump() for record in self.optimizations],
+            "nodes": nodes,
+        }
+
+    def with_params(self, overrides: Dict[str, Dict[str, Any]]) -> "ExecutionPlan":
+        """
+        替换部分节点的参数（批处理时每项只替换输入节点的参数，无需重新编译）
+
+        Args:
+            overrides: {node_id: 需要覆盖的参数}
+        """
+        steps = dict(self.steps)
+        for node_id, params in overrides.items():
+            if node_id not in steps:
+                raise ValueError(f"节点 {node_id} 不存在")
+            steps[node_id] = steps[node_id].model_copy(update={"params": {**steps[node_id].params, **params}})
+        return self.model_copy(update={"steps": steps})
+
+    def subgraph_order(self, node_id: str) -> List[str]:
+        """获取指定节点及其所有上游节点的执行顺序（单步调试）"""
+        return self._ancestor_order([node_id])
+
+    def live_order(self, outputs: Optional[List[str]] = None, retained: Optional[List[str]] = None) -> List[str]:
+        """
+        获取产生输出所需节点的执行顺序（裁剪无用分支）
+
+        只保留能到达查看器/输出节点、outputs 或 retained 中节点的节点；
+        工作流中没有任何输出节点且未指定 outputs 时执行全部节点。
+        """
+        targets = [*self.sinks, *(outputs or [])]
+        if not targets:
+            return list(self.order)
+        return self._ancestor_order([*targets, *(retained or [])])
+
+    def _ancestor_order(self, node_ids: List[str]) -> List[str]:
+        """指定节点及其所有上游节点（拓扑顺序）"""
+        for node_id in node_ids:
+            if node_id not in self.steps:
+                raise ValueError(f"节点 {node_id} 不存在")
+
+        needed = set(node_ids)
+        stack = list(needed)
+        while stack:
+            for dep_id in self.steps[stack.pop()].dependencies:
+                if dep_id not in needed:
+                    needed.add(dep_id)
+                    stack.append(dep_id)
+
+        # 计划顺序已是拓扑序，过滤即可
+        return [nid for nid in self.order if nid in needed]
+
+
+def workflow_fingerprint(workflow: Workflow) -> str:
+    """
+    计算工作流的内容哈希
+
+    只包含影响执行的字段（节点类型、参数和连接），移动节点位置等编辑不会导致重新编译。
+    """
+    content = {
+        "nodes": [[node.id, node.type, node.params] for node in workflow.nodes],
+        "links": [
+            [link.from_.node, link.from_.port, link.to.node, link.to.port]
+            for link in workflow.links
+        ],
+    }
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def eliminate_common_steps(order: List[str], steps: Dict[str, PlanStep]) -> Dict[str, PlanStep]:
+    """
+    公共子表达式消除
+
+    类型、规范化参数和输入（上游已替换为等价节点）都相同的确定性节点只执行一次，
+    重复的节点改为别名步骤：依赖等价节点并复用其输出，仍单独报告状态和输出。
+    按拓扑顺序处理，复制粘贴的整条分支会逐级合并。
+
+    Returns:
+        替换后的步骤
+    """
+    canonical: Dict[str, str] = {}  # node_id -> 等价节点ID
+    seen: Dict[str, str] = {}  # 签名 -> 首个节点ID
+    aliases: Dict[str, str] = {}
+
+    for node_id in order:
+        step = steps[node_id]
+        canonical[node_id] = node_id
+        if not step.node_impl.deterministic:
+            continue
+        signature = json.dumps(
+            [
+                step.node_type,
+                step.params,
+                sorted((edge.to_port, canonical[edge.from_node], edge.from_port) for edge in step.inputs),
+            ],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=repr,
+        )
+        if signature in seen:
+            aliases[node_id] = canonical[node_id] = seen[signature]
+        else:
+            seen[signature] = node_id
+
+    if not aliases:
+        return steps
+
+    extra_dependents: Dict[str, List[str]] = {}
+    for node_id, target_id in aliases.items():
+        extra_dependents.setdefault(target_id, []).append(node_id)
+
+    result = {}
+    for node_id in order:
+        step = steps[node_id]
+        update: Dict[str, Any] = {}
+        if node_id in aliases:
+            update["alias_of"] = aliases[node_id]
+            update["dependencies"] = (*step.dependencies, aliases[node_id])
+        if node_id in extra_dependents:
+            update["dependents"] = (*step.dependents, *extra_dependents[node_id])
+        result[node_id] = step.model_copy(update=update) if update else step
+    return result
+
+
+def _coerce_param(node_id: str, name: str, prop: Dict[str, Any], value: Any) -> Any:
+    """按 schema 类型校验并转换单个参数"""
+    param_type = prop.get("type")
+    try:
+        if param_type == "integer":
+            if isinstance(value, bool):
+                raise TypeError
+            if isinstance(value, float) and not value.is_integer():
+                raise TypeError
+            value = int(value)
+        elif param_type == "number":
+            if isinstance(value, bool):
+                raise TypeError
+            if isinstance(value, str):
+                value = float(value)
+            elif not isinstance(value, (int, float)):
+                raise TypeError
+        elif param_type == "string":
+            if not isinstance(value, str):
+                raise TypeError
+        elif param_type == "boolean":
+            if not isinstance(value, bool):
+                raise TypeError
+    except (TypeError, ValueError):
+        raise ValueError(f"节点 {node_id} 参数 {name} 类型错误，应为 {param_type}: {value!r}")
+
+    if "enum" in prop and value not in prop["enum"]:
+        raise ValueError(f"节点 {node_id} 参数 {name} 取值无效: {value!r}，可选值: {prop['enum']}")
+    return value
+
+
+def validate_params(node_id: str, node_impl: BaseNode, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按节点的 param_schema 校验参数
+
+    缺省参数填充默认值，数值参数做类型转换；schema 之外的参数原样保留。
+
+    Args:
+        node_id: 节点ID（用于错误信息）
+        node_impl: 节点实现
+        params: 原始参数
+
+    Returns:
+        校验后的参数副本
+    """
+    schema = node_impl.param_schema
+    properties = schema.get("properties", {})
+    required = set(schema.get("required", []))
+    result = copy.deepcopy(params)
+
+    for name, prop in properties.items():
+        if result.get(name) is None:
+            if "default" in prop:
+                result[name] = copy.deepcopy(prop["default"])
+            elif name in required:
+                raise ValueError(f"节点 {node_id} 缺少必填参数: {name}")
+            continue
+        result[name] = _coerce_param(node_id, name, prop, result[name])
+
+    return result
+
+
+class PlanCache:
+    """执行计划缓存（LRU，按工作流ID+内容哈希索引）"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._plans: "OrderedDict[Tuple[str, ...], ExecutionPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, ...]) -> Optional[ExecutionPlan]:
+        """获取计划"""
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def put(self, key: Tuple[str, ...], plan: ExecutionPlan):
+        """缓存计划"""
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def invalidate(self, workflow_id: str):
+        """使指定工作流的所有计划失效"""
+        with self._lock:
+            for key in [key for key in self._plans if key[0] == workflow_id]:
+                del self._plans[key]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -0,0 +1,363 @@
+"""流式处理（视频逐帧通过已编译的工作流）"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Any, AsyncIterator, Optional, Set, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from app.models.workflow import Workflow
+from app.models.run import RunStatus
+from app.core.nodes.base import NodeContext
+from app.core.plan import ExecutionPlan, PlanStep
+from app.core.workflow import WorkflowEngine
+from app.core.batch import resolve_input_node
+from app.core.incremental import DirtyRectRunner
+
+logger = logging.getLogger(__name__)
+
+
+class FrameGate:
+    """
+    帧差门限
+
+    帧缩小为宽 size 像素的灰度图后，与上一处理帧的平均绝对差低于 threshold（0-255）时跳过该帧。
+    """
+
+    def __init__(self, threshold: float, size: int = 64):
+        self.threshold = threshold
+        self.size = size
+        self._last: Optional[np.ndarray] = None
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = frame.shape[:2]
+        size = (min(self.size, width), max(1, round(height * min(self.size, width) / width)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def accept(self, frame: np.ndarray) -> bool:
+        """是否处理该帧（处理的帧成为新的比较基准）"""
+        thumbnail = self._thumbnail(frame)
+        if (
+            self._last is not None
+            and self._last.shape == thumbnail.shape
+            and float(cv2.absdiff(thumbnail, self._last).mean()) < self.threshold
+        ):
+            return False
+        self._last = thumbnail
+        return True
+
+
+class StreamRunner:
+    """
+    流式执行器
+
+    工作流只编译一次，输入节点的连接在开始前解析好；每帧只按固定顺序依次执行节点，
+    不再做依赖图构建、状态记录和输出缓存等单次运行的准备工作。视频在单独的线程中解码，
+    最多预读 prefetch 帧，内存占用与视频长度无关。固定机位等相邻帧只有局部变化的视频
+    可启用脏矩形增量执行。
+    """
+
+    def __init__(self, engine: WorkflowEngine, prefetch: int = 4):
+        self.engine = engine
+        self.prefetch = prefetch
+        self.streams: Dict[str, Dict[str, Any]] = {}  # stream_id -> stream_data
+
+    def prepare(
+        self,
+        workflow: Workflow,
+        input_node: Optional[str] = None,
+        outputs: Optional[List[str]] = None,
+        preview_scale: Optional[float] = None,
+    ) -> Tuple[ExecutionPlan, str, List[PlanStep], List[str]]:
+        """
+        编译流式处理的执行计划
+
+        Returns:
+            (执行计划, VideoInput 节点ID, 每帧依次执行的步骤, 输出节点ID)
+        """
+        plan = self.engine.select_plan(workflow, outputs, preview_scale=preview_scale)
+        source_id = resolve_input_node(plan, input_node, "VideoInput")
+        order = [node_id for node_id in plan.live_order(outputs) if node_id != source_id]
+        for node_id in order:
+            if not plan.steps[node_id].inputs and plan.steps[node_id].alias_of is None:
+                raise ValueError(f"流式处理只支持一个输入节点，节点 {node_id} 没有输入")
+        targets = list(outputs or [node_id for node_id in plan.sinks if node_id in order])
+        if not targets and order:
+            targets = [order[-1]]
+        return plan, source_id, [plan.steps[node_id] for node_id in order], targets
+
+    async def frames(
+        self,
+        workflow: Workflow,
+        params: Optional[Dict[str, Any]] = None,
+        input_node: Optional[str] = None,
+        outputs: Optional[List[str]] = None,
+        gate_threshold: Optional[float] = None,
+        gate_size: int = 64,
+        input_data: Optional[Dict[str, Any]] = None,
+        backend: Optional[str] = None,
+        preview_scale: Optional[float] = None,
+        incremental: bool = False,
+        dirty_cell: int = 32,
+        dirty_threshold: int = 0,
+        max_dirty_ratio: float = 0.5,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐帧执行工作流
+
+        Args:
+            workflow: 工作流定义
+            params: 覆盖 VideoInput 节点的参数（如 path、frame_step）
+            input_node: VideoInput 节点ID（工作流只有一个时可省略）
+            outputs: 需要输出的节点ID，默认为查看器/输出节点
+            gate_threshold: 帧差门限，与上一处理帧的差异低于该值的帧跳过（None 表示处理每一帧）
+            gate_size: 计算帧差时缩小到的宽度
+            input_data: 输入数据
+            backend: CPU 节点执行后端
+            preview_scale: 代理分辨率运行的缩放比例
+            incremental: 脏矩形增量执行：只对与上一处理帧相比变化的区域执行局部邻域节点（见 DirtyRectRunner）
+            dirty_cell: 汇总变化像素的格子边长
+            dirty_threshold: 视为变化的最小像素差（0 时结果与整帧处理逐位一致）
+            max_dirty_ratio: 需要重新计算的面积超过该比例时整帧执行
+
+        Yields:
+            {"index": 帧序号, "skipped": 是否跳过, "dirty": 重新计算的面积比例, "outputs": {node_id: outputs}}；
+            跳过的帧沿用上一处理帧的输出
+        """
+        plan, source_id, steps, targets = self.prepare(workflow, input_node, outputs, preview_scale)
+        source = plan.steps[source_id]
+        source_params = {**source.params, **(params or {})}
+        gate = FrameGate(gate_threshold, gate_size) if gate_threshold is not None else None
+        dirty = None
+        if incremental:
+            dirty = DirtyRectRunner(self.engine.executor, dirty_cell, dirty_threshold, max_dirty_ratio)
+            dirty.prepare(plan, [source_id, *(step.node_id for step in steps)], set(targets))
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(max(1, self.prefetch))
+        stop = threading.Event()
+
+        def read():
+            # 解码线程：每解码一帧占用一个预读名额，消费后归还
+            frames = source.node_impl.iter_frames(source_params)
+            try:
+                while True:
+                    slots.acquire()
+                    if stop.is_set():
+                        break
+                    frame = next(frames, None)
+                    loop.call_soon_threadsafe(queue.put_nowait, frame)
+                    if frame is None:
+                        break
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                frames.close()
+
+        reader = asyncio.create_task(asyncio.to_thread(read))
+        last_values: Dict[str, Dict[str, Any]] = {}
+        last_outputs: Dict[str, Dict[str, Any]] = {}
+        index = 0
+        try:
+            while (frame := await queue.get()) is not None:
+                if isinstance(frame, Exception):
+                    raise frame
+                slots.release()
+                if gate is not None and not gate.accept(frame):
+                    yield {"index": index, "skipped": True, "dirty": 0.0, "outputs": last_outputs}
+                    index += 1
+                    continue
+
+                ratio = 1.0
+                if dirty is None:
+                    values = await self._process(steps, source_id, frame, input_data or {}, backend)
+                else:
+                    patched, ratio = await dirty.run(plan, frame, input_data or {}, backend)
+                    if patched is None:
+                        values = await self._process(steps, source_id, frame, input_data or {}, backend)
+                        dirty.update(frame, values)
+                    elif ratio == 0:
+                        # 与上一处理帧完全相同
+                        values = last_values
+                    else:
+                        values = await self._process(
+                            steps, source_id, frame, input_data or {}, backend, patched, dirty.nodes
+                        )
+                last_values = values
+                last_outputs = {node_id: values[node_id] for node_id in targets if node_id in values}
+                yield {"index": index, "skipped": False, "dirty": ratio, "outputs": last_outputs}
+                index += 1
+        finally:
+            stop.set()
+            slots.release()
+            await reader
+
+    async def _process(
+        self,
+        steps: List[PlanStep],
+        source_id: str,
+        frame: np.ndarray,
+        input_data: Dict[str, Any],
+        backend: Optional[str],
+        preset: Optional[Dict[str, Dict[str, Any]]] = None,
+        skip: Optional[Set[str]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """对一帧依次执行各步骤（preset 中已有输出的节点和 skip 中的节点不执行）"""
+        values: Dict[str, Dict[str, Any]] = {source_id: {"image": frame}, **(preset or {})}
+        for step in steps:
+            if step.node_id in values or step.node_id in (skip or ()):
+                continue
+            if step.alias_of:
+                source = values[step.alias_of]
+                values[step.node_id] = source if step.alias_ports is None else {
+                    port: source[from_port] for port, from_port in step.alias_ports.items()
+                }
+                continue
+            inputs = {}
+            for edge in step.inputs:
+                from_outputs = values.get(edge.from_node)
+                if not from_outputs:
+                    continue
+                from_port = edge.from_port if edge.from_port in from_outputs else next(iter(from_outputs))
+                inputs[edge.to_port] = from_outputs[from_port]
+            context = NodeContext(node_id=step.node_id, inputs=inputs, params=step.params, input_data=input_data)
+            values[step.node_id] = await self.engine.executor.run(step.node_impl, context, backend)
+        return values
+
+    def create(
+        self,
+        workflow: Workflow,
+        stream_id: str,
+        params: Optional[Dict[str, Any]] = None,
+        input_node: Optional[str] = None,
+        output_node: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        创建流式处理（参数错误时抛出 ValueError）
+
+        Args:
+            workflow: 工作流定义
+            stream_id: 流式处理ID
+            params: 覆盖 VideoInput 节点的参数
+            input_node: VideoInput 节点ID
+            output_node: 编码为视频的节点ID，默认为唯一的查看器/输出节点
+
+        Returns:
+            流式处理数据
+        """
+        outputs = [output_node] if output_node else None
+        plan, input_node, _, targets = self.prepare(workflow, input_node, outputs)
+        if len(targets) != 1:
+            raise ValueError("工作流包含多个输出节点，请指定 output_node")
+
+        stream_data = {
+            "stream_id": stream_id,
+            "workflow_id": workflow.workflow_id,
+            "status": RunStatus.PENDING,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "frames": 0,
+            "processed": 0,
+            "skipped": 0,
+            "output": None,
+            "workflow": workflow,
+            "params": params or {},
+            "source_params": {**plan.steps[input_node].params, **(params or {})},
+            "input_node": input_node,
+            "output_node": targets[0],
+        }
+        self.streams[stream_id] = stream_data
+        return stream_data
+
+    async def run(
+        self,
+        stream_id: str,
+        output_path: str,
+        output_port: str = "image",
+        **options: Any,
+    ) -> Dict[str, Any]:
+        """
+        执行流式处理，把输出节点的图像逐帧编码为视频
+
+        Args:
+            stream_id: 流式处理ID
+            output_path: 视频文件路径（.mp4 以 mp4v 编码，其余以 MJPG 编码）
+            output_port: 编码的输出端口
+            **options: 传给 frames 的其余参数（gate_threshold、gate_size、input_data 等）
+
+        Returns:
+            流式处理数据
+        """
+        stream = self.streams[stream_id]
+        if stream["status"] != RunStatus.CANCELLED:
+            stream["status"] = RunStatus.RUNNING
+        stream["started_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        start_time = time.time()
+        output_node = stream["output_node"]
+        writer: Optional[cv2.VideoWriter] = None
+        frame_size: Optional[Tuple[int, int]] = None
+
+        frames = self.frames(stream["workflow"], stream["params"], stream["input_node"], [output_node], **options)
+        try:
+            async for result in frames:
+                if stream["status"] == RunStatus.CANCELLED:
+                    break
+                stream["frames"] += 1
+                stream["skipped" if result["skipped"] else "processed"] += 1
+
+                image = result["outputs"].get(output_node, {}).get(output_port)
+                if not isinstance(image, np.ndarray):
+                    raise ValueError(f"节点 {output_node} 的输出 {output_port} 不是图像")
+                if image.ndim == 2:
+                    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+                if writer is None:
+                    frame_size = (image.shape[1], image.shape[0])
+                    writer = self._open_writer(stream["source_params"], output_path, frame_size)
+                elif (image.shape[1], image.shape[0]) != frame_size:
+                    raise ValueError(f"第 {result['index']} 帧的输出尺寸与第一帧不同")
+                await asyncio.to_thread(writer.write, image)
+
+            if stream["status"] != RunStatus.CANCELLED:
+                stream["status"] = RunStatus.COMPLETED
+        except Exception as e:
+            stream["status"] = RunStatus.FAILED
+            stream["error"] = str(e)
+            logger.error(f"流式处理 {stream_id} 失败: {e}", exc_info=True)
+        finally:
+            # 提前结束时停止解码线程
+            await frames.aclose()
+            if writer is not None:
+                writer.release()
+                stream["output"] = output_path
+
+        stream["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        logger.info(
+            f"流式处理 {stream_id} 结束：{stream['frames']} 帧，处理 {stream['processed']} 帧，"
+            f"跳过 {stream['skipped']} 帧，耗时 {time.time() - start_time:.2f}s"
+        )
+        return stream
+
+    def _open_writer(self, params: Dict[str, Any], output_path: str, frame_size: Tuple[int, int]) -> cv2.VideoWriter:
+        """按视频输入的帧率创建视频编码器"""
+        fps = self.engine.node_registry.get("VideoInput").frame_rate(params)
+        codec = "mp4v" if output_path.lower().endswith(".mp4") else "MJPG"
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, frame_size)
+        if not writer.isOpened():
+            raise ValueError(f"无法创建视频文件: {output_path}")
+        return writer
+
+    def get_stream(self, stream_id: str) -> Optional[Dict[str, Any]]:
+        """获取流式处理"""
+        return self.streams.get(stream_id)
+
+    def cancel_stream(self, stream_id: str):
+        """取消流式处理（已编码的帧保留在视频中）"""
+        stream = self.streams.get(stream_id)
+        if stream is not None and stream["status"] in (RunStatus.PENDING, RunStatus.RUNNING):
+            stream["status"] = RunStatus.CANCELLED
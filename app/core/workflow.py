@@ -2,14 +2,26 @@
 import asyncio
 import time
 import uuid
-from typing import Dict, List, Any, Optional, Set
+from typing import Dict, List, Any, Optional, Set, Tuple
 from collections import defaultdict, deque
 import logging
 
-from app.models.workflow import Workflow, Node, Link, NodeStatus
-from app.models.run import RunStatus, NodeOutput
+from app.models.workflow import Workflow, Node, Link
+from app.models.run import RunStatus, NodeStatus, NodeOutput
 from app.core.nodes.registry import NodeRegistry
-from app.core.nodes.base import NodeContext
+from app.core.nodes.base import NodeContext, ExecutionKind
+from app.core.executor import NodeExecutor
+from app.core.cache import NodeOutputCache, node_cache_key, hash_value
+from app.core.optimizer import PlanOptimizer
+from app.core.tiling import TiledRunner
+from app.core.plan import (
+    ExecutionPlan,
+    PlanCache,
+    PlanInput,
+    PlanStep,
+    validate_params,
+    workflow_fingerprint,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +29,21 @@ logger = logging.getLogger(__name__)
 class WorkflowEngine:
     """工作流执行引擎"""
 
-    def __init__(self, node_registry: NodeRegistry):
+    def __init__(
+        self,
+        node_registry: NodeRegistry,
+        executor: Optional[NodeExecutor] = None,
+        output_cache: Optional[NodeOutputCache] = None,
+        optimizer: Optional[PlanOptimizer] = None,
+    ):
         self.node_registry = node_registry
+        self.executor = executor or NodeExecutor()
+        self.output_cache = output_cache  # 跨运行的节点输出缓存，None 表示不启用
+        self.optimizer = optimizer or PlanOptimizer()
+        self.plan_cache = PlanCache()
         self.runs: Dict[str, Dict[str, Any]] = {}  # run_id -> run_data
+        # 渐进式运行中正在执行的一代 {run_id: (事件循环, 任务)}，工作流修改后取消
+        self._progressive: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
 
     async def execute(
         self,
@@ -28,16 +52,44 @@ class WorkflowEngine:
         input_data: Optional[Dict[str, Any]] = None,
         start_node_id: Optional[str] = None,
         max_concurrent: int = 4,
+        backend: Optional[str] = None,
+        retain_outputs: Optional[List[str]] = None,
+        retain_all_outputs: bool = False,
+        use_cache: bool = True,
+        base_run_id: Optional[str] = None,
+        outputs: Optional[List[str]] = None,
+        tile_size: Optional[int] = None,
+        preview_scale: Optional[float] = None,
+        plan: Optional[ExecutionPlan] = None,
+        preloaded: Optional[Dict[str, Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
         """
         执行工作流
 
+        中间结果在其所有下游节点执行成功后即从执行缓存中释放，
+        运行结束后只保留查看器/输出节点、末端节点和显式指定节点的输出。
+
         Args:
             workflow: 工作流定义
             run_id: 运行ID
             input_data: 输入数据
             start_node_id: 从指定节点开始运行（单步调试）
             max_concurrent: 最大并发数
+            backend: CPU 节点执行后端（thread/process），默认由节点类型决定
+            retain_outputs: 额外保留输出的节点ID（调试用）
+            retain_all_outputs: 保留所有节点输出（不释放中间结果）
+            use_cache: 是否使用跨运行的节点输出缓存
+            base_run_id: 增量执行的基准运行ID，只重新计算相对该运行有变化的节点及其下游；
+                与 start_node_id 同时指定时目标节点总是重新执行，失败的运行则从失败节点继续
+            outputs: 需要输出的节点ID；完整执行时只运行能到达这些节点或查看器/输出节点的节点，
+                其余节点标记为跳过
+            tile_size: 分块执行的块边长；指定时输入图像以内存映射方式读取，
+                输出只取决于局部邻域的节点逐块执行，用于整幅载入会耗尽内存的超大图像
+            preview_scale: 代理分辨率运行的缩放比例（0-1）：输入图像读取时缩小，
+                核大小、坐标等参数按比例换算，输出标记为代理结果
+            plan: 预先选定的执行计划（批处理时各项复用），默认按工作流编译
+            preloaded: 预先得到的节点输出 {node_id: outputs}（如批处理预读解码的输入图像、
+                堆叠批量执行的结果），按拓扑顺序给出，这些节点不再执行
 
         Returns:
             运行结果
@@ -54,31 +106,76 @@ class WorkflowEngine:
             "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
             "node_statuses": {},
             "node_outputs": {},
-            "node_cache": {},  # 节点输出缓存
+            "node_cache": {},  # 节点输出缓存（中间结果在下游全部完成后释放）
+            "value_keys": {},  # 节点输出值的缓存键 {node_id: {port: key}}
+            "node_keys": {},  # 确定性节点的缓存键 {node_id: key}
+            "node_signatures": {},  # 节点结构签名，供增量执行比较
             "logs": [],
         }
         self.runs[run_id] = run_data
 
         try:
-            # 构建依赖图
-            graph = self._build_graph(workflow)
-            
-            # 拓扑排序
+            if plan is None:
+                plan = self.select_plan(
+                    workflow,
+                    [start_node_id, *(retain_outputs or []), *(outputs or [])],
+                    retain_all_outputs,
+                    preview_scale,
+                )
+            run_data["workflow_version"] = plan.version
+            run_data["preview_scale"] = plan.preview_scale
+
             if start_node_id:
-                # 单步调试：只执行从指定节点开始的子图
-                execution_order = self._get_subgraph_order(graph, start_node_id)
+                # 单步调试：只执行指定节点及其上游子图
+                execution_order = plan.subgraph_order(start_node_id)
             else:
-                # 完整执行
-                execution_order = self._topological_sort(graph)
+                # 完整执行：裁剪不产生输出的分支（retain_outputs 中的节点同样视为需要输出）
+                execution_order = plan.live_order(outputs, retain_outputs)
+                live = set(execution_order)
+                for node_id, step in plan.steps.items():
+                    if (step.fused_into or node_id) not in live:
+                        run_data["node_statuses"][node_id] = NodeStatus.SKIPPED
+
+            if retain_all_outputs:
+                retained = set(execution_order)
+            else:
+                retained = self._retained_nodes(
+                    plan, execution_order, start_node_id, [*(retain_outputs or []), *(outputs or [])]
+                )
+
+            run_data["node_signatures"] = await asyncio.to_thread(self._node_signatures, plan, execution_order)
+            if base_run_id:
+                # 增量执行：未变化的节点复用基准运行的输出
+                execution_order = await self._reuse_run_outputs(
+                    plan, execution_order, run_data, base_run_id, retained, use_cache, start_node_id
+                )
+
+            if tile_size:
+                # 分块执行：可分块的子图逐块执行，其输出拼接为内存映射数组供其余节点使用
+                runner = TiledRunner(self.executor, tile_size)
+                execution_order, tiled_outputs = await runner.run(
+                    plan, execution_order, run_data, input_data, retained, max_concurrent, backend
+                )
+                for node_id, node_outputs in tiled_outputs.items():
+                    run_data["node_cache"][node_id] = node_outputs
+                    if node_id in retained:
+                        self._record_outputs(run_data, node_id, node_outputs)
+
+            if preloaded:
+                execution_order = await self._preload_outputs(
+                    plan, execution_order, run_data, preloaded, retained, use_cache
+                )
 
             # 执行节点
             await self._execute_nodes(
-                workflow,
+                plan,
                 execution_order,
-                graph,
                 run_data,
                 input_data,
                 max_concurrent,
+                backend,
+                retained,
+                use_cache,
             )
 
             run_data["status"] = RunStatus.COMPLETED
@@ -93,29 +190,233 @@ class WorkflowEngine:
 
         return run_data
 
+    async def execute_progressive(
+        self,
+        workflow: Workflow,
+        run_id: str,
+        preview_scale: float = 0.25,
+        **options: Any,
+    ) -> Dict[str, Any]:
+        """
+        渐进式执行：先以代理分辨率快速运行，再运行全分辨率
+
+        每一代是一个独立的子运行（运行ID 为 {run_id}.0、{run_id}.1），记录在 generations 中；
+        本运行的节点状态和输出始终为最近完成的一代。全分辨率运行期间工作流被修改时自动取消
+        （见 cancel_stale_runs），已完成的代理结果保留。
+
+        Args:
+            workflow: 工作流定义
+            run_id: 运行ID
+            preview_scale: 第一代的缩放比例
+            **options: 传给 execute 的其余参数
+
+        Returns:
+            运行结果
+        """
+        run_data = {
+            "run_id": run_id,
+            "workflow_id": workflow.workflow_id,
+            "workflow_version": workflow_fingerprint(workflow),
+            "status": RunStatus.RUNNING,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "node_statuses": {},
+            "node_outputs": {},
+            "logs": [],
+            "generations": [],
+        }
+        self.runs[run_id] = run_data
+        loop = asyncio.get_running_loop()
+
+        for index, scale in enumerate((preview_scale, None)):
+            generation_id = f"{run_id}.{index}"
+            generation = {"generation": index, "run_id": generation_id, "preview_scale": scale, "status": RunStatus.RUNNING}
+            run_data["generations"].append(generation)
+
+            task = asyncio.create_task(self.execute(workflow, generation_id, preview_scale=scale, **options))
+            self._progressive[run_id] = (loop, task)
+            try:
+                await asyncio.wait({task})
+            finally:
+                self._progressive.pop(run_id, None)
+                task.cancel()
+
+            if task.cancelled():
+                generation["status"] = RunStatus.CANCELLED
+                if generation_id in self.runs:
+                    self.runs[generation_id]["status"] = RunStatus.CANCELLED
+                run_data["status"] = RunStatus.CANCELLED
+                run_data["error"] = run_data.get("error") or "运行已取消"
+                break
+
+            result = task.result()
+            generation["status"] = result["status"]
+            if result["status"] != RunStatus.COMPLETED:
+                run_data["status"] = result["status"]
+                run_data["error"] = result.get("error")
+                break
+            # 对外展示最近完成的一代
+            run_data["preview_scale"] = result.get("preview_scale")
+            for name in ("node_statuses", "node_outputs", "logs"):
+                run_data[name] = result[name]
+        else:
+            run_data["status"] = RunStatus.COMPLETED
+
+        run_data["completed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        return run_data
+
+    def cancel_stale_runs(self, workflow_id: str, version: Optional[str] = None):
+        """
+        取消基于旧版本工作流的渐进式运行（工作流保存或删除时调用，可在任意线程调用）
+
+        Args:
+            workflow_id: 工作流ID
+            version: 工作流当前的内容哈希，None 表示已删除；只移动节点位置等不影响结果的编辑不会取消运行
+        """
+        for run_id, (loop, task) in list(self._progressive.items()):
+            run_data = self.runs.get(run_id, {})
+            if run_data.get("workflow_id") == workflow_id and run_data.get("workflow_version") != version:
+                run_data["error"] = "工作流已修改，运行已取消"
+                loop.call_soon_threadsafe(task.cancel)
+
+    def compile(
+        self, workflow: Workflow, level: Optional[str] = None, preview_scale: Optional[float] = None
+    ) -> ExecutionPlan:
+        """
+        获取工作流的执行计划
+
+        计划按工作流ID和内容哈希缓存，工作流未变更时直接复用，
+        省去构建依赖图、拓扑排序、解析节点实现和校验参数的开销。
+
+        Args:
+            workflow: 工作流定义
+            level: 优化级别 off/safe/aggressive，默认使用工作流的设置
+            preview_scale: 代理分辨率的缩放比例（0-1），各节点以像素为单位的参数按比例换算
+        """
+        level = level or workflow.optimization
+        if preview_scale is not None and preview_scale >= 1:
+            preview_scale = None
+        version = workflow_fingerprint(workflow)
+        key = (workflow.workflow_id, version, level, str(preview_scale or ""))
+        plan = self.plan_cache.get(key)
+        if plan is None:
+            plan = self._compile_plan(workflow, version, level, preview_scale)
+            self.plan_cache.put(key, plan)
+        return plan
+
+    def select_plan(
+        self,
+        workflow: Workflow,
+        requested: Optional[List[Optional[str]]] = None,
+        retain_all_outputs: bool = False,
+        preview_scale: Optional[float] = None,
+    ) -> ExecutionPlan:
+        """
+        选择运行使用的执行计划
+
+        需要已融合节点的中间输出（requested 中的节点被融合，或保留全部输出）时使用未优化的计划。
+        """
+        plan = self.compile(workflow, preview_scale=preview_scale)
+        if retain_all_outputs or any(plan.steps[n].fused_into for n in requested or [] if n in plan.steps):
+            plan = self.compile(workflow, level="off", preview_scale=preview_scale)
+        return plan
+
+    def invalidate_plans(self, workflow_id: str):
+        """使工作流的已编译计划失效（工作流保存或删除时调用）"""
+        self.plan_cache.invalidate(workflow_id)
+
+    def _compile_plan(
+        self, workflow: Workflow, version: str, level: str = "safe", preview_scale: Optional[float] = None
+    ) -> ExecutionPlan:
+        """编译执行计划"""
+        graph = self._build_graph(workflow)
+        order = self._topological_sort(graph)
+
+        steps = {}
+        for node_id in order:
+            entry = graph[node_id]
+            node = entry["node"]
+            node_impl = self.node_registry.get(node.type)
+            params = validate_params(node_id, node_impl, node.params)
+            if preview_scale:
+                params = node_impl.scale_params(params, preview_scale)
+            steps[node_id] = PlanStep(
+                node_id=node_id,
+                node_type=node.type,
+                node_impl=node_impl,
+                params=params,
+                inputs=tuple(PlanInput(**edge) for edge in entry["inputs"]),
+                dependencies=tuple(entry["dependencies"]),
+                dependents=tuple(entry["dependents"]),
+            )
+        order, steps, optimizations = self.optimizer.optimize(order, steps, level)
+
+        return ExecutionPlan(
+            workflow_id=workflow.workflow_id,
+            version=version,
+            order=tuple(order),
+            steps=steps,
+            sinks=tuple(node_id for node_id in order if steps[node_id].node_impl.is_sink),
+            level=level,
+            optimizations=tuple(optimizations),
+            preview_scale=preview_scale,
+        )
+
     def _build_graph(self, workflow: Workflow) -> Dict[str, Dict[str, Any]]:
-        """构建依赖图"""
+        """
+        构建依赖图
+
+        每个节点除依赖/被依赖列表外，还带有已解析端口名称的输入边列表
+        inputs: [{"from_node", "from_port", "to_port"}]，执行和代码生成时无需再扫描全部连接。
+        """
         graph = {}
-        
+        node_types = {}
+
         # 初始化所有节点
         for node in workflow.nodes:
             graph[node.id] = {
                 "node": node,
                 "dependencies": [],  # 依赖的节点ID列表
                 "dependents": [],  # 依赖此节点的节点ID列表
+                "inputs": [],  # 输入边（端口名称已解析）
             }
+            node_types[node.id] = node.type
+
+        # 默认端口名称按节点类型只解析一次
+        default_input_ports: Dict[str, str] = {}
+        default_output_ports: Dict[str, str] = {}
 
         # 根据连接构建依赖关系
         for link in workflow.links:
             from_node_id = link.from_.node
             to_node_id = link.to.node
-            
+
             if from_node_id in graph and to_node_id in graph:
                 if from_node_id not in graph[to_node_id]["dependencies"]:
                     graph[to_node_id]["dependencies"].append(from_node_id)
-                if to_node_id not in graph[from_node_id]["dependents"]:
                     graph[from_node_id]["dependents"].append(to_node_id)
 
+                # 处理默认端口名称
+                from_port = link.from_.port
+                if from_port in ("output", "default"):
+                    from_type = node_types[from_node_id]
+                    if from_type not in default_output_ports:
+                        default_output_ports[from_type] = self._get_output_port_name(from_type)
+                    from_port = default_output_ports[from_type]
+
+                to_port = link.to.port
+                if to_port in ("input", "default"):
+                    to_type = node_types[to_node_id]
+                    if to_type not in default_input_ports:
+                        default_input_ports[to_type] = self._get_input_port_name(to_type)
+                    to_port = default_input_ports[to_type]
+
+                graph[to_node_id]["inputs"].append({
+                    "from_node": from_node_id,
+                    "from_port": from_port,
+                    "to_port": to_port,
+                })
+
         return graph
 
     def _topological_sort(self, graph: Dict[str, Dict[str, Any]]) -> List[str]:
@@ -138,144 +439,451 @@ class WorkflowEngine:
 
         return result
 
-    def _get_subgraph_order(self, graph: Dict[str, Dict[str, Any]], start_node_id: str) -> List[str]:
-        """获取从指定节点开始的子图执行顺序"""
-        if start_node_id not in graph:
-            raise ValueError(f"节点 {start_node_id} 不存在")
+    def _node_signatures(self, plan: ExecutionPlan, execution_order: List[str]) -> Dict[str, str]:
+        """
+        计算节点的结构签名
 
-        # BFS 收集所有需要执行的节点
-        visited = set()
-        queue = deque([start_node_id])
-        subgraph_nodes = set()
+        由节点类型、参数、输入连接和外部状态（如输入文件的修改时间）组成，
+        与上游节点的输出无关；上游变化经依赖关系向下传播。
+        """
+        signatures = {}
+        for node_id in execution_order:
+            step = plan.steps[node_id]
+            edges = {edge.to_port: f"{edge.from_node}:{edge.from_port}" for edge in step.inputs}
+            signatures[node_id] = node_cache_key(
+                step.node_type, step.params, edges, step.node_impl.external_state(step.params)
+            )
+        return signatures
 
-        while queue:
-            node_id = queue.popleft()
-            if node_id in visited:
+    async def _reuse_run_outputs(
+        self,
+        plan: ExecutionPlan,
+        execution_order: List[str],
+        run_data: Dict[str, Any],
+        base_run_id: str,
+        retained: Set[str],
+        use_cache: bool = True,
+        force_node_id: Optional[str] = None,
+    ) -> List[str]:
+        """
+        复用历史运行的输出
+
+        签名变化或在基准运行中未成功的节点、force_node_id（单步调试的目标节点）及其下游需要重新计算；
+        其余节点视为未变化，重新计算的节点所需的输入和需保留的输出从基准运行的执行缓存或节点输出缓存中取回，
+        取不到时（中间结果已释放且未缓存）连同其上游一起重新计算。
+
+        Returns:
+            需要执行的节点（拓扑顺序）
+        """
+        base_run = self.runs.get(base_run_id)
+        if base_run is None:
+            raise ValueError(f"运行 {base_run_id} 不存在")
+        if "generations" in base_run and base_run["status"] != RunStatus.RUNNING:
+            # 渐进式运行本身不执行节点，复用最近完成的一代
+            generation_id = next(
+                (
+                    generation["run_id"]
+                    for generation in reversed(base_run["generations"])
+                    if generation["status"] == RunStatus.COMPLETED and generation["run_id"] in self.runs
+                ),
+                None,
+            )
+            if generation_id is None:
+                raise ValueError(f"运行 {base_run_id} 没有完成的一代")
+            base_run_id, base_run = generation_id, self.runs[generation_id]
+        if base_run["workflow_id"] != run_data["workflow_id"]:
+            raise ValueError(f"运行 {base_run_id} 不属于工作流 {run_data['workflow_id']}")
+        if base_run["status"] == RunStatus.RUNNING:
+            raise ValueError(f"运行 {base_run_id} 尚未结束")
+
+        signatures = run_data["node_signatures"]
+        base_signatures = base_run.get("node_signatures", {})
+        base_statuses = base_run["node_statuses"]
+
+        # 按拓扑顺序标记变化的节点，下游随之变化
+        compute = set()
+        for node_id in execution_order:
+            if (
+                node_id == force_node_id
+                or signatures[node_id] != base_signatures.get(node_id)
+                or base_statuses.get(node_id) != NodeStatus.SUCCESS
+                or any(dep_id in compute for dep_id in plan.steps[node_id].dependencies)
+            ):
+                compute.add(node_id)
+
+        # 取回需要的输出：重新计算节点的上游，以及需保留输出的未变化节点
+        seeds: Dict[str, Dict[str, Any]] = {}
+        stack = [node_id for node_id in execution_order if node_id in retained and node_id not in compute]
+        for node_id in compute:
+            stack.extend(dep_id for dep_id in plan.steps[node_id].dependencies if dep_id not in compute)
+        while stack:
+            node_id = stack.pop()
+            if node_id in seeds or node_id in compute:
                 continue
-            visited.add(node_id)
-            subgraph_nodes.add(node_id)
+            outputs = await self._load_run_outputs(base_run, node_id, use_cache)
+            if outputs is None:
+                compute.add(node_id)
+                stack.extend(dep_id for dep_id in plan.steps[node_id].dependencies if dep_id not in compute)
+            else:
+                seeds[node_id] = outputs
 
-            # 添加依赖节点
-            for dep_id in graph[node_id]["dependencies"]:
-                if dep_id not in visited:
-                    queue.append(dep_id)
+        for node_id in execution_order:
+            if node_id in compute:
+                continue
+            if node_id in base_run["value_keys"]:
+                run_data["value_keys"][node_id] = base_run["value_keys"][node_id]
+            if node_id in base_run["node_keys"]:
+                run_data["node_keys"][node_id] = base_run["node_keys"][node_id]
+            if node_id in seeds:
+                run_data["node_cache"][node_id] = seeds[node_id]
+                if node_id in retained:
+                    self._record_outputs(run_data, node_id, seeds[node_id])
+            self._set_status(run_data, plan.steps[node_id], NodeStatus.SUCCESS)
+            run_data["logs"].append({
+                "node_id": node_id,
+                "type": "success",
+                "message": f"复用运行 {base_run_id} 的输出",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+
+        return [node_id for node_id in execution_order if node_id in compute]
+
+    async def _preload_outputs(
+        self,
+        plan: ExecutionPlan,
+        execution_order: List[str],
+        run_data: Dict[str, Any],
+        preloaded: Dict[str, Dict[str, Any]],
+        retained: Set[str],
+        use_cache: bool,
+    ) -> List[str]:
+        """
+        使用预先得到的节点输出
 
-        # 对子图进行拓扑排序
-        subgraph = {nid: graph[nid] for nid in subgraph_nodes}
-        return self._topological_sort(subgraph)
+        Returns:
+            剩余需要执行的节点
+        """
+        for node_id, outputs in preloaded.items():
+            if node_id not in execution_order:
+                continue
+            step = plan.steps[node_id]
+            if use_cache and self.output_cache is not None:
+                # 与实际执行时相同的方式记录输出值的键，下游节点仍可命中缓存
+                node_impl = step.node_impl
+                input_keys = {
+                    edge.to_port: run_data["value_keys"].get(edge.from_node, {}).get(edge.from_port)
+                    for edge in step.inputs
+                }
+                node_key = None
+                if node_impl.deterministic and None not in input_keys.values():
+                    node_key = node_cache_key(
+                        step.node_type, step.params, input_keys, node_impl.external_state(step.params)
+                    )
+                if node_key is not None:
+                    run_data["node_keys"][node_id] = node_key
+                    run_data["value_keys"][node_id] = {port: f"{node_key}:{port}" for port in outputs}
+                else:
+                    run_data["value_keys"][node_id] = {
+                        port: await asyncio.to_thread(hash_value, value) for port, value in outputs.items()
+                    }
+            run_data["node_cache"][node_id] = outputs
+            if node_id in retained:
+                self._record_outputs(run_data, node_id, outputs)
+            self._set_status(run_data, step, NodeStatus.SUCCESS)
+            run_data["logs"].append({
+                "node_id": node_id,
+                "type": "success",
+                "message": "使用预先得到的输出",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        return [node_id for node_id in execution_order if node_id not in preloaded]
+
+    async def _load_run_outputs(
+        self, run_data: Dict[str, Any], node_id: str, use_cache: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """从运行的执行缓存或节点输出缓存中取回节点输出，均不存在时返回 None"""
+        outputs = run_data["node_cache"].get(node_id)
+        if outputs is not None:
+            return outputs
+        node_key = run_data["node_keys"].get(node_id)
+        if use_cache and self.output_cache is not None and node_key is not None:
+            return await asyncio.to_thread(self.output_cache.get, node_key)
+        return None
 
     async def _execute_nodes(
         self,
-        workflow: Workflow,
+        plan: ExecutionPlan,
         execution_order: List[str],
-        graph: Dict[str, Dict[str, Any]],
         run_data: Dict[str, Any],
         input_data: Dict[str, Any],
         max_concurrent: int,
+        backend: Optional[str] = None,
+        retained: Optional[Set[str]] = None,
+        use_cache: bool = True,
     ):
-        """执行节点（按拓扑顺序逐个执行）"""
-        node_map = {node.id: node for node in workflow.nodes}
-
-        # 构建端口映射：处理默认端口名称
-        def get_input_port_name(node_type: str) -> str:
-            """获取节点的默认输入端口名称"""
-            node_impl = self.node_registry.get(node_type)
-            input_ports = list(node_impl.input_ports.keys())
-            return input_ports[0] if input_ports else "input"
-
-        def get_output_port_name(node_type: str) -> str:
-            """获取节点的默认输出端口名称"""
-            node_impl = self.node_registry.get(node_type)
-            output_ports = list(node_impl.output_ports.keys())
-            return output_ports[0] if output_ports else "output"
-
-        # 按拓扑顺序逐个执行
-        for node_id in execution_order:
-            node = node_map[node_id]
-            run_data["node_statuses"][node_id] = NodeStatus.RUNNING
-            
-            try:
-                # 收集输入数据
-                inputs = {}
-                for link in workflow.links:
-                    if link.to.node == node_id:
-                        from_node_id = link.from_.node
-                        from_port = link.from_.port
-                        to_port = link.to.port
-                        
-                        # 处理默认端口名称
-                        if from_port in ("output", "default"):
-                            from_node = node_map.get(from_node_id)
-                            if from_node:
-                                from_port = get_output_port_name(from_node.type)
-                        
-                        if to_port in ("input", "default"):
-                            to_port = get_input_port_name(node.type)
-                        
-                        # 从缓存获取输入
-                        if from_node_id in run_data["node_cache"]:
-                            from_outputs = run_data["node_cache"][from_node_id]
-                            if from_port in from_outputs:
-                                inputs[to_port] = from_outputs[from_port]
-                            else:
-                                # 尝试获取第一个输出
-                                if from_outputs:
-                                    first_output = list(from_outputs.values())[0]
-                                    inputs[to_port] = first_output
-
-                logger.info(f"节点 {node_id} 输入: {list(inputs.keys())}")
-
-                # 创建节点上下文
-                context = NodeContext(
-                    node_id=node_id,
-                    inputs=inputs,
-                    params=node.params,
-                    input_data=input_data,
-                )
+        """
+        执行节点（就绪队列调度）
 
-                # 获取节点实现
-                node_impl = self.node_registry.get(node.type)
-                if not node_impl:
-                    raise ValueError(f"未知节点类型: {node.type}")
-
-                # 执行节点
-                start_time = time.time()
-                outputs = await node_impl.execute(context)
-                duration = time.time() - start_time
-
-                # 缓存输出
-                run_data["node_cache"][node_id] = outputs
-                
-                # 记录输出
-                node_outputs = []
-                for output_name, output_value in outputs.items():
-                    output = NodeOutput(
-                        node_id=node_id,
-                        output_name=output_name,
-                        data_type=self._infer_data_type(output_value),
-                        value=output_value,
+        依赖全部完成的节点进入就绪队列，最多同时运行 max_concurrent 个节点。
+        任一节点失败后不再启动新节点，等待已启动的节点结束后抛出首个异常。
+
+        每个节点按本次执行范围内的下游数量计数，下游全部成功后释放其输出
+        （retained 中的节点除外）。失败时未完成下游的输入仍留在缓存中。
+        """
+        max_concurrent = max(1, max_concurrent)
+        retained = set(execution_order) if retained is None else retained
+        node_cache = run_data["node_cache"]
+
+        # 只统计本次执行范围内的依赖（单步调试时为子图）
+        scheduled = set(execution_order)
+        remaining = {
+            node_id: sum(1 for dep_id in plan.steps[node_id].dependencies if dep_id in scheduled)
+            for node_id in execution_order
+        }
+        # 预先载入的输出（复用其它运行）同样按下游计数释放
+        consumers = {
+            node_id: sum(1 for dependent_id in plan.steps[node_id].dependents if dependent_id in scheduled)
+            for node_id in [*execution_order, *(nid for nid in node_cache if nid not in scheduled)]
+        }
+        # 按拓扑顺序入队，保证并发度为 1 时与逐个执行的顺序一致
+        ready = deque(node_id for node_id in execution_order if remaining[node_id] == 0)
+        running: Dict[asyncio.Task, str] = {}
+        error: Optional[BaseException] = None
+
+        try:
+            while ready or running:
+                while ready and error is None and len(running) < max_concurrent:
+                    node_id = ready.popleft()
+                    task = asyncio.create_task(
+                        self._execute_node(
+                            plan.steps[node_id], run_data, input_data, backend, node_id in retained, use_cache
+                        )
                     )
-                    node_outputs.append(output)
-                run_data["node_outputs"][node_id] = node_outputs
+                    running[task] = node_id
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    if task.exception() is not None:
+                        if error is None:
+                            error = task.exception()
+                        continue
+
+                    for dependent_id in plan.steps[node_id].dependents:
+                        if dependent_id in remaining:
+                            remaining[dependent_id] -= 1
+                            if remaining[dependent_id] == 0:
+                                ready.append(dependent_id)
+
+                    # 释放已无待执行下游的中间结果
+                    for dep_id in plan.steps[node_id].dependencies:
+                        if dep_id in consumers:
+                            consumers[dep_id] -= 1
+                            if consumers[dep_id] == 0 and dep_id not in retained:
+                                node_cache.pop(dep_id, None)
+        finally:
+            # 外部取消时不留下悬挂的节点任务
+            for task in running:
+                task.cancel()
+
+        if error is not None:
+            raise error
+
+    def _retained_nodes(
+        self,
+        plan: ExecutionPlan,
+        execution_order: List[str],
+        start_node_id: Optional[str] = None,
+        retain_outputs: Optional[List[str]] = None,
+    ) -> Set[str]:
+        """
+        确定运行结束后需要保留输出的节点
 
-                run_data["node_statuses"][node_id] = NodeStatus.SUCCESS
+        包括：查看器/输出节点（is_sink）、本次执行范围内的末端节点、
+        单步调试的目标节点以及请求中显式指定的节点。
+        """
+        scheduled = set(execution_order)
+        retained = set(retain_outputs or [])
+        if start_node_id:
+            retained.add(start_node_id)
+        for node_id in execution_order:
+            step = plan.steps[node_id]
+            if step.node_impl.is_sink or not any(d in scheduled for d in step.dependents):
+                retained.add(node_id)
+        return retained
+
+    async def _execute_node(
+        self,
+        step: PlanStep,
+        run_data: Dict[str, Any],
+        input_data: Dict[str, Any],
+        backend: Optional[str] = None,
+        retain: bool = True,
+        use_cache: bool = True,
+    ):
+        """执行单个节点，并记录状态、输出和日志（retain 为 False 时不记录对外输出）"""
+        node_id = step.node_id
+        node_impl = step.node_impl
+        self._set_status(run_data, step, NodeStatus.RUNNING)
+        cache = self.output_cache if use_cache else None
+
+        try:
+            if step.alias_of:
+                self._alias_outputs(step, run_data, retain)
+                return
+
+            # 收集输入数据（端口名称已在编译计划时解析）及输入值的缓存键
+            inputs = {}
+            input_keys = {}
+            node_cache = run_data["node_cache"]
+            value_keys = run_data["value_keys"]
+            for edge in step.inputs:
+                from_outputs = node_cache.get(edge.from_node)
+                if not from_outputs:
+                    continue
+                # 端口不存在时尝试获取第一个输出
+                from_port = edge.from_port if edge.from_port in from_outputs else next(iter(from_outputs))
+                inputs[edge.to_port] = from_outputs[from_port]
+                input_keys[edge.to_port] = value_keys.get(edge.from_node, {}).get(from_port)
+
+            logger.info(f"节点 {node_id} 输入: {list(inputs.keys())}")
+
+            # 创建节点上下文
+            context = NodeContext(
+                node_id=node_id,
+                inputs=inputs,
+                params=step.params,
+                input_data=input_data,
+            )
+
+            # 确定性节点且所有输入值都有键时，可按内容寻址复用历史输出
+            node_key = None
+            if cache is not None and node_impl.deterministic and None not in input_keys.values():
+                node_key = node_cache_key(
+                    step.node_type, step.params, input_keys, node_impl.external_state(step.params)
+                )
+            # 轻量节点直接执行比查缓存更快，只参与键的传递
+            cacheable = node_key is not None and node_impl.execution_kind != ExecutionKind.TRIVIAL
+
+            start_time = time.time()
+            outputs = await asyncio.to_thread(cache.get, node_key) if cacheable else None
+            cache_hit = outputs is not None
+            if not cache_hit:
+                # 执行节点（阻塞计算交给执行器，不占用事件循环）
+                outputs = await self.executor.run(node_impl, context, backend)
+                if cacheable:
+                    await asyncio.to_thread(cache.put, node_key, outputs)
+            duration = time.time() - start_time
+
+            # 记录输出值的键供下游计算缓存键：确定性节点由自身键派生，否则按内容哈希
+            if cache is not None:
+                if node_key is not None:
+                    run_data["node_keys"][node_id] = node_key
+                    value_keys[node_id] = {port: f"{node_key}:{port}" for port in outputs}
+                else:
+                    value_keys[node_id] = {
+                        port: await asyncio.to_thread(hash_value, value) for port, value in outputs.items()
+                    }
+
+            # 缓存输出
+            node_cache[node_id] = outputs
+
+            # 记录对外输出（仅保留的节点）
+            if retain:
+                self._record_outputs(run_data, node_id, outputs)
+
+            self._set_status(run_data, step, NodeStatus.SUCCESS)
+            run_data["logs"].append({
+                "node_id": node_id,
+                "type": "success",
+                "message": f"命中缓存，耗时 {duration:.2f}s" if cache_hit else f"节点执行成功，耗时 {duration:.2f}s",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            for member_id in step.fused:
                 run_data["logs"].append({
-                    "node_id": node_id,
+                    "node_id": member_id,
                     "type": "success",
-                    "message": f"节点执行成功，耗时 {duration:.2f}s",
+                    "message": f"已融合到节点 {node_id} 执行",
                     "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
                 })
 
-            except Exception as e:
-                run_data["node_statuses"][node_id] = NodeStatus.FAILED
-                run_data["logs"].append({
-                    "node_id": node_id,
-                    "type": "error",
-                    "message": str(e),
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                })
-                logger.error(f"节点 {node_id} 执行失败: {e}", exc_info=True)
-                raise
+        except Exception as e:
+            self._set_status(run_data, step, NodeStatus.FAILED)
+            run_data["logs"].append({
+                "node_id": node_id,
+                "type": "error",
+                "message": str(e),
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            logger.error(f"节点 {node_id} 执行失败: {e}", exc_info=True)
+            raise
+
+    def _set_status(self, run_data: Dict[str, Any], step: PlanStep, status: NodeStatus):
+        """设置节点状态（融合步骤同时设置被融合节点的状态）"""
+        for node_id in (*step.fused, step.node_id):
+            run_data["node_statuses"][node_id] = status
+
+    def _alias_outputs(self, step: PlanStep, run_data: Dict[str, Any], retain: bool = True):
+        """别名步骤：复用等价节点（或透传节点的上游）的输出"""
+        node_id = step.node_id
+        source = run_data["node_cache"][step.alias_of]
+        source_keys = run_data["value_keys"].get(step.alias_of)
+        if step.alias_ports is None:
+            outputs = source
+            if source_keys is not None:
+                run_data["value_keys"][node_id] = source_keys
+            if step.alias_of in run_data["node_keys"]:
+                run_data["node_keys"][node_id] = run_data["node_keys"][step.alias_of]
+            message = f"与节点 {step.alias_of} 相同，复用其输出"
+        else:
+            outputs = {port: source[from_port] for port, from_port in step.alias_ports.items()}
+            if source_keys is not None:
+                run_data["value_keys"][node_id] = {
+                    port: source_keys.get(from_port) for port, from_port in step.alias_ports.items()
+                }
+            message = f"透传节点 {step.alias_of} 的输出"
+        run_data["node_cache"][node_id] = outputs
+        if retain:
+            self._record_outputs(run_data, node_id, outputs)
+
+        run_data["node_statuses"][node_id] = NodeStatus.SUCCESS
+        run_data["logs"].append({
+            "node_id": node_id,
+            "type": "success",
+            "message": message,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def _record_outputs(self, run_data: Dict[str, Any], node_id: str, outputs: Dict[str, Any]):
+        """记录节点的对外输出"""
+        # 代理分辨率运行的输出标记为代理结果
+        preview_scale = run_data.get("preview_scale")
+        metadata = {"proxy": True, "preview_scale": preview_scale} if preview_scale else None
+        run_data["node_outputs"][node_id] = [
+            NodeOutput(
+                node_id=node_id,
+                output_name=output_name,
+                data_type=self._infer_data_type(output_value),
+                value=output_value,
+                metadata=metadata,
+            )
+            for output_name, output_value in outputs.items()
+        ]
+
+    def _get_input_port_name(self, node_type: str) -> str:
+        """获取节点的默认输入端口名称"""
+        node_impl = self.node_registry.get(node_type)
+        input_ports = list(node_impl.input_ports.keys())
+        return input_ports[0] if input_ports else "input"
+
+    def _get_output_port_name(self, node_type: str) -> str:
+        """获取节点的默认输出端口名称"""
+        node_impl = self.node_registry.get(node_type)
+        output_ports = list(node_impl.output_ports.keys())
+        return output_ports[0] if output_ports else "output"
 
     def _infer_data_type(self, value: Any) -> str:
         """推断数据类型"""
@@ -295,4 +903,7 @@ class WorkflowEngine:
         """取消运行"""
         if run_id in self.runs:
             self.runs[run_id]["status"] = RunStatus.CANCELLED
+        if run_id in self._progressive:
+            loop, task = self._progressive[run_id]
+            loop.call_soon_threadsafe(task.cancel)
 
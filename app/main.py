@@ -1,18 +1,30 @@
 """
 FastAPI 应用入口
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
-from app.routers import workflows, nodes, runs, export, upload
+from app.routers import workflows, nodes, runs, batches, streams, ingest, export, upload
 from app.core.nodes.registry import NodeRegistry
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动时恢复目录导入任务，退出时停止"""
+    ingest.ingest_service.resume()
+    yield
+    await ingest.ingest_service.shutdown()
+
+
 app = FastAPI(
     title="图像处理工作流平台 API",
     description="可视化图像处理工作流编辑与执行平台",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS 配置
@@ -34,6 +46,9 @@ app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 app.include_router(workflows.router, prefix="/api/workflows", tags=["workflows"])
 app.include_router(nodes.router, prefix="/api/nodes", tags=["nodes"])
 app.include_router(runs.router, prefix="/api/runs", tags=["runs"])
+app.include_router(batches.router, prefix="/api/batches", tags=["batches"])
+app.include_router(streams.router, prefix="/api/streams", tags=["streams"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["ingest"])
 app.include_router(export.router, prefix="/api/export", tags=["export"])
 app.include_router(upload.router, prefix="/api/upload", tags=["upload"])
 
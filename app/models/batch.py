@@ -0,0 +1,63 @@
+"""批处理相关数据模型"""
+from typing import Dict, Any, Optional, List
+from pydantic import BaseModel, Field
+
+from app.models.run import RunStatus
+
+
+class BatchRequest(BaseModel):
+    """批处理请求（paths、upload_ids、glob 至少指定一项，按此顺序合并）"""
+    workflow_id: str = Field(..., description="工作流ID")
+    paths: Optional[List[str]] = Field(None, description="输入图像路径列表")
+    upload_ids: Optional[List[str]] = Field(None, description="上传文件ID列表")
+    glob: Optional[str] = Field(None, description="输入图像路径通配符（支持 **）")
+    input_node: Optional[str] = Field(None, description="替换输入的 ImageInput 节点ID（工作流只有一个时可省略）")
+    max_concurrent: int = Field(4, ge=1, description="同时处理的项数")
+    input_data: Optional[Dict[str, Any]] = Field(None, description="各项共用的输入数据")
+    backend: Optional[str] = Field(
+        None, pattern="^(thread|process)$", description="CPU 节点执行后端: thread, process（默认由节点类型决定）"
+    )
+    outputs: Optional[List[str]] = Field(None, description="需要输出的节点ID")
+    use_cache: bool = Field(True, description="复用历史运行中相同输入和参数的节点输出")
+    readers: int = Field(2, ge=1, description="同时读取解码输入图像的项数")
+    writers: int = Field(2, ge=1, description="同时编码写出结果的项数")
+    prefetch: int = Field(4, ge=1, description="预读的项数（各阶段之间队列的容量）")
+    stack_size: int = Field(
+        8, ge=1, description="输入尺寸相同的项堆叠为一组批量执行的最大项数（1 表示逐项执行）"
+    )
+    save_format: Optional[str] = Field(
+        None, pattern="^(png|jpg)$", description="结果图像的保存格式，保存到 outputs/{batch_id}/（默认不保存）"
+    )
+    keep_outputs: bool = Field(
+        True, description="在内存中保留各项的节点输出（大批量处理并保存结果时可关闭，各项写出后即释放）"
+    )
+
+
+class BatchItem(BaseModel):
+    """批处理中的单项"""
+    index: int = Field(..., description="序号")
+    input: str = Field(..., description="输入（路径或上传文件ID）")
+    run_id: str = Field(..., description="该项的运行ID（可通过运行 API 查询输出）")
+    status: RunStatus = Field(RunStatus.PENDING, description="状态")
+    error: Optional[str] = Field(None, description="错误信息")
+    duration: Optional[float] = Field(None, description="耗时（秒）")
+    files: List[str] = Field(default_factory=list, description="保存的结果文件")
+
+
+class BatchResponse(BaseModel):
+    """批处理响应"""
+    batch_id: str = Field(..., description="批处理ID")
+    workflow_id: str = Field(..., description="工作流ID")
+    status: RunStatus = Field(..., description="状态")
+    total: int = Field(..., description="总项数")
+    created_at: str = Field(..., description="创建时间")
+
+
+class BatchDetail(BatchResponse):
+    """批处理详情"""
+    started_at: Optional[str] = Field(None, description="开始时间")
+    completed_at: Optional[str] = Field(None, description="完成时间")
+    completed: int = Field(0, description="成功项数")
+    failed: int = Field(0, description="失败项数")
+    error: Optional[str] = Field(None, description="错误信息")
+    items: List[BatchItem] = Field(default_factory=list, description="各项状态")
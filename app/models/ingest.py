@@ -0,0 +1,46 @@
+"""目录导入相关数据模型"""
+from typing import Dict, Optional, List
+from pydantic import BaseModel, Field
+
+
+DEFAULT_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.bmp", "*.tif", "*.tiff"]
+
+
+class IngestConfig(BaseModel):
+    """目录导入配置"""
+    workflow_id: str = Field(..., description="绑定的工作流ID")
+    directory: str = Field(..., description="监视的目录")
+    patterns: List[str] = Field(default_factory=lambda: list(DEFAULT_PATTERNS), description="文件名通配符")
+    recursive: bool = Field(False, description="是否包含子目录")
+    input_node: Optional[str] = Field(None, description="替换输入的 ImageInput 节点ID（工作流只有一个时可省略）")
+    poll_interval: float = Field(2.0, gt=0, description="扫描间隔（秒）")
+    settle_seconds: float = Field(2.0, ge=0, description="文件大小和修改时间保持不变多久后视为写入完成（秒）")
+    max_batch: int = Field(16, ge=1, description="每批最多处理的文件数")
+    max_concurrent: int = Field(4, ge=1, description="批内同时处理的项数")
+    save_format: Optional[str] = Field(
+        None, pattern="^(png|jpg)$", description="结果图像的保存格式，保存到 outputs/{batch_id}/（默认不保存）"
+    )
+
+
+class IngestFile(BaseModel):
+    """已导入的文件"""
+    size: int = Field(..., description="文件大小")
+    mtime_ns: int = Field(..., description="修改时间（纳秒）")
+    status: str = Field(..., description="处理结果: completed, failed")
+    batch_id: Optional[str] = Field(None, description="批处理ID")
+    run_id: Optional[str] = Field(None, description="运行ID")
+    error: Optional[str] = Field(None, description="错误信息")
+    processed_at: str = Field(..., description="处理时间")
+
+
+class IngestDetail(IngestConfig):
+    """目录导入状态"""
+    ingest_id: str = Field(..., description="导入任务ID")
+    status: str = Field(..., description="状态: running, stopped")
+    created_at: str = Field(..., description="创建时间")
+    processed: int = Field(0, description="处理成功的文件数")
+    failed: int = Field(0, description="处理失败的文件数")
+    pending: int = Field(0, description="等待写入完成的文件数")
+    batches: List[str] = Field(default_factory=list, description="最近的批处理ID")
+    error: Optional[str] = Field(None, description="最近一次错误")
+    files: Optional[Dict[str, IngestFile]] = Field(None, description="文件处理记录（相对路径 -> 记录）")
@@ -37,7 +37,29 @@ class RunRequest(BaseModel):
     workflow_id: str = Field(..., description="工作流ID")
     input_data: Optional[Dict[str, Any]] = Field(None, description="输入数据")
     node_id: Optional[str] = Field(None, description="从指定节点开始运行（单步调试）")
-    max_concurrent: int = Field(4, description="最大并发数")
+    max_concurrent: int = Field(4, ge=1, description="最大并发数")
+    backend: Optional[str] = Field(
+        None, pattern="^(thread|process)$", description="CPU 节点执行后端: thread, process（默认由节点类型决定）"
+    )
+    retain_outputs: Optional[List[str]] = Field(None, description="额外保留输出的节点ID（调试用）")
+    retain_all_outputs: bool = Field(False, description="保留所有节点的中间输出")
+    use_cache: bool = Field(True, description="复用历史运行中相同输入和参数的节点输出")
+    base_run_id: Optional[str] = Field(None, description="增量执行的基准运行ID（只重新计算有变化的节点及其下游）")
+    outputs: Optional[List[str]] = Field(
+        None, description="需要输出的节点ID（与查看器/输出节点一起决定执行范围，其余分支跳过）"
+    )
+    from_run_id: Optional[str] = Field(
+        None, description="复用该运行的输出：单步调试时上游不再重新执行，失败重试时从失败节点继续"
+    )
+    tile_size: Optional[int] = Field(
+        None, ge=64, description="分块执行的块边长（超大图像以内存映射方式分块处理）"
+    )
+    preview_scale: Optional[float] = Field(
+        None, gt=0, le=1, description="代理分辨率预览的缩放比例（输出标记为代理结果）"
+    )
+    progressive: bool = Field(
+        False, description="渐进式运行：先以 preview_scale（默认 0.25）运行代理分辨率，再运行全分辨率"
+    )
 
 
 class RunResponse(BaseModel):
@@ -53,6 +75,10 @@ class RunResponse(BaseModel):
 
 class RunDetail(RunResponse):
     """运行详情"""
+    preview_scale: Optional[float] = Field(None, description="代理分辨率运行的缩放比例（结果为代理结果）")
+    generations: List[Dict[str, Any]] = Field(
+        default_factory=list, description="渐进式运行的各代结果 [{generation, run_id, preview_scale, status}]"
+    )
     node_statuses: Dict[str, NodeStatus] = Field(default_factory=dict, description="节点状态")
     node_outputs: Dict[str, List[NodeOutput]] = Field(default_factory=dict, description="节点输出")
     logs: List[Dict[str, Any]] = Field(default_factory=list, description="运行日志")
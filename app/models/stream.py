@@ -0,0 +1,44 @@
+"""流式处理相关数据模型"""
+from typing import Dict, Any, Optional
+from pydantic import BaseModel, Field
+
+from app.models.run import RunStatus
+
+
+class StreamRequest(BaseModel):
+    """流式处理请求"""
+    workflow_id: str = Field(..., description="工作流ID")
+    path: Optional[str] = Field(None, description="视频文件路径（覆盖 VideoInput 节点的参数）")
+    upload_id: Optional[str] = Field(None, description="上传文件ID（覆盖 VideoInput 节点的参数）")
+    input_node: Optional[str] = Field(None, description="VideoInput 节点ID（工作流只有一个时可省略）")
+    output_node: Optional[str] = Field(None, description="编码为视频的节点ID（工作流只有一个输出节点时可省略）")
+    gate_threshold: Optional[float] = Field(
+        None, ge=0, le=255, description="帧差门限：与上一处理帧缩小后的平均绝对差低于该值的帧跳过"
+    )
+    gate_size: int = Field(64, ge=8, description="计算帧差时缩小到的宽度")
+    incremental: bool = Field(False, description="脏矩形增量执行：只重新计算与上一处理帧相比变化的区域")
+    dirty_threshold: int = Field(0, ge=0, le=255, description="增量执行时视为变化的最小像素差（0 时结果精确）")
+    input_data: Optional[Dict[str, Any]] = Field(None, description="输入数据")
+    backend: Optional[str] = Field(
+        None, pattern="^(thread|process)$", description="CPU 节点执行后端: thread, process（默认由节点类型决定）"
+    )
+    format: str = Field("mp4", pattern="^(mp4|avi)$", description="输出视频格式")
+
+
+class StreamResponse(BaseModel):
+    """流式处理响应"""
+    stream_id: str = Field(..., description="流式处理ID")
+    workflow_id: str = Field(..., description="工作流ID")
+    status: RunStatus = Field(..., description="状态")
+    created_at: str = Field(..., description="创建时间")
+
+
+class StreamDetail(StreamResponse):
+    """流式处理详情"""
+    started_at: Optional[str] = Field(None, description="开始时间")
+    completed_at: Optional[str] = Field(None, description="完成时间")
+    frames: int = Field(0, description="已读取的帧数")
+    processed: int = Field(0, description="执行工作流的帧数")
+    skipped: int = Field(0, description="帧差低于门限而跳过的帧数")
+    output: Optional[str] = Field(None, description="输出视频路径")
+    error: Optional[str] = Field(None, description="错误信息")
@@ -46,6 +46,9 @@ class Workflow(BaseModel):
     description: Optional[str] = Field(None, description="工作流描述")
     nodes: List[Node] = Field(default_factory=list, description="节点列表")
     links: List[Link] = Field(default_factory=list, description="连接列表")
+    optimization: str = Field(
+        "safe", pattern="^(off|safe|aggressive)$", description="执行计划优化级别: off, safe, aggressive（含有损改写）"
+    )
     created_at: Optional[str] = Field(None, description="创建时间")
     updated_at: Optional[str] = Field(None, description="更新时间")
 
@@ -56,6 +59,7 @@ class WorkflowCreate(BaseModel):
     description: Optional[str] = None
     nodes: List[Node] = Field(default_factory=list)
     links: List[Link] = Field(default_factory=list)
+    optimization: str = Field("safe", pattern="^(off|safe|aggressive)$")
 
 
 class WorkflowUpdate(BaseModel):
@@ -64,4 +68,5 @@ class WorkflowUpdate(BaseModel):
     description: Optional[str] = None
     nodes: Optional[List[Node]] = None
     links: Optional[List[Link]] = None
+    optimization: Optional[str] = Field(None, pattern="^(off|safe|aggressive)$")
 
@@ -0,0 +1,77 @@
+"""批处理路由"""
+
+import uuid
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+
+from app.core.batch import BatchRunner, expand_inputs
+from app.models.batch import BatchDetail, BatchRequest, BatchResponse
+from app.routers.runs import workflow_engine
+from app.routers.workflows import storage
+
+router = APIRouter()
+# 与运行路由共用引擎：各项的运行可通过 /api/runs/{run_id} 查询，并共享计划缓存和节点输出缓存
+batch_runner = BatchRunner(workflow_engine)
+
+
+@router.post("", response_model=BatchResponse)
+async def create_batch(request: BatchRequest, background_tasks: BackgroundTasks):
+    """批量执行工作流"""
+    workflow = storage.get(request.workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="工作流不存在")
+
+    inputs = expand_inputs(request.paths, request.upload_ids, request.glob)
+    batch_id = str(uuid.uuid4())
+    try:
+        batch = batch_runner.create(workflow, batch_id, inputs, request.input_node, request.outputs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 整个批处理只占用一个后台任务
+    background_tasks.add_task(
+        batch_runner.run,
+        batch_id,
+        max_concurrent=request.max_concurrent,
+        input_data=request.input_data,
+        backend=request.backend,
+        use_cache=request.use_cache,
+        readers=request.readers,
+        writers=request.writers,
+        prefetch=request.prefetch,
+        stack_size=request.stack_size,
+        save_format=request.save_format,
+        keep_outputs=request.keep_outputs,
+    )
+
+    return BatchResponse(**batch)
+
+
+@router.get("/{batch_id}", response_model=BatchDetail)
+async def get_batch(batch_id: str):
+    """获取批处理状态（各项的输出通过 /api/runs/{run_id} 查询）"""
+    batch = batch_runner.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="批处理不存在")
+    return BatchDetail(**batch)
+
+
+@router.post("/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    """取消批处理"""
+    if not batch_runner.get_batch(batch_id):
+        raise HTTPException(status_code=404, detail="批处理不存在")
+    batch_runner.cancel_batch(batch_id)
+    return {"message": "批处理已取消"}
+
+
+@router.delete("/{batch_id}")
+async def delete_batch(batch_id: str):
+    """删除已结束的批处理及其各项的运行记录"""
+    if not batch_runner.get_batch(batch_id):
+        raise HTTPException(status_code=404, detail="批处理不存在")
+    try:
+        batch_runner.remove_batch(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "批处理已删除"}
@@ -0,0 +1,85 @@
+"""目录导入路由"""
+
+from typing import List
+
+from fastapi import APIRouter, HTTPException
+
+from app.models.ingest import IngestConfig, IngestDetail
+from app.routers.batches import batch_runner
+from app.routers.workflows import storage
+from app.services import IngestService, IngestWatcher
+
+router = APIRouter()
+# 与批处理路由共用执行器：每批可通过 /api/batches/{batch_id} 查询
+ingest_service = IngestService(batch_runner, storage.get)
+
+
+def _detail(watcher: IngestWatcher, include_files: bool = False) -> IngestDetail:
+    statuses = [record.status for record in watcher.files.values()]
+    return IngestDetail(
+        **watcher.config.model_dump(),
+        ingest_id=watcher.ingest_id,
+        status="running" if watcher.running else "stopped",
+        created_at=watcher.created_at,
+        processed=statuses.count("completed"),
+        failed=statuses.count("failed"),
+        pending=watcher.pending,
+        batches=watcher.batches,
+        error=watcher.error,
+        files=watcher.files if include_files else None,
+    )
+
+
+def _get_watcher(ingest_id: str) -> IngestWatcher:
+    watcher = ingest_service.get(ingest_id)
+    if not watcher:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return watcher
+
+
+@router.post("", response_model=IngestDetail)
+async def create_ingest(config: IngestConfig):
+    """监视目录，新文件写入完成后自动以绑定的工作流批量处理"""
+    if not storage.get(config.workflow_id):
+        raise HTTPException(status_code=404, detail="工作流不存在")
+    try:
+        watcher = ingest_service.create(config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _detail(watcher)
+
+
+@router.get("", response_model=List[IngestDetail])
+async def list_ingests():
+    """列出所有导入任务"""
+    return [_detail(watcher) for watcher in ingest_service.list_all()]
+
+
+@router.get("/{ingest_id}", response_model=IngestDetail)
+async def get_ingest(ingest_id: str, files: bool = False):
+    """获取导入任务状态（files=true 时包含各文件的处理记录）"""
+    return _detail(_get_watcher(ingest_id), files)
+
+
+@router.post("/{ingest_id}/start", response_model=IngestDetail)
+async def start_ingest(ingest_id: str):
+    """启动导入任务"""
+    watcher = _get_watcher(ingest_id)
+    ingest_service.start(ingest_id)
+    return _detail(watcher)
+
+
+@router.post("/{ingest_id}/stop", response_model=IngestDetail)
+async def stop_ingest(ingest_id: str):
+    """停止导入任务"""
+    watcher = _get_watcher(ingest_id)
+    await ingest_service.stop(ingest_id)
+    return _detail(watcher)
+
+
+@router.delete("/{ingest_id}")
+async def delete_ingest(ingest_id: str):
+    """删除导入任务及其处理记录"""
+    _get_watcher(ingest_id)
+    await ingest_service.delete(ingest_id)
+    return {"message": "导入任务已删除"}
@@ -1,21 +1,41 @@
 """运行路由"""
 
+import os
 import time
 import uuid
 from typing import Optional
 
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 
+from app.core.cache import NodeOutputCache
+from app.core.plan import workflow_fingerprint
 from app.core.nodes.registry import NodeRegistry
 from app.core.workflow import WorkflowEngine
 from app.models.run import RunDetail, RunRequest, RunResponse
 from app.routers.workflows import storage
-from app.utils.image import image_to_base64, image_to_thumbnail
+from app.services.job_queue import JobQueue, run_detail
 
 router = APIRouter()
 node_registry = NodeRegistry()
 node_registry.register_all()
-workflow_engine = WorkflowEngine(node_registry)
+# 节点输出缓存只启用内存层；需要跨重启复用时可传入 disk_dir 启用磁盘层
+workflow_engine = WorkflowEngine(node_registry, output_cache=NodeOutputCache())
+# 设置 JOB_QUEUE_DB 时运行写入持久化队列，由独立的工作进程（python -m app.worker）执行
+job_queue = JobQueue(os.environ["JOB_QUEUE_DB"]) if os.environ.get("JOB_QUEUE_DB") else None
+
+
+def _on_workflow_changed(workflow_id: str):
+    """工作流保存/删除后丢弃已编译的执行计划，并取消基于旧版本的渐进式运行"""
+    workflow_engine.invalidate_plans(workflow_id)
+    workflow = storage.get(workflow_id)
+    version = workflow_fingerprint(workflow) if workflow else None
+    workflow_engine.cancel_stale_runs(workflow_id, version)
+    if job_queue is not None:
+        # 工作进程续约时取回当前版本，取消基于旧版本的渐进式运行
+        job_queue.update_workflow_version(workflow_id, version)
+
+
+storage.add_listener(_on_workflow_changed)
 
 
 @router.post("", response_model=RunResponse)
@@ -24,18 +44,54 @@ async def run_workflow(request: RunRequest, background_tasks: BackgroundTasks):
     workflow = storage.get(request.workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="工作流不存在")
+    # from_run_id 与 base_run_id 均指定复用输出的历史运行
+    base_run_id = request.from_run_id or request.base_run_id
+    if base_run_id and job_queue is not None:
+        # 运行输出只保留在执行它的工作进程内存中，其他进程无法复用
+        raise HTTPException(status_code=400, detail="队列模式下不支持基于历史运行的增量执行")
+    if base_run_id and not workflow_engine.get_run(base_run_id):
+        raise HTTPException(status_code=404, detail="基准运行不存在")
 
     run_id = str(uuid.uuid4())
 
-    # 异步执行
-    background_tasks.add_task(
-        workflow_engine.execute,
-        workflow,
-        run_id,
-        request.input_data,
-        request.node_id,
-        request.max_concurrent,
+    options = dict(
+        input_data=request.input_data,
+        start_node_id=request.node_id,
+        max_concurrent=request.max_concurrent,
+        backend=request.backend,
+        retain_outputs=request.retain_outputs,
+        retain_all_outputs=request.retain_all_outputs,
+        use_cache=request.use_cache,
+        base_run_id=base_run_id,
+        outputs=request.outputs,
+        tile_size=request.tile_size,
     )
+    if job_queue is not None:
+        payload = {
+            "workflow": workflow.model_dump(mode="json"),
+            "options": options,
+            "progressive": request.progressive,
+            "preview_scale": request.preview_scale,
+        }
+        job = job_queue.enqueue(run_id, request.workflow_id, payload, workflow_fingerprint(workflow))
+        return RunResponse(
+            run_id=run_id, workflow_id=request.workflow_id, status=job["status"], created_at=job["created_at"]
+        )
+
+    # 异步执行
+    if request.progressive:
+        # 渐进式：先返回代理分辨率结果，再运行全分辨率
+        background_tasks.add_task(
+            workflow_engine.execute_progressive,
+            workflow,
+            run_id,
+            preview_scale=request.preview_scale or 0.25,
+            **options,
+        )
+    else:
+        background_tasks.add_task(
+            workflow_engine.execute, workflow, run_id, preview_scale=request.preview_scale, **options
+        )
 
     return RunResponse(
         run_id=run_id,
@@ -45,50 +101,55 @@ async def run_workflow(request: RunRequest, background_tasks: BackgroundTasks):
     )
 
 
+@router.get("/explain/{workflow_id}")
+async def explain_plan(workflow_id: str, level: Optional[str] = None):
+    """查看工作流编译后的执行计划及生效的优化改写"""
+    workflow = storage.get(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="工作流不存在")
+    try:
+        plan = workflow_engine.compile(workflow, level=level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return plan.explain()
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """获取节点输出缓存统计"""
+    return workflow_engine.output_cache.stats()
+
+
+@router.delete("/cache")
+async def clear_cache(disk: bool = False):
+    """清空节点输出缓存"""
+    workflow_engine.output_cache.clear(disk=disk)
+    return {"message": "缓存已清空"}
+
+
 @router.get("/{run_id}", response_model=RunDetail)
 async def get_run_status(run_id: str):
     """获取运行状态"""
     run_data = workflow_engine.get_run(run_id)
-    if not run_data:
+    if run_data:
+        return run_detail(run_data)
+    detail = job_queue.get_run(run_id) if job_queue is not None else None
+    if detail is None:
         raise HTTPException(status_code=404, detail="运行不存在")
-
-    # 处理图像输出（转换为Base64）
-    node_outputs = {}
-    for node_id, outputs in run_data.get("node_outputs", {}).items():
-        processed_outputs = []
-        for output in outputs:
-            # 如果是图像，转换为Base64
-            if output.data_type == "image" and output.value is not None:
-                import numpy as np
-
-                if isinstance(output.value, np.ndarray):
-                    output.thumbnail = image_to_thumbnail(output.value)
-                    output.value = image_to_base64(output.value)
-            processed_outputs.append(output)
-        node_outputs[node_id] = processed_outputs
-
-    return RunDetail(
-        run_id=run_data["run_id"],
-        workflow_id=run_data["workflow_id"],
-        status=run_data["status"],
-        created_at=run_data["created_at"],
-        started_at=run_data.get("started_at"),
-        completed_at=run_data.get("completed_at"),
-        error=run_data.get("error"),
-        node_statuses=run_data.get("node_statuses", {}),
-        node_outputs=node_outputs,
-        logs=run_data.get("logs", []),
-    )
+    return detail
 
 
 @router.get("/{run_id}/nodes/{node_id}/output")
 async def get_node_output(run_id: str, node_id: str, output_name: Optional[str] = None):
     """获取节点输出"""
     run_data = workflow_engine.get_run(run_id)
-    if not run_data:
-        raise HTTPException(status_code=404, detail="运行不存在")
-
-    node_outputs = run_data.get("node_outputs", {}).get(node_id, [])
+    if run_data:
+        node_outputs = run_data.get("node_outputs", {}).get(node_id, [])
+    else:
+        detail = job_queue.get_run(run_id) if job_queue is not None else None
+        if detail is None:
+            raise HTTPException(status_code=404, detail="运行不存在")
+        node_outputs = detail.node_outputs.get(node_id, [])
     if not node_outputs:
         raise HTTPException(status_code=404, detail="节点输出不存在")
 
@@ -106,5 +167,7 @@ async def get_node_output(run_id: str, node_id: str, output_name: Optional[str]
 @router.post("/{run_id}/cancel")
 async def cancel_run(run_id: str):
     """取消运行"""
+    if job_queue is not None and not workflow_engine.get_run(run_id):
+        job_queue.request_cancel(run_id)
     workflow_engine.cancel_run(run_id)
     return {"message": "运行已取消"}
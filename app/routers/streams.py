@@ -0,0 +1,61 @@
+"""流式处理路由"""
+
+import os
+import uuid
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException
+
+from app.core.streaming import StreamRunner
+from app.models.stream import StreamDetail, StreamRequest, StreamResponse
+from app.routers.runs import workflow_engine
+from app.routers.workflows import storage
+
+router = APIRouter()
+stream_runner = StreamRunner(workflow_engine)
+
+
+@router.post("", response_model=StreamResponse)
+async def create_stream(request: StreamRequest, background_tasks: BackgroundTasks):
+    """逐帧处理视频，结果编码为视频"""
+    workflow = storage.get(request.workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="工作流不存在")
+
+    params = {key: value for key, value in (("path", request.path), ("upload_id", request.upload_id)) if value}
+    stream_id = str(uuid.uuid4())
+    try:
+        stream = stream_runner.create(workflow, stream_id, params, request.input_node, request.output_node)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    background_tasks.add_task(
+        stream_runner.run,
+        stream_id,
+        os.path.join("outputs", f"{stream_id}.{request.format}"),
+        gate_threshold=request.gate_threshold,
+        gate_size=request.gate_size,
+        incremental=request.incremental,
+        dirty_threshold=request.dirty_threshold,
+        input_data=request.input_data,
+        backend=request.backend,
+    )
+
+    return StreamResponse(**stream)
+
+
+@router.get("/{stream_id}", response_model=StreamDetail)
+async def get_stream(stream_id: str):
+    """获取流式处理状态（输出视频可通过 /outputs/... 下载）"""
+    stream = stream_runner.get_stream(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="流式处理不存在")
+    return StreamDetail(**stream)
+
+
+@router.post("/{stream_id}/cancel")
+async def cancel_stream(stream_id: str):
+    """取消流式处理"""
+    if not stream_runner.get_stream(stream_id):
+        raise HTTPException(status_code=404, detail="流式处理不存在")
+    stream_runner.cancel_stream(stream_id)
+    return {"message": "流式处理已取消"}
@@ -25,6 +25,7 @@ async def create_workflow(workflow_data: WorkflowCreate):
         description=workflow_data.description,
         nodes=workflow_data.nodes,
         links=workflow_data.links,
+        optimization=workflow_data.optimization,
         created_at=time.strftime("%Y-%m-%d %H:%M:%S"),
         updated_at=time.strftime("%Y-%m-%d %H:%M:%S"),
     )
@@ -56,6 +57,8 @@ async def update_workflow(workflow_id: str, workflow_data: WorkflowUpdate):
         workflow.nodes = workflow_data.nodes
     if workflow_data.links is not None:
         workflow.links = workflow_data.links
+    if workflow_data.optimization is not None:
+        workflow.optimization = workflow_data.optimization
     workflow.updated_at = time.strftime("%Y-%m-%d %H:%M:%S")
 
     storage.save(workflow)
@@ -1,5 +1,7 @@
 """服务层模块"""
 
 from app.services.storage import WorkflowStorage
+from app.services.ingest import IngestService, IngestWatcher
+from app.services.job_queue import JobQueue
 
-__all__ = ["WorkflowStorage"]
+__all__ = ["WorkflowStorage", "IngestService", "IngestWatcher", "JobQueue"]
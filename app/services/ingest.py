@@ -0,0 +1,375 @@
+"""目录导入服务"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.batch import BatchRunner
+from app.models.ingest import IngestConfig, IngestFile
+from app.models.run import RunStatus
+from app.models.workflow import Workflow
+
+logger = logging.getLogger(__name__)
+
+
+class IngestWatcher:
+    """
+    监视目录的导入任务
+
+    定期扫描目录中的新文件；文件大小和修改时间在连续两次扫描中不变且持续 settle_seconds 后
+    视为写入完成，每次最多取 max_batch 个交给批处理，上一批处理完才开始下一批（背压）。
+    每批结束后把各文件的处理结果追加到记录文件（只写这一批的记录）：已成功或失败的文件不再处理
+    （文件被重新写入后除外），处理中途重启的文件没有记录，重启后重新处理，不会丢失。
+    文件从目录中移除后其记录随之删除；记录文件在加载时压缩，只保留每个文件的最新记录。
+    内存中只保留最近 MAX_BATCHES 批的批处理及其运行记录，更早的随之删除；结果保存为文件时
+    各项写出后即释放输出。
+    """
+
+    MAX_BATCHES = 20
+
+    def __init__(
+        self,
+        ingest_id: str,
+        config: IngestConfig,
+        batch_runner: BatchRunner,
+        get_workflow: Callable[[str], Optional[Workflow]],
+        state_file: Path,
+        created_at: Optional[str] = None,
+        files: Optional[Dict[str, IngestFile]] = None,
+        enabled: bool = True,
+    ):
+        self.ingest_id = ingest_id
+        self.config = config
+        self.batch_runner = batch_runner
+        self.get_workflow = get_workflow
+        self.state_file = state_file
+        self.created_at = created_at or time.strftime("%Y-%m-%d %H:%M:%S")
+        self.files: Dict[str, IngestFile] = files or {}
+        self.enabled = enabled  # 服务重启后是否自动启动
+        self.batches: List[str] = []
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._candidates: Dict[str, Tuple[Tuple[int, int], float]] = {}  # 相对路径 -> ((大小, 修改时间), 首次观察到的时间)
+        self._removed: List[str] = []  # 已从目录中移除、尚未写入记录文件的文件
+
+    @property
+    def records_file(self) -> Path:
+        """文件处理记录（JSON Lines，每行一条记录或删除标记，同一文件以最后一行为准）"""
+        return self.state_file.with_suffix(".files.jsonl")
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    @classmethod
+    def load(
+        cls,
+        state_file: Path,
+        batch_runner: BatchRunner,
+        get_workflow: Callable[[str], Optional[Workflow]],
+    ) -> "IngestWatcher":
+        """从状态文件和记录文件恢复导入任务（记录文件有重复或删除的记录时压缩）"""
+        with open(state_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        watcher = cls(
+            data["ingest_id"],
+            IngestConfig(**data["config"]),
+            batch_runner,
+            get_workflow,
+            state_file,
+            data.get("created_at"),
+            # 旧版本的状态文件中直接保存了文件处理记录
+            {path: IngestFile(**record) for path, record in data.get("files", {}).items()},
+            data.get("enabled", True),
+        )
+        lines = watcher._load_records()
+        if "files" in data or lines > len(watcher.files):
+            watcher.compact_records()
+            watcher.save()
+        return watcher
+
+    def save(self):
+        """保存配置（先写临时文件再替换，中途退出不会损坏状态文件）"""
+        data = {
+            "ingest_id": self.ingest_id,
+            "created_at": self.created_at,
+            "enabled": self.enabled,
+            "config": self.config.model_dump(),
+        }
+        temp_file = self.state_file.with_suffix(".tmp")
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    @staticmethod
+    def _record_line(path: str, record: Optional[IngestFile]) -> str:
+        data = {"path": path, **record.model_dump()} if record is not None else {"path": path, "removed": True}
+        return json.dumps(data, ensure_ascii=False) + "\n"
+
+    def _load_records(self) -> int:
+        """
+        读取记录文件
+
+        Returns:
+            有效记录的行数（中途退出时写了一半的最后一行跳过）
+        """
+        if not self.records_file.exists():
+            return 0
+        count = 0
+        with open(self.records_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                    path = data.pop("path")
+                    if data.get("removed"):
+                        self.files.pop(path, None)
+                    else:
+                        self.files[path] = IngestFile(**data)
+                except (ValueError, KeyError, TypeError):
+                    continue
+                count += 1
+        return count
+
+    def append_records(self, paths: List[str]):
+        """把指定文件的当前记录追加到记录文件（已不在内存中的文件写入删除标记）"""
+        if not paths:
+            return
+        with open(self.records_file, "a", encoding="utf-8") as f:
+            f.writelines(self._record_line(path, self.files.get(path)) for path in paths)
+
+    def compact_records(self):
+        """重写记录文件，只保留每个文件的最新记录"""
+        temp_file = self.records_file.with_suffix(".tmp")
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.writelines(self._record_line(path, record) for path, record in self.files.items())
+        os.replace(temp_file, self.records_file)
+
+    def scan(self) -> List[str]:
+        """
+        扫描目录
+
+        Returns:
+            写入完成且尚未处理的文件（相对路径，按名称排序）
+        """
+        config = self.config
+        now = time.time()
+        paths = set()
+        for pattern in config.patterns:
+            if config.recursive:
+                paths.update(glob.glob(os.path.join(config.directory, "**", pattern), recursive=True))
+            else:
+                paths.update(glob.glob(os.path.join(config.directory, pattern)))
+
+        candidates = {}
+        ready = []
+        present = set()
+        for path in sorted(paths):
+            relative = os.path.relpath(path, config.directory)
+            present.add(relative)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path):
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            record = self.files.get(relative)
+            if record is not None and (record.size, record.mtime_ns) == signature:
+                continue
+
+            previous = self._candidates.get(relative)
+            if previous is None or previous[0] != signature:
+                # 新出现或仍在写入
+                candidates[relative] = (signature, now)
+                continue
+            candidates[relative] = previous
+            if stat.st_size > 0 and now - previous[1] >= config.settle_seconds:
+                ready.append(relative)
+        self._candidates = candidates
+        # 目录暂时不可访问（如网络存储断开）时保留全部记录，避免恢复后重新处理所有文件
+        if os.path.isdir(config.directory):
+            for relative in [relative for relative in self.files if relative not in present]:
+                del self.files[relative]
+                self._removed.append(relative)
+        return ready
+
+    @property
+    def pending(self) -> int:
+        """等待写入完成的文件数"""
+        return len(self._candidates)
+
+    async def poll_once(self) -> int:
+        """
+        扫描一次并处理写入完成的文件
+
+        Returns:
+            本次处理的文件数
+        """
+        config = self.config
+        ready = (await asyncio.to_thread(self.scan))[:config.max_batch]
+        removed, self._removed = self._removed, []
+        await asyncio.to_thread(self.append_records, removed)
+        if not ready:
+            return 0
+        workflow = self.get_workflow(config.workflow_id)
+        if workflow is None:
+            raise ValueError(f"工作流 {config.workflow_id} 不存在")
+
+        signatures = {relative: self._candidates[relative][0] for relative in ready}
+        batch_id = str(uuid.uuid4())
+        inputs = [{"path": os.path.join(config.directory, relative), "upload_id": ""} for relative in ready]
+        self.batch_runner.create(workflow, batch_id, inputs, config.input_node)
+        self.batches.append(batch_id)
+        batch = await self.batch_runner.run(
+            batch_id,
+            max_concurrent=config.max_concurrent,
+            save_format=config.save_format,
+            keep_outputs=not config.save_format,
+        )
+
+        processed_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        recorded = []
+        for relative, item in zip(ready, batch["items"]):
+            if item["status"] not in (RunStatus.COMPLETED, RunStatus.FAILED):
+                # 被取消的项不记录，下次重新处理
+                continue
+            size, mtime_ns = signatures[relative]
+            self.files[relative] = IngestFile(
+                size=size,
+                mtime_ns=mtime_ns,
+                status=item["status"].value,
+                batch_id=batch_id,
+                run_id=item["run_id"],
+                error=item["error"],
+                processed_at=processed_at,
+            )
+            self._candidates.pop(relative, None)
+            recorded.append(relative)
+        await asyncio.to_thread(self.append_records, recorded)
+        # 处理记录已写入记录文件，删除更早的批处理
+        for old_batch_id in self.batches[:-self.MAX_BATCHES]:
+            self.batch_runner.remove_batch(old_batch_id)
+        self.batches = self.batches[-self.MAX_BATCHES:]
+        logger.info(f"导入任务 {self.ingest_id} 处理了 {len(ready)} 个文件（批处理 {batch_id}）")
+        return len(ready)
+
+    async def run(self):
+        """持续监视目录，直到任务被取消"""
+        while True:
+            full = False
+            try:
+                full = await self.poll_once() >= self.config.max_batch
+                self.error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"导入任务 {self.ingest_id} 失败: {e}", exc_info=True)
+            # 一批取满时可能还有积压的文件，立即继续
+            if not full:
+                await asyncio.sleep(self.config.poll_interval)
+
+
+class IngestService:
+    """目录导入服务（导入任务的配置和处理记录持久化，服务重启后恢复）"""
+
+    def __init__(
+        self,
+        batch_runner: BatchRunner,
+        get_workflow: Callable[[str], Optional[Workflow]],
+        storage_dir: str = "data/ingest",
+    ):
+        """
+        Args:
+            batch_runner: 批处理执行器
+            get_workflow: 按ID获取工作流（每批使用工作流的最新版本）
+            storage_dir: 状态文件目录
+        """
+        self.batch_runner = batch_runner
+        self.get_workflow = get_workflow
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.watchers: Dict[str, IngestWatcher] = {}
+
+    def create(self, config: IngestConfig) -> IngestWatcher:
+        """创建并启动导入任务（目录不存在时抛出 ValueError）"""
+        if not os.path.isdir(config.directory):
+            raise ValueError(f"目录不存在: {config.directory}")
+        ingest_id = str(uuid.uuid4())
+        watcher = IngestWatcher(
+            ingest_id, config, self.batch_runner, self.get_workflow, self.storage_dir / f"{ingest_id}.json"
+        )
+        watcher.save()
+        self.watchers[ingest_id] = watcher
+        self.start(ingest_id)
+        return watcher
+
+    def resume(self):
+        """恢复状态文件中的导入任务（应用启动时调用）"""
+        for state_file in sorted(self.storage_dir.glob("*.json")):
+            try:
+                watcher = IngestWatcher.load(state_file, self.batch_runner, self.get_workflow)
+            except Exception as e:
+                logger.error(f"加载导入任务失败 {state_file}: {e}")
+                continue
+            self.watchers[watcher.ingest_id] = watcher
+            if watcher.enabled:
+                self.start(watcher.ingest_id)
+        if self.watchers:
+            logger.info(f"恢复了 {len(self.watchers)} 个导入任务")
+
+    def get(self, ingest_id: str) -> Optional[IngestWatcher]:
+        """获取导入任务"""
+        return self.watchers.get(ingest_id)
+
+    def list_all(self) -> List[IngestWatcher]:
+        """列出所有导入任务"""
+        return list(self.watchers.values())
+
+    def start(self, ingest_id: str):
+        """启动导入任务"""
+        watcher = self.watchers[ingest_id]
+        if not watcher.enabled:
+            watcher.enabled = True
+            watcher.save()
+        if not watcher.running:
+            watcher.task = asyncio.create_task(watcher.run())
+
+    async def stop(self, ingest_id: str, disable: bool = True):
+        """
+        停止导入任务（正在处理的一批中未完成的文件下次启动时重新处理）
+
+        Args:
+            ingest_id: 导入任务ID
+            disable: 服务重启后不再自动启动
+        """
+        watcher = self.watchers[ingest_id]
+        if disable and watcher.enabled:
+            watcher.enabled = False
+            watcher.save()
+        if watcher.running:
+            if watcher.batches:
+                self.batch_runner.cancel_batch(watcher.batches[-1])
+            watcher.task.cancel()
+            try:
+                await watcher.task
+            except asyncio.CancelledError:
+                pass
+
+    async def delete(self, ingest_id: str):
+        """停止并删除导入任务及其处理记录"""
+        await self.stop(ingest_id, disable=False)
+        watcher = self.watchers.pop(ingest_id)
+        watcher.state_file.unlink(missing_ok=True)
+        watcher.records_file.unlink(missing_ok=True)
+
+    async def shutdown(self):
+        """停止所有导入任务（保留状态文件，重启后恢复）"""
+        for ingest_id in list(self.watchers):
+            await self.stop(ingest_id, disable=False)
@@ -0,0 +1,323 @@
+"""持久化运行队列（SQLite）"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from app.models.run import RunDetail, RunStatus
+from app.utils.image import image_to_base64, image_to_thumbnail
+
+
+def run_detail(run_data: Dict[str, Any], include_outputs: bool = True) -> RunDetail:
+    """
+    把引擎的运行数据转换为运行详情（图像输出转换为 Base64 和缩略图）
+
+    Args:
+        run_data: WorkflowEngine 的运行数据
+        include_outputs: 是否包含节点输出（运行中的进度快照不需要）
+    """
+    node_outputs = {}
+    if include_outputs:
+        for node_id, outputs in run_data.get("node_outputs", {}).items():
+            processed_outputs = []
+            for output in outputs:
+                # 图像在原处转换为 Base64（之后获取节点输出时直接返回转换后的值）
+                if output.data_type == "image" and isinstance(output.value, np.ndarray):
+                    output.thumbnail = image_to_thumbnail(output.value)
+                    output.value = image_to_base64(output.value)
+                processed_outputs.append(output)
+            node_outputs[node_id] = processed_outputs
+
+    return RunDetail(
+        run_id=run_data["run_id"],
+        workflow_id=run_data["workflow_id"],
+        status=run_data["status"],
+        created_at=run_data["created_at"],
+        started_at=run_data.get("started_at"),
+        completed_at=run_data.get("completed_at"),
+        error=run_data.get("error"),
+        preview_scale=run_data.get("preview_scale"),
+        generations=run_data.get("generations", []),
+        node_statuses=run_data.get("node_statuses", {}),
+        node_outputs=node_outputs,
+        logs=run_data.get("logs", []),
+    )
+
+
+class JobQueue:
+    """
+    持久化运行队列
+
+    运行请求写入本地 SQLite 数据库，由独立的工作进程（app.worker）领取执行，
+    运行状态和结果也写回数据库，因此任一 API 进程都能查询。
+    工作进程领取任务时获得租约并定期续约；进程崩溃后租约过期，任务由其他工作进程重新领取，
+    超过最大尝试次数后标记为失败。
+    工作流的当前版本（内容哈希）由 API 进程在工作流保存/删除时写入，工作进程续约时取回，
+    据此取消基于旧版本的渐进式运行。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            workflow_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            worker_id TEXT,
+            lease_expires REAL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            completed_at TEXT,
+            error TEXT,
+            result TEXT,
+            workflow_version TEXT,
+            seq INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+    """
+
+    def __init__(self, db_path: str = "data/jobs.db", max_attempts: int = 3):
+        """
+        Args:
+            db_path: 数据库文件路径（多个进程共享同一文件）
+            max_attempts: 每个任务最多被领取执行的次数
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            # WAL 模式下读取不会被写入阻塞
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """每次操作使用独立连接（可在多个线程和进程中使用），immediate 时开始写事务"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _now() -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def enqueue(
+        self, job_id: str, workflow_id: str, payload: Dict[str, Any], version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        加入队列
+
+        Args:
+            job_id: 任务ID（即运行ID）
+            workflow_id: 工作流ID
+            payload: 执行所需的数据（工作流定义和运行选项，可 JSON 序列化）
+            version: 入队时工作流的内容哈希
+        """
+        with self._connect(immediate=True) as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs").fetchone()[0]
+            conn.execute(
+                "INSERT INTO jobs (job_id, workflow_id, payload, status, max_attempts, created_at, "
+                "workflow_version, seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    workflow_id,
+                    json.dumps(payload, ensure_ascii=False),
+                    RunStatus.PENDING.value,
+                    self.max_attempts,
+                    self._now(),
+                    version,
+                    seq,
+                ),
+            )
+        return self.get(job_id)
+
+    def claim(self, worker_id: str, lease_seconds: float = 30) -> Optional[Dict[str, Any]]:
+        """
+        领取一个任务（等待中的任务，或租约已过期的运行中任务）
+
+        租约过期说明上次领取的工作进程已退出；尝试次数已用完的任务标记为失败，不再领取。
+
+        Returns:
+            任务（含 payload），没有可领取的任务时为 None
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, completed_at = ?, worker_id = NULL, lease_expires = NULL, "
+                "error = '工作进程多次异常退出，已达到最大尝试次数' "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (RunStatus.FAILED.value, self._now(), RunStatus.RUNNING.value, now),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, completed_at = ?, worker_id = NULL, lease_expires = NULL "
+                "WHERE status = ? AND lease_expires < ? AND cancel_requested = 1",
+                (RunStatus.CANCELLED.value, self._now(), RunStatus.RUNNING.value, now),
+            )
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY seq LIMIT 1",
+                (RunStatus.PENDING.value, RunStatus.RUNNING.value, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, lease_expires = ?, attempts = attempts + 1, "
+                "started_at = COALESCE(started_at, ?) WHERE job_id = ?",
+                (RunStatus.RUNNING.value, worker_id, now + lease_seconds, self._now(), row["job_id"]),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+        return self._to_dict(job, include_payload=True)
+
+    def heartbeat(
+        self,
+        job_id: str,
+        worker_id: str,
+        lease_seconds: float = 30,
+        snapshot: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[bool, bool, Optional[str]]:
+        """
+        续约并写入进度快照
+
+        Returns:
+            (是否仍持有该任务, 是否请求取消, 工作流的当前版本)；不再持有时工作进程应放弃该任务，
+            当前版本为空字符串表示工作流已删除，None 表示未知
+        """
+        with self._connect(immediate=True) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, result = COALESCE(?, result) "
+                "WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (
+                    time.time() + lease_seconds,
+                    json.dumps(snapshot, ensure_ascii=False) if snapshot is not None else None,
+                    job_id,
+                    worker_id,
+                    RunStatus.RUNNING.value,
+                ),
+            )
+            if cursor.rowcount == 0:
+                return False, False, None
+            row = conn.execute(
+                "SELECT cancel_requested, workflow_version FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return True, bool(row["cancel_requested"]), row["workflow_version"]
+
+    def update_workflow_version(self, workflow_id: str, version: Optional[str]):
+        """
+        记录工作流的当前版本（工作流保存或删除时由 API 进程调用）
+
+        Args:
+            workflow_id: 工作流ID
+            version: 工作流当前的内容哈希，None 表示已删除
+        """
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "UPDATE jobs SET workflow_version = ? WHERE workflow_id = ? AND status IN (?, ?)",
+                (version or "", workflow_id, RunStatus.PENDING.value, RunStatus.RUNNING.value),
+            )
+
+    def complete(
+        self,
+        job_id: str,
+        worker_id: str,
+        status: RunStatus,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        """
+        记录任务结果
+
+        Returns:
+            是否记录成功（租约已被其他工作进程接管时不记录）
+        """
+        with self._connect(immediate=True) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, completed_at = ?, "
+                "worker_id = NULL, lease_expires = NULL WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (
+                    RunStatus(status).value,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    self._now(),
+                    job_id,
+                    worker_id,
+                    RunStatus.RUNNING.value,
+                ),
+            )
+            completed = cursor.rowcount > 0
+        return completed
+
+    def request_cancel(self, job_id: str) -> bool:
+        """
+        取消任务：等待中的任务直接取消，运行中的任务由工作进程在下次续约时取消
+
+        Returns:
+            任务是否存在
+        """
+        with self._connect(immediate=True) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, completed_at = ? WHERE job_id = ? AND status = ?",
+                (RunStatus.CANCELLED.value, self._now(), job_id, RunStatus.PENDING.value),
+            )
+            cursor = conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+            found = cursor.rowcount > 0
+        return found
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务（不含 payload；result 为最近的运行详情快照）"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def get_run(self, job_id: str) -> Optional[RunDetail]:
+        """获取任务对应的运行详情"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        detail = RunDetail(**job["result"]) if job["result"] else RunDetail(
+            run_id=job["job_id"], workflow_id=job["workflow_id"], status=job["status"], created_at=job["created_at"]
+        )
+        # 队列状态以数据库记录为准（快照可能落后于取消、失败等状态变化）
+        detail.status = job["status"]
+        detail.started_at = detail.started_at or job["started_at"]
+        detail.completed_at = detail.completed_at or job["completed_at"]
+        detail.error = detail.error or job["error"]
+        return detail
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row, include_payload: bool = False) -> Dict[str, Any]:
+        job = dict(row)
+        job.pop("seq", None)
+        payload = job.pop("payload")
+        if include_payload:
+            job["payload"] = json.loads(payload)
+        job["status"] = RunStatus(job["status"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
@@ -3,7 +3,7 @@
 import json
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
 from app.models.workflow import Workflow
 
@@ -24,8 +24,26 @@ class WorkflowStorage:
         self.storage_dir.mkdir(parents=True, exist_ok=True)
         self.index_file = self.storage_dir / "index.json"
         self._cache: Dict[str, Workflow] = {}
+        self._listeners: List[Callable[[str], None]] = []
         self._load_index()
 
+    def add_listener(self, listener: Callable[[str], None]):
+        """
+        注册变更监听器，工作流保存或删除时以工作流ID调用
+
+        Args:
+            listener: 回调函数
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, workflow_id: str):
+        """通知监听器工作流已变更"""
+        for listener in self._listeners:
+            try:
+                listener(workflow_id)
+            except Exception as e:
+                logger.error(f"工作流变更通知失败 {workflow_id}: {e}")
+
     def _load_index(self):
         """加载索引文件"""
         if self.index_file.exists():
@@ -99,6 +117,7 @@ class WorkflowStorage:
         self._cache[workflow.workflow_id] = workflow
         self._save_workflow_to_file(workflow)
         self._save_index()
+        self._notify(workflow.workflow_id)
         logger.info(f"工作流已保存: {workflow.workflow_id}")
         return workflow
 
@@ -140,6 +159,7 @@ class WorkflowStorage:
 
         # 更新索引
         self._save_index()
+        self._notify(workflow_id)
         logger.info(f"工作流已删除: {workflow_id}")
         return True
 
@@ -2,9 +2,10 @@
 import cv2
 import numpy as np
 import base64
+import tempfile
 from io import BytesIO
 from PIL import Image
-from typing import Optional
+from typing import Optional, Tuple
 
 
 def image_to_base64(image: np.ndarray, format: str = "JPEG", quality: int = 85) -> str:
@@ -89,3 +90,18 @@ def base64_to_image(base64_str: str) -> Optional[np.ndarray]:
     image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     return image
 
+
+def memmap_array(shape: Tuple[int, ...], dtype: np.dtype, directory: Optional[str] = None) -> np.memmap:
+    """
+    创建以临时文件为后备存储的数组（超大图像不占用常驻内存）
+
+    临时文件是匿名的，数组被回收后自动删除。
+
+    Args:
+        shape: 数组形状
+        dtype: 数据类型
+        directory: 临时文件目录，默认为系统临时目录
+    """
+    with tempfile.TemporaryFile(dir=directory) as f:
+        # mmap 持有独立的文件句柄，关闭文件对象不影响映射
+        return np.memmap(f, dtype=dtype, mode="w+", shape=shape)
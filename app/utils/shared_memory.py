@@ -0,0 +1,117 @@
+"""共享内存数组工具（用于跨进程传递图像）"""
+from multiprocessing import shared_memory
+from typing import Any, List, Tuple
+
+import numpy as np
+
+
+class SharedArray:
+    """共享内存中 ndarray 的句柄（可 pickle，仅包含名称、形状和类型）"""
+
+    __slots__ = ("name", "shape", "dtype")
+
+    def __init__(self, name: str, shape: Tuple[int, ...], dtype: str):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+        return (self.name, self.shape, self.dtype)
+
+    def __setstate__(self, state):
+        self.name, self.shape, self.dtype = state
+
+    @classmethod
+    def create(cls, array: np.ndarray) -> Tuple["SharedArray", shared_memory.SharedMemory]:
+        """
+        将数组复制到新建的共享内存块
+
+        Args:
+            array: 源数组
+
+        Returns:
+            (句柄, 共享内存块)，调用方负责 close/unlink
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        view[...] = array
+        del view
+        return cls(shm.name, array.shape, array.dtype.str), shm
+
+    def attach(self) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+        """
+        挂载共享内存块，返回零拷贝的数组视图
+
+        Returns:
+            (数组视图, 共享内存块)，视图释放前不能关闭内存块
+        """
+        shm = shared_memory.SharedMemory(name=self.name)
+        array = np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+        return array, shm
+
+
+def pack_arrays(value: Any, blocks: List[shared_memory.SharedMemory]) -> Any:
+    """
+    将值中的 ndarray（可嵌套在 dict/list/tuple 中）替换为共享内存句柄
+
+    Args:
+        value: 待传递的值
+        blocks: 新建的共享内存块会追加到该列表
+
+    Returns:
+        可低成本 pickle 的值
+    """
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        handle, shm = SharedArray.create(value)
+        blocks.append(shm)
+        return handle
+    if isinstance(value, dict):
+        return {key: pack_arrays(item, blocks) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(pack_arrays(item, blocks) for item in value)
+    return value
+
+
+def unpack_arrays(value: Any, blocks: List[shared_memory.SharedMemory], copy: bool = False) -> Any:
+    """
+    将值中的共享内存句柄还原为 ndarray
+
+    Args:
+        value: 含句柄的值
+        blocks: 挂载的共享内存块会追加到该列表
+        copy: 是否复制为进程私有数组（复制后即可关闭内存块）
+
+    Returns:
+        还原后的值
+    """
+    if isinstance(value, SharedArray):
+        array, shm = value.attach()
+        blocks.append(shm)
+        return array.copy() if copy else array
+    if isinstance(value, dict):
+        return {key: unpack_arrays(item, blocks, copy) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(unpack_arrays(item, blocks, copy) for item in value)
+    return value
+
+
+def release_blocks(blocks: List[shared_memory.SharedMemory], unlink: bool = False):
+    """
+    关闭共享内存块
+
+    Args:
+        blocks: 共享内存块列表
+        unlink: 是否同时销毁内存块（仅由最后使用方调用）
+    """
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # 仍有数组视图引用该内存块，映射随对象回收释放
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+    blocks.clear()
@@ -0,0 +1,233 @@
+"""
+运行队列工作进程
+
+从持久化运行队列（JobQueue）领取运行并执行，与 API 进程分离：
+
+    python -m app.worker --workers 4 --db data/jobs.db
+
+API 进程设置环境变量 JOB_QUEUE_DB 指向同一数据库文件后，POST /api/runs 只写入队列。
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from app.core.cache import NodeOutputCache
+from app.core.nodes.registry import NodeRegistry
+from app.core.workflow import WorkflowEngine
+from app.models.run import RunStatus
+from app.models.workflow import Workflow
+from app.services.job_queue import JobQueue, run_detail
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    队列工作者
+
+    每次领取一个运行交给自己的 WorkflowEngine 执行；执行期间每隔租约的三分之一续约一次并写入进度快照，
+    失去租约（超时后被其他工作者接管）时放弃该运行，收到取消请求时取消执行。
+    渐进式运行每完成一代立即写入包含输出的快照，代理结果无需等整个运行结束即可查询；
+    续约时取回工作流的当前版本，工作流已修改时与 API 进程内的运行一样取消正在执行的一代。
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        engine: Optional[WorkflowEngine] = None,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 30,
+        poll_interval: float = 1.0,
+        progress_interval: float = 0.5,
+    ):
+        """
+        Args:
+            queue: 运行队列
+            engine: 工作流引擎，默认新建（启用内存层节点输出缓存）
+            worker_id: 工作者ID，默认由主机名、进程号和随机后缀组成
+            lease_seconds: 租约时长
+            poll_interval: 队列为空时的轮询间隔
+            progress_interval: 检查渐进式运行是否完成一代的间隔
+        """
+        if engine is None:
+            registry = NodeRegistry()
+            registry.register_all()
+            engine = WorkflowEngine(registry, output_cache=NodeOutputCache())
+        self.queue = queue
+        self.engine = engine
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+
+    async def run_once(self) -> bool:
+        """
+        领取并执行一个运行
+
+        Returns:
+            是否领取到运行
+        """
+        job = await asyncio.to_thread(self.queue.claim, self.worker_id, self.lease_seconds)
+        if job is None:
+            return False
+        await self._process(job)
+        return True
+
+    async def run(self, stop: Optional[asyncio.Event] = None):
+        """持续领取运行，直到 stop 被设置（正在执行的运行完成后退出）"""
+        stop = stop or asyncio.Event()
+        logger.info(f"工作者 {self.worker_id} 已启动")
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"工作者 {self.worker_id} 处理运行失败: {e}", exc_info=True)
+                claimed = False
+            if not claimed:
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info(f"工作者 {self.worker_id} 已退出")
+
+    def _start(self, job: Dict[str, Any]) -> asyncio.Task:
+        payload = job["payload"]
+        workflow = Workflow(**payload["workflow"])
+        options = payload["options"]
+        if payload.get("progressive"):
+            return asyncio.create_task(
+                self.engine.execute_progressive(
+                    workflow, job["job_id"], preview_scale=payload.get("preview_scale") or 0.25, **options
+                )
+            )
+        return asyncio.create_task(
+            self.engine.execute(workflow, job["job_id"], preview_scale=payload.get("preview_scale"), **options)
+        )
+
+    def _snapshot(self, job_id: str, include_outputs: bool = False) -> Optional[Dict[str, Any]]:
+        run_data = self.engine.get_run(job_id)
+        if run_data is None:
+            return None
+        return run_detail(run_data, include_outputs).model_dump(mode="json")
+
+    def _completed_generations(self, job_id: str) -> int:
+        run_data = self.engine.get_run(job_id) or {}
+        return sum(generation["status"] == RunStatus.COMPLETED for generation in run_data.get("generations", []))
+
+    async def _process(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        logger.info(f"工作者 {self.worker_id} 开始执行运行 {job_id}（第 {job['attempts']} 次）")
+        try:
+            task = self._start(job)
+        except Exception as e:
+            # 队列中的工作流定义无法解析，重试也不会成功
+            await asyncio.to_thread(self.queue.complete, job_id, self.worker_id, RunStatus.FAILED, None, str(e))
+            return
+
+        status: Optional[RunStatus] = None
+        interval = self.lease_seconds / 3
+        next_heartbeat = time.monotonic() + interval
+        pushed = 0  # 已写入快照的完成代数
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=min(interval, self.progress_interval))
+                if done:
+                    break
+                completed = self._completed_generations(job_id)
+                if completed == pushed and time.monotonic() < next_heartbeat:
+                    continue
+                # 已有完成的一代时快照包含其输出（图像已转换为 Base64，之后的快照不再重复编码）
+                snapshot = await asyncio.to_thread(self._snapshot, job_id, completed > 0)
+                pushed = completed
+                owned, cancel, version = await asyncio.to_thread(
+                    self.queue.heartbeat, job_id, self.worker_id, self.lease_seconds, snapshot
+                )
+                next_heartbeat = time.monotonic() + interval
+                if version is not None:
+                    # 空字符串表示工作流已删除
+                    self.engine.cancel_stale_runs(job["workflow_id"], version or None)
+                if not owned:
+                    logger.warning(f"运行 {job_id} 的租约已失效，放弃执行")
+                    task.cancel()
+                    return
+                if cancel:
+                    task.cancel()
+                    status = RunStatus.CANCELLED
+                    break
+
+            if status is None:
+                try:
+                    status = task.result()["status"]
+                except Exception as e:
+                    logger.error(f"运行 {job_id} 执行失败: {e}", exc_info=True)
+                    status = RunStatus.FAILED
+            else:
+                await asyncio.gather(task, return_exceptions=True)
+                self.engine.cancel_run(job_id)
+            run_data = self.engine.get_run(job_id)
+            result = await asyncio.to_thread(self._snapshot, job_id, True)
+            error = run_data.get("error") if run_data else None
+            await asyncio.to_thread(self.queue.complete, job_id, self.worker_id, status, result, error)
+            logger.info(f"运行 {job_id} 结束: {RunStatus(status).value}")
+        finally:
+            # 结果已写入队列，释放引擎中的运行数据
+            for run_id in [job_id, f"{job_id}.0", f"{job_id}.1"]:
+                self.engine.runs.pop(run_id, None)
+
+
+def _worker_main(db_path: str, lease_seconds: float, poll_interval: float):
+    """工作进程入口：SIGTERM/SIGINT 后完成当前运行再退出"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        worker = Worker(JobQueue(db_path), lease_seconds=lease_seconds, poll_interval=poll_interval)
+        await worker.run(stop)
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="运行队列工作进程")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数")
+    parser.add_argument("--db", default=os.environ.get("JOB_QUEUE_DB", "data/jobs.db"), help="队列数据库路径")
+    parser.add_argument("--lease", type=float, default=30, help="租约时长（秒）")
+    parser.add_argument("--poll", type=float, default=1.0, help="队列为空时的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    # 先在主进程建表，避免各工作进程同时初始化
+    JobQueue(args.db)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_worker_main, args=(args.db, args.lease, args.poll), name=f"worker-{index}"
+        )
+        for index in range(max(1, args.workers))
+    ]
+    for process in processes:
+        process.start()
+
+    # 主进程收到的终止信号转发给各工作进程
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
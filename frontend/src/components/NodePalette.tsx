@@ -13,14 +13,14 @@ interface NodeInfo {
 }
 
 const nodeCategories: Record<string, string[]> = {
-  '输入': ['ImageInput', 'JSONInput'],
+  '输入': ['ImageInput', 'VideoInput', 'JSONInput'],
   '基本处理': ['Resize', 'Crop', 'Grayscale', 'Threshold', 'Blur', 'GaussianBlur'],
   '形态学': ['Erode', 'Dilate', 'Open', 'Close'],
   '几何': ['FindContours', 'BoundingRect', 'MinAreaRect'],
   '绘制': ['DrawRectangle', 'DrawText', 'Overlay'],
   '拼接': ['ConcatHorizontal', 'ConcatVertical', 'Tile'],
   '数据': ['JSONOutput'],
-  '查看器': ['ImageViewer', 'DiffViewer'],
+  '查看器': ['ImageViewer', 'DiffViewer', 'Output'],
   '脚本': ['PythonSnippet'],
 }
 
@@ -0,0 +1,186 @@
+"""批处理测试"""
+import cv2
+import numpy as np
+import pytest
+
+from app.models.workflow import Workflow, Node, Link, NodePort
+from app.models.run import RunStatus, NodeStatus
+from app.core.batch import BatchRunner, expand_inputs
+from app.core.nodes.base import NodeContext
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+from tests.test_fusion import chain_workflow
+
+
+@pytest.fixture
+def engine():
+    registry = NodeRegistry()
+    registry.register_all()
+    return WorkflowEngine(registry)
+
+
+def write_images(tmp_path, count):
+    for index in range(count):
+        image = np.full((16, 20, 3), index * 40, dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / f"img_{index}.png"), image)
+    return str(tmp_path / "*.png")
+
+
+@pytest.mark.asyncio
+async def test_batch_run(engine, tmp_path):
+    """通配符与路径合并为批处理项，计划只编译一次，失败项不影响其余项"""
+    pattern = write_images(tmp_path, 4)
+    inputs = expand_inputs(paths=[str(tmp_path / "missing.png")], pattern=pattern)
+    assert [item["path"] for item in inputs][1:] == [str(tmp_path / f"img_{i}.png") for i in range(4)]
+
+    workflow = chain_workflow("", [("Grayscale", {}), ("Threshold", {"threshold": 100})])
+    runner = BatchRunner(engine)
+    runner.create(workflow, "batch", inputs)
+    batch = await runner.run("batch", max_concurrent=2)
+
+    assert batch["status"] == RunStatus.COMPLETED
+    assert (batch["completed"], batch["failed"]) == (4, 1)
+    assert engine.plan_cache.misses == 1
+    assert batch["items"][0]["status"] == RunStatus.FAILED
+    assert batch["items"][0]["error"]
+    # 读取阶段失败的项也有运行记录
+    failed_run = engine.get_run(batch["items"][0]["run_id"])
+    assert failed_run["status"] == RunStatus.FAILED and failed_run["error"] == batch["items"][0]["error"]
+    assert failed_run["logs"][0]["type"] == "error"
+
+    for index, item in enumerate(batch["items"][1:]):
+        assert item["status"] == RunStatus.COMPLETED
+        output = engine.get_run(item["run_id"])["node_outputs"]["view"][0].value
+        assert output.shape == (16, 20)
+        assert output.max() == (255 if index * 40 > 100 else 0)
+
+
+@pytest.mark.asyncio
+async def test_batch_pipeline_writes_outputs(engine, tmp_path):
+    """输入由读取阶段预先解码，结果由写出阶段编码保存"""
+    inputs = expand_inputs(pattern=write_images(tmp_path, 5))
+    runner = BatchRunner(engine)
+    runner.create(chain_workflow("", [("Grayscale", {})]), "batch", inputs)
+    batch = await runner.run(
+        "batch", max_concurrent=2, readers=2, prefetch=1, save_format="png", output_dir=str(tmp_path / "out")
+    )
+
+    assert (batch["completed"], batch["failed"]) == (5, 0)
+    for index, item in enumerate(batch["items"]):
+        run_data = engine.get_run(item["run_id"])
+        assert any(log["message"] == "使用预先得到的输出" for log in run_data["logs"] if log["node_id"] == "input")
+        assert item["files"] == [str(tmp_path / "out" / "batch" / f"{index:04d}_view_image.png")]
+        saved = cv2.imread(item["files"][0], cv2.IMREAD_UNCHANGED)
+        np.testing.assert_array_equal(saved, run_data["node_outputs"]["view"][0].value)
+
+
+@pytest.mark.asyncio
+async def test_batch_release_and_remove(engine, tmp_path):
+    """keep_outputs=False 时各项写出后释放输出；删除批处理同时删除各项的运行记录"""
+    inputs = expand_inputs(pattern=write_images(tmp_path, 3))
+    runner = BatchRunner(engine)
+    runner.create(chain_workflow("", [("Grayscale", {})]), "batch", inputs)
+    with pytest.raises(ValueError):
+        runner.remove_batch("batch")
+    batch = await runner.run("batch", save_format="png", output_dir=str(tmp_path / "out"), keep_outputs=False)
+
+    assert batch["completed"] == 3
+    for item in batch["items"]:
+        assert len(item["files"]) == 1
+        run_data = engine.get_run(item["run_id"])
+        assert run_data["status"] == RunStatus.COMPLETED
+        assert run_data["node_outputs"] == {} and run_data["node_cache"] == {}
+
+    runner.remove_batch("batch")
+    assert runner.get_batch("batch") is None
+    assert all(engine.get_run(item["run_id"]) is None for item in batch["items"])
+
+
+@pytest.mark.asyncio
+async def test_execute_batch_matches_per_item(engine):
+    """逐像素节点对堆栈批量执行与逐张执行结果一致"""
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 256, (3, 12, 10, 3), dtype=np.uint8)
+    for node_type, params in [("Grayscale", {}), ("Threshold", {"threshold": 90, "type": "THRESH_TRUNC"})]:
+        node_impl = engine.node_registry.get(node_type)
+        assert node_impl.supports_batch(params)
+        context = NodeContext(node_id="n", inputs={"image": stack}, params=params, input_data={})
+        batched = (await engine.executor.run_batch(node_impl, context))["image"]
+        for index, image in enumerate(stack):
+            single = await node_impl.execute(context.model_copy(update={"inputs": {"image": image}}))
+            np.testing.assert_array_equal(batched[index], single["image"])
+    assert not engine.node_registry.get("Blur").supports_batch({})
+
+
+@pytest.mark.asyncio
+async def test_batch_stacked_execution(engine, tmp_path):
+    """同尺寸的项堆叠执行逐像素节点，其余节点逐项执行，结果与不堆叠时一致"""
+    rng = np.random.default_rng(2)
+    for index in range(5):
+        shape = (16, 20, 3) if index != 2 else (18, 20, 3)
+        cv2.imwrite(str(tmp_path / f"img_{index}.png"), rng.integers(0, 256, shape, dtype=np.uint8))
+    inputs = expand_inputs(pattern=str(tmp_path / "*.png"))
+    chain = [("Grayscale", {}), ("Threshold", {"threshold": 100, "type": "THRESH_TOZERO"}), ("Blur", {"kernel_size": 3})]
+    workflow = chain_workflow("", chain)
+
+    runner = BatchRunner(engine)
+    plan = engine.compile(workflow)
+    assert runner.stacker.stacked_nodes(plan, list(plan.order), "input") == ["n1"]
+    runner.create(workflow, "stacked", inputs)
+    stacked = await runner.run("stacked", max_concurrent=1, stack_size=4, use_cache=False)
+    runner.create(workflow, "single", inputs)
+    single = await runner.run("single", stack_size=1, use_cache=False)
+
+    assert (stacked["completed"], stacked["failed"]) == (5, 0)
+    for stacked_item, single_item in zip(stacked["items"], single["items"]):
+        stacked_run = engine.get_run(stacked_item["run_id"])
+        single_run = engine.get_run(single_item["run_id"])
+        assert stacked_run["node_statuses"]["n2"] == NodeStatus.SUCCESS
+        np.testing.assert_array_equal(
+            stacked_run["node_outputs"]["view"][0].value, single_run["node_outputs"]["view"][0].value
+        )
+    # 逐像素融合后的节点在同尺寸的 4 项中由批量执行给出
+    messages = [
+        log["message"] for log in engine.get_run("stacked.0")["logs"] if log["node_id"] == "n1"
+    ]
+    assert messages == ["使用预先得到的输出"]
+
+
+@pytest.mark.asyncio
+async def test_batch_cancel(engine, tmp_path):
+    """取消后尚未开始的项不再执行"""
+    inputs = expand_inputs(pattern=write_images(tmp_path, 3))
+    runner = BatchRunner(engine)
+    runner.create(chain_workflow("", [("Blur", {})]), "batch", inputs)
+    runner.cancel_batch("batch")
+    batch = await runner.run("batch")
+
+    assert batch["status"] == RunStatus.CANCELLED
+    assert all(item["status"] == RunStatus.CANCELLED for item in batch["items"])
+    assert engine.get_run("batch.0") is None
+
+
+def test_batch_input_node(engine, tmp_path):
+    """输入节点不唯一或不存在时报错"""
+    runner = BatchRunner(engine)
+    inputs = expand_inputs(paths=["a.png"])
+    with pytest.raises(ValueError):
+        runner.create(chain_workflow("", []), "batch", [])
+
+    workflow = Workflow(
+        workflow_id="two-inputs",
+        nodes=[
+            Node(id="a", type="ImageInput", params={"path": "a.png"}),
+            Node(id="b", type="ImageInput", params={"path": "b.png"}),
+            Node(id="add", type="Overlay"),
+        ],
+        links=[
+            Link(from_=NodePort(node="a", port="image"), to=NodePort(node="add", port="image1")),
+            Link(from_=NodePort(node="b", port="image"), to=NodePort(node="add", port="image2")),
+        ],
+    )
+    with pytest.raises(ValueError, match="多个"):
+        runner.create(workflow, "batch", inputs)
+    with pytest.raises(ValueError):
+        runner.create(workflow, "batch", inputs, input_node="add")
+    assert runner.create(workflow, "batch", inputs, input_node="b")["input_node"] == "b"
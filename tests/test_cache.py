@@ -0,0 +1,203 @@
+"""节点输出缓存测试"""
+import cv2
+import numpy as np
+import pytest
+
+from app.models.workflow import Workflow, Node, Link, NodePort
+from app.models.run import RunStatus
+from app.core.cache import NodeOutputCache, node_cache_key, hash_value
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    """临时测试图像"""
+    path = tmp_path / "input.png"
+    image = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    cv2.imwrite(str(path), image)
+    return path
+
+
+@pytest.fixture
+def cached_engine():
+    """启用输出缓存的引擎"""
+    registry = NodeRegistry()
+    registry.register_all()
+    return WorkflowEngine(registry, output_cache=NodeOutputCache())
+
+
+def blur_workflow(path, thresh: int = 127) -> Workflow:
+    """图像输入 -> 高斯模糊 -> 阈值"""
+    return Workflow(
+        workflow_id="cache-test",
+        name="缓存测试",
+        nodes=[
+            Node(id="input", type="ImageInput", params={"path": str(path)}),
+            Node(id="blur", type="GaussianBlur", params={"kernel_size": 5}),
+            Node(id="thresh", type="Threshold", params={"threshold": thresh}),
+        ],
+        links=[
+            Link(from_=NodePort(node="input", port="image"), to=NodePort(node="blur", port="image")),
+            Link(from_=NodePort(node="blur", port="image"), to=NodePort(node="thresh", port="image")),
+        ],
+    )
+
+
+def cache_hits(run_data) -> set:
+    """命中缓存的节点"""
+    return {log["node_id"] for log in run_data["logs"] if log["message"].startswith("命中缓存")}
+
+
+def test_cache_key_ignores_param_order():
+    """参数书写顺序不影响缓存键"""
+    a = node_cache_key("Resize", {"width": 1, "height": 2}, {"image": "k"})
+    b = node_cache_key("Resize", {"height": 2, "width": 1}, {"image": "k"})
+    assert a == b
+    assert a != node_cache_key("Resize", {"width": 1, "height": 3}, {"image": "k"})
+    assert a != node_cache_key("Resize", {"width": 1, "height": 2}, {"image": "other"})
+
+
+def test_hash_value():
+    """内容哈希：相同内容相同键，无法哈希的值返回 None"""
+    image = np.zeros((4, 4), dtype=np.uint8)
+    assert hash_value({"a": image}) == hash_value({"a": image.copy()})
+    assert hash_value(image) != hash_value(image.astype(np.float32))
+    assert hash_value(object()) is None
+
+
+@pytest.mark.asyncio
+async def test_rerun_hits_upstream_cache(cached_engine, image_path):
+    """只修改下游参数时，上游节点命中缓存"""
+    first = await cached_engine.execute(blur_workflow(image_path), "run-1")
+    assert first["status"] == RunStatus.COMPLETED
+    assert cache_hits(first) == set()
+
+    second = await cached_engine.execute(blur_workflow(image_path, thresh=100), "run-2")
+    assert second["status"] == RunStatus.COMPLETED
+    assert cache_hits(second) == {"input", "blur"}
+
+    third = await cached_engine.execute(blur_workflow(image_path, thresh=100), "run-3")
+    assert cache_hits(third) == {"input", "blur", "thresh"}
+    np.testing.assert_array_equal(
+        second["node_outputs"]["thresh"][0].value, third["node_outputs"]["thresh"][0].value
+    )
+
+
+@pytest.mark.asyncio
+async def test_file_change_invalidates(cached_engine, image_path):
+    """输入文件变化后缓存失效"""
+    await cached_engine.execute(blur_workflow(image_path), "run-1")
+    cv2.imwrite(str(image_path), np.zeros((32, 32, 3), dtype=np.uint8))
+
+    run_data = await cached_engine.execute(blur_workflow(image_path), "run-2")
+    assert cache_hits(run_data) == set()
+    assert run_data["node_outputs"]["thresh"][0].value.shape[:2] == (32, 32)
+
+
+@pytest.mark.asyncio
+async def test_use_cache_disabled(cached_engine, image_path):
+    """use_cache=False 时不读取缓存"""
+    await cached_engine.execute(blur_workflow(image_path), "run-1")
+    run_data = await cached_engine.execute(blur_workflow(image_path), "run-2", use_cache=False)
+    assert cache_hits(run_data) == set()
+
+
+@pytest.mark.asyncio
+async def test_nondeterministic_node_not_cached(cached_engine, image_path):
+    """非确定性节点每次都执行，下游按输出内容命中缓存"""
+    workflow = blur_workflow(image_path)
+    workflow.nodes.insert(
+        1,
+        Node(
+            id="snippet",
+            type="PythonSnippet",
+            params={"code": "result = inputs['image']"},
+        ),
+    )
+    workflow.links[0] = Link(from_=NodePort(node="input", port="image"), to=NodePort(node="snippet", port="image"))
+    workflow.links.append(
+        Link(from_=NodePort(node="snippet", port="result"), to=NodePort(node="blur", port="image"))
+    )
+
+    await cached_engine.execute(workflow, "run-1", backend="thread")
+    run_data = await cached_engine.execute(workflow, "run-2", backend="thread")
+    assert run_data["status"] == RunStatus.COMPLETED
+    assert cache_hits(run_data) == {"input", "blur", "thresh"}
+
+
+@pytest.mark.asyncio
+async def test_rerun_with_mutating_snippet(cached_engine, image_path, tmp_path):
+    """重新运行时命中缓存的上游输出可被脚本原地修改（内存层和磁盘层）"""
+    workflow = blur_workflow(image_path)
+    workflow.nodes[1] = Node(
+        id="blur",
+        type="PythonSnippet",
+        params={"code": "img = inputs['image']\nimg[0, 0] = 0\nresult = img"},
+    )
+    workflow.links[1] = Link(from_=NodePort(node="blur", port="result"), to=NodePort(node="thresh", port="image"))
+
+    for cache in (cached_engine.output_cache, NodeOutputCache(disk_dir=str(tmp_path / "cache"))):
+        cached_engine.output_cache = cache
+        await cached_engine.execute(workflow, "run-1", backend="thread")
+        if cache.disk_dir:
+            cache._entries.clear()
+        run_data = await cached_engine.execute(workflow, "run-2", backend="thread")
+        assert run_data["status"] == RunStatus.COMPLETED, run_data.get("error")
+        assert "input" in cache_hits(run_data)
+
+
+def test_memory_lru_eviction():
+    """超出字节上限时淘汰最久未使用的条目"""
+    cache = NodeOutputCache(max_bytes=2500)
+    for key in ("a", "b"):
+        cache.put(key, {"image": np.zeros(1000, dtype=np.uint8)})
+    cache.get("a")
+    cache.put("c", {"image": np.zeros(1000, dtype=np.uint8)})
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_arrays_are_isolated():
+    """命中缓存得到可写的副本，修改副本或存入的原数组都不会污染缓存"""
+    cache = NodeOutputCache()
+    image = np.zeros((2, 2), dtype=np.uint8)
+    cache.put("k", {"image": image})
+    cache.get("k")["image"][0, 0] = 1
+    image[0, 0] = 1
+    assert cache.get("k")["image"][0, 0] == 0
+
+
+def test_disk_round_trip(tmp_path):
+    """磁盘层在新实例中仍可命中"""
+    image = np.arange(12, dtype=np.uint8).reshape(3, 4)
+    NodeOutputCache(disk_dir=str(tmp_path)).put("k", {"image": image, "rects": [[1, 2, 3, 4]]})
+
+    cache = NodeOutputCache(disk_dir=str(tmp_path))
+    outputs = cache.get("k")
+    np.testing.assert_array_equal(outputs["image"], image)
+    assert outputs["rects"] == [[1, 2, 3, 4]]
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_eviction(tmp_path):
+    """磁盘层超出上限时淘汰条目"""
+    cache = NodeOutputCache(disk_dir=str(tmp_path), max_disk_bytes=3000)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"image": np.zeros(1000, dtype=np.uint8)})
+    assert cache.stats()["disk_evictions"] >= 1
+    assert cache.stats()["disk_bytes"] <= 3000
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_reuses_cached_intermediates(cached_engine, image_path):
+    """增量执行时已释放的上游输出从节点输出缓存取回"""
+    await cached_engine.execute(blur_workflow(image_path), "run-base")
+    run_data = await cached_engine.execute(blur_workflow(image_path, thresh=90), "run-2", base_run_id="run-base")
+
+    assert run_data["status"] == RunStatus.COMPLETED
+    reused = {log["node_id"] for log in run_data["logs"] if log["message"].startswith("复用运行")}
+    assert reused == {"input", "blur"}
+    assert set(run_data["node_outputs"]) == {"thresh"}
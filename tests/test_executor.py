@@ -0,0 +1,214 @@
+"""执行器测试"""
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.core.executor import NodeExecutor
+from app.core.nodes.base import NodeContext, ExecutionBackend
+from app.core.nodes.image_process import GaussianBlurNode
+from app.core.nodes.script import PythonSnippetNode
+from app.core.nodes.viewer import ImageViewerNode
+from app.utils.shared_memory import SharedArray, pack_arrays, unpack_arrays, release_blocks
+
+
+class BlockingBlurNode(GaussianBlurNode):
+    """测试用节点：模拟长时间阻塞的计算"""
+
+    async def execute(self, context: NodeContext):
+        time.sleep(0.2)
+        return {"thread": threading.current_thread().name}
+
+
+class SlowImageNode(GaussianBlurNode):
+    """测试用节点：耗时较长、输出图像"""
+
+    async def execute(self, context: NodeContext):
+        time.sleep(0.5)
+        return {"image": context.inputs["image"] + 1}
+
+
+class CrashingNode(GaussianBlurNode):
+    """测试用节点：直接退出所在进程"""
+
+    async def execute(self, context: NodeContext):
+        os._exit(1)
+
+
+def shm_blocks() -> set:
+    """当前存在的共享内存块（不含进程池使用的信号量）"""
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+def make_context(image):
+    return NodeContext(node_id="test", inputs={"image": image}, params={"kernel_size": 5}, input_data={})
+
+
+@pytest.mark.asyncio
+async def test_cpu_node_does_not_block_event_loop():
+    """CPU 节点在线程池中执行，事件循环保持响应"""
+    executor = NodeExecutor(cpu_workers=2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    result = await executor.run(BlockingBlurNode(), make_context(np.zeros((8, 8), np.uint8)))
+    tick_task.cancel()
+    executor.shutdown()
+
+    assert result["thread"].startswith("node-cpu")
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_cpu_nodes_run_in_parallel():
+    """多个 CPU 节点可在线程池中并行执行"""
+    executor = NodeExecutor(cpu_workers=4)
+    node = BlockingBlurNode()
+    start = time.time()
+    await asyncio.gather(*[executor.run(node, make_context(None)) for _ in range(4)])
+    executor.shutdown()
+
+    assert time.time() - start < 0.6
+
+
+@pytest.mark.asyncio
+async def test_trivial_node_runs_inline():
+    """轻量节点直接在事件循环中执行，结果与直接调用一致"""
+    executor = NodeExecutor()
+    image = np.ones((4, 4), np.uint8)
+    result = await executor.run(ImageViewerNode(), make_context(image))
+
+    assert result["image"] is image
+    assert executor._pools == {}
+
+
+@pytest.mark.asyncio
+async def test_cpu_node_output_matches_direct_call():
+    """线程池执行的输出与直接执行一致"""
+    executor = NodeExecutor(cpu_workers=1)
+    image = np.random.randint(0, 255, (32, 32), np.uint8)
+    expected = await GaussianBlurNode().execute(make_context(image))
+    result = await executor.run(GaussianBlurNode(), make_context(image))
+    executor.shutdown()
+
+    assert np.array_equal(result["image"], expected["image"])
+
+
+@pytest.mark.asyncio
+async def test_process_backend_matches_thread_backend():
+    """进程池后端经共享内存传递图像，输出与线程池一致"""
+    executor = NodeExecutor(process_workers=1)
+    image = np.random.randint(0, 255, (64, 48, 3), np.uint8)
+    context = make_context(image)
+    expected = await executor.run(GaussianBlurNode(), context, ExecutionBackend.THREAD)
+    result = await executor.run(GaussianBlurNode(), context, "process")
+    executor.shutdown()
+
+    assert np.array_equal(result["image"], expected["image"])
+
+
+@pytest.mark.asyncio
+async def test_process_backend_releases_outputs_on_failure():
+    """结果无法 pickle 或等待被取消时，子进程创建的输出共享内存块都会被销毁"""
+    executor = NodeExecutor(process_workers=1)
+    image = np.zeros((64, 64), np.uint8)
+    # 预热进程池，避免把工作进程自身的资源计入
+    await executor.run(GaussianBlurNode(), make_context(image), "process")
+    before = shm_blocks()
+
+    # 没有 return 的脚本以局部变量为输出：图像写入共享内存后，导入的模块无法 pickle
+    context = NodeContext(
+        node_id="snippet",
+        inputs={"image": image},
+        params={"code": "import math\nresult = inputs['image'] + 1"},
+        input_data={},
+    )
+    with pytest.raises(Exception):
+        await executor.run(PythonSnippetNode(), context, "process")
+    assert shm_blocks() == before
+
+    task = asyncio.create_task(executor.run(SlowImageNode(), make_context(image), "process"))
+    await asyncio.sleep(0.2)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    for _ in range(50):
+        await asyncio.sleep(0.05)
+        if shm_blocks() == before:
+            break
+    leaked = shm_blocks() - before
+    executor.shutdown()
+
+    assert not leaked
+
+
+@pytest.mark.asyncio
+async def test_broken_process_pool_is_recreated():
+    """工作进程异常退出后丢弃损坏的进程池，下次执行时重新创建"""
+    from concurrent.futures.process import BrokenProcessPool
+
+    executor = NodeExecutor(process_workers=1)
+    image = np.random.randint(0, 255, (16, 16), np.uint8)
+    with pytest.raises(BrokenProcessPool):
+        await executor.run(CrashingNode(), make_context(image), "process")
+    assert ExecutionBackend.PROCESS not in executor._pools
+
+    expected = await GaussianBlurNode().execute(make_context(image))
+    result = await executor.run(GaussianBlurNode(), make_context(image), "process")
+    executor.shutdown()
+
+    assert np.array_equal(result["image"], expected["image"])
+
+
+def test_resolve_backend():
+    """运行级后端优先于节点声明，非 CPU 节点不使用后端"""
+    executor = NodeExecutor()
+
+    assert executor.resolve_backend(GaussianBlurNode()) == ExecutionBackend.THREAD
+    assert executor.resolve_backend(PythonSnippetNode()) == ExecutionBackend.THREAD
+    assert executor.resolve_backend(PythonSnippetNode(), "process") == ExecutionBackend.PROCESS
+    assert executor.resolve_backend(GaussianBlurNode(), "process") == ExecutionBackend.PROCESS
+    assert executor.resolve_backend(ImageViewerNode(), "process") is None
+
+
+@pytest.mark.asyncio
+async def test_snippet_with_import_runs_by_default():
+    """没有 return 的脚本以局部变量（含导入的模块）为输出，默认线程池后端可以执行"""
+    executor = NodeExecutor()
+    context = NodeContext(
+        node_id="snippet",
+        inputs={"image": np.zeros((2, 2), np.uint8)},
+        params={"code": "import math\nresult = inputs['image'] + 1"},
+        input_data={},
+    )
+    result = await executor.run(PythonSnippetNode(), context)
+    executor.shutdown()
+
+    assert np.array_equal(result["result"], np.ones((2, 2), np.uint8))
+
+
+def test_shared_array_round_trip():
+    """嵌套结构中的数组经共享内存往返后保持一致"""
+    image = np.arange(24, dtype=np.uint16).reshape(2, 3, 4)
+    value = {"images": [image, image[:, :, 0]], "meta": {"count": 2}}
+    blocks = []
+    packed = pack_arrays(value, blocks)
+    assert isinstance(packed["images"][0], SharedArray)
+
+    restored_blocks = []
+    restored = unpack_arrays(packed, restored_blocks, copy=True)
+    release_blocks(restored_blocks)
+    release_blocks(blocks, unlink=True)
+
+    assert np.array_equal(restored["images"][0], image)
+    assert np.array_equal(restored["images"][1], image[:, :, 0])
+    assert restored["meta"] == {"count": 2}
@@ -0,0 +1,133 @@
+"""节点融合测试"""
+import cv2
+import numpy as np
+import pytest
+
+from app.models.workflow import Workflow, Node, Link, NodePort
+from app.models.run import RunStatus, NodeStatus
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+
+
+@pytest.fixture
+def engine():
+    registry = NodeRegistry()
+    registry.register_all()
+    return WorkflowEngine(registry)
+
+
+def chain_workflow(path: str, chain) -> Workflow:
+    """图像输入 -> chain 中的节点依次相连 -> 查看器"""
+    nodes = [Node(id="input", type="ImageInput", params={"path": path})]
+    links = []
+    previous = "input"
+    for index, (node_type, params) in enumerate(chain):
+        node_id = f"n{index}"
+        nodes.append(Node(id=node_id, type=node_type, params=params))
+        links.append(Link(from_=NodePort(node=previous, port="image"), to=NodePort(node=node_id, port="image")))
+        previous = node_id
+    nodes.append(Node(id="view", type="ImageViewer"))
+    links.append(Link(from_=NodePort(node=previous, port="image"), to=NodePort(node="view", port="image")))
+    return Workflow(workflow_id="fusion", nodes=nodes, links=links)
+
+
+def write_image(tmp_path, shape) -> str:
+    path = tmp_path / "input.png"
+    cv2.imwrite(str(path), np.random.default_rng(1).integers(0, 256, shape, dtype=np.uint8))
+    return str(path)
+
+
+POINTWISE_CHAIN = [
+    ("Grayscale", {}),
+    ("Threshold", {"threshold": 60, "type": "THRESH_TOZERO"}),
+    ("Threshold", {"threshold": 200, "max_value": 180, "type": "THRESH_TRUNC"}),
+    ("Threshold", {"threshold": 90, "type": "THRESH_BINARY_INV"}),
+]
+
+
+def test_pointwise_chain_is_fused(engine, tmp_path):
+    """连续的逐像素节点合并为一个步骤"""
+    plan = engine.compile(chain_workflow(write_image(tmp_path, (8, 8)), POINTWISE_CHAIN))
+
+    assert plan.order == ("input", "n3", "view")
+    assert plan.steps["n3"].node_type == "PointwiseChain"
+    assert plan.steps["n3"].fused == ("n0", "n1", "n2")
+    assert plan.steps["n1"].fused_into == "n3"
+    assert plan.steps["input"].dependents == ("n3",)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shape", [(40, 30), (40, 30, 3)])
+async def test_pointwise_fusion_bit_exact(engine, tmp_path, shape):
+    """融合执行与逐个执行结果完全一致（含多通道灰度化的回退路径）"""
+    workflow = chain_workflow(write_image(tmp_path, shape), POINTWISE_CHAIN)
+
+    fused = await engine.execute(workflow, "run-fused")
+    plain = await engine.execute(workflow, "run-plain", retain_all_outputs=True)
+
+    assert fused["status"] == RunStatus.COMPLETED
+    assert all(status == NodeStatus.SUCCESS for status in fused["node_statuses"].values())
+    assert set(fused["node_statuses"]) == set(plain["node_statuses"])
+    np.testing.assert_array_equal(fused["node_outputs"]["view"][0].value, plain["node_outputs"]["view"][0].value)
+    # 需要中间输出时使用未融合的计划
+    assert "n1" in plain["node_outputs"]
+
+
+@pytest.mark.asyncio
+async def test_pointwise_fusion_multichannel_lut(engine, tmp_path):
+    """多通道图像上的阈值链共用一张查找表"""
+    workflow = chain_workflow(write_image(tmp_path, (16, 16, 3)), POINTWISE_CHAIN[1:])
+    image = cv2.imread(workflow.nodes[0].params["path"])
+
+    result = await engine.execute(workflow, "run-color")
+    expected = image
+    for _, params in POINTWISE_CHAIN[1:]:
+        _, expected = cv2.threshold(
+            expected, params["threshold"], params.get("max_value", 255), getattr(cv2, params["type"])
+        )
+    np.testing.assert_array_equal(result["node_outputs"]["view"][0].value, expected)
+
+
+MORPHOLOGY_CHAINS = [
+    [("Erode", {"kernel_size": 3, "iterations": 4})],
+    [("Dilate", {"kernel_size": 4, "iterations": 3})],
+    [("Erode", {"kernel_size": 3, "iterations": 2}), ("Dilate", {"kernel_size": 3, "iterations": 2})],
+    [("Erode", {"kernel_size": 4}), ("Erode", {"kernel_size": 5}), ("Dilate", {"kernel_size": 2, "iterations": 3})],
+    [("Close", {"kernel_size": 5}), ("Open", {"kernel_size": 5}), ("Open", {"kernel_size": 5})],
+    [("Open", {"kernel_size": 4}), ("Open", {"kernel_size": 4}), ("Close", {"kernel_size": 4})],
+    [("Dilate", {"kernel_size": 3}), ("Close", {"kernel_size": 3}), ("Erode", {"kernel_size": 1})],
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chain", MORPHOLOGY_CHAINS)
+@pytest.mark.parametrize("binary", [False, True])
+async def test_morphology_fusion_bit_exact(engine, tmp_path, chain, binary):
+    """形态学链融合后与逐个执行结果逐位一致"""
+    image = np.random.default_rng(2).integers(0, 256, (45, 52), dtype=np.uint8)
+    if binary:
+        image = np.where(image > 128, 255, 0).astype(np.uint8)
+    path = tmp_path / "input.png"
+    cv2.imwrite(str(path), image)
+    workflow = chain_workflow(str(path), chain)
+
+    plan = engine.compile(workflow)
+    assert plan.steps[f"n{len(chain) - 1}"].node_type == "MorphologyChain"
+
+    fused = await engine.execute(workflow, "run-fused")
+    plain = await engine.execute(workflow, "run-plain", retain_all_outputs=True)
+    assert fused["status"] == RunStatus.COMPLETED
+    np.testing.assert_array_equal(fused["node_outputs"]["view"][0].value, plain["node_outputs"]["view"][0].value)
+
+
+def test_simplify_morphology():
+    """迭代折叠为更大的矩形核，对称核上重复的开运算只保留一次"""
+    from app.core.fusion import simplify_morphology
+
+    assert simplify_morphology([("erode", 3, 1)] * 3) == [("erode", 7, 3)]
+    assert simplify_morphology([("dilate", 4, 2)] * 2) == [("dilate", 7, 4)]
+    ops = [("erode", 3, 1), ("dilate", 3, 1)] * 3
+    assert simplify_morphology(ops) == [("erode", 3, 1), ("dilate", 3, 1)]
+    # 偶数核上的开运算不满足幂等，保持原样
+    ops = [("erode", 4, 2), ("dilate", 4, 2)] * 2
+    assert simplify_morphology(ops) == ops
@@ -0,0 +1,131 @@
+"""目录导入测试"""
+import cv2
+import numpy as np
+import pytest
+
+from app.core.batch import BatchRunner
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+from app.models.ingest import IngestConfig
+from app.services.ingest import IngestService, IngestWatcher
+from tests.test_fusion import chain_workflow
+
+
+@pytest.fixture
+def batch_runner():
+    registry = NodeRegistry()
+    registry.register_all()
+    return BatchRunner(WorkflowEngine(registry))
+
+
+def write_image(path, value=0):
+    cv2.imwrite(str(path), np.full((8, 10, 3), value, dtype=np.uint8))
+
+
+def make_watcher(batch_runner, tmp_path, **config) -> IngestWatcher:
+    workflow = chain_workflow("", [("Grayscale", {})])
+    watcher = IngestWatcher(
+        "ingest",
+        IngestConfig(workflow_id="fusion", directory=str(tmp_path / "in"), settle_seconds=0, **config),
+        batch_runner,
+        lambda workflow_id: workflow,
+        tmp_path / "ingest.json",
+    )
+    watcher.save()
+    return watcher
+
+
+@pytest.mark.asyncio
+async def test_ingest_debounce_and_restart(batch_runner, tmp_path):
+    """写入中的文件等待稳定后处理；重启后已处理和失败的文件不再处理，重新写入的文件重新处理"""
+    (tmp_path / "in").mkdir()
+    write_image(tmp_path / "in" / "a.png")
+    (tmp_path / "in" / "bad.png").write_bytes(b"not an image")
+    (tmp_path / "in" / "notes.txt").write_text("ignored")
+
+    watcher = make_watcher(batch_runner, tmp_path)
+    assert await watcher.poll_once() == 0  # 第一次只记录文件大小和修改时间
+    with open(tmp_path / "in" / "bad.png", "ab") as f:
+        f.write(b" still writing")
+    assert await watcher.poll_once() == 1
+    assert watcher.files["a.png"].status == "completed"
+    assert await watcher.poll_once() == 1
+    assert watcher.files["bad.png"].status == "failed"
+
+    restarted = IngestWatcher.load(tmp_path / "ingest.json", batch_runner, watcher.get_workflow)
+    assert set(restarted.files) == {"a.png", "bad.png"}
+    assert await restarted.poll_once() == 0
+    assert await restarted.poll_once() == 0
+
+    write_image(tmp_path / "in" / "a.png", 255)
+    write_image(tmp_path / "in" / "b.png")
+    assert await restarted.poll_once() == 0
+    assert await restarted.poll_once() == 2
+    run_id = restarted.files["a.png"].run_id
+    assert batch_runner.engine.get_run(run_id)["node_outputs"]["view"][0].value.max() == 255
+
+
+@pytest.mark.asyncio
+async def test_ingest_records_are_appended(batch_runner, tmp_path):
+    """每批只追加这一批的记录；移除的文件删除记录，加载时压缩记录文件"""
+    (tmp_path / "in").mkdir()
+    for index in range(3):
+        write_image(tmp_path / "in" / f"{index}.png")
+    watcher = make_watcher(batch_runner, tmp_path, max_batch=2)
+    counts = [await watcher.poll_once() for _ in range(3)]
+    assert counts == [0, 2, 1]
+    assert "files" not in (tmp_path / "ingest.json").read_text()
+    assert len(watcher.records_file.read_text().splitlines()) == 3
+
+    (tmp_path / "in" / "0.png").unlink()
+    assert await watcher.poll_once() == 0
+    assert set(watcher.files) == {"1.png", "2.png"}
+    assert len(watcher.records_file.read_text().splitlines()) == 4
+
+    # 模拟写入一半时退出
+    with open(watcher.records_file, "a", encoding="utf-8") as f:
+        f.write('{"path": "3.png", "si')
+    restarted = IngestWatcher.load(tmp_path / "ingest.json", batch_runner, watcher.get_workflow)
+    assert set(restarted.files) == {"1.png", "2.png"}
+    assert len(restarted.records_file.read_text().splitlines()) == 2
+    assert await restarted.poll_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_ingest_backpressure(batch_runner, tmp_path):
+    """每批最多处理 max_batch 个文件，积压的文件留到下一批"""
+    (tmp_path / "in").mkdir()
+    for index in range(5):
+        write_image(tmp_path / "in" / f"{index}.png")
+    watcher = make_watcher(batch_runner, tmp_path, max_batch=2)
+
+    watcher.MAX_BATCHES = 2
+    counts = [await watcher.poll_once() for _ in range(4)]
+    assert counts == [0, 2, 2, 1]
+    assert all(record.status == "completed" for record in watcher.files.values())
+    # 只保留最近两批，更早的批处理及其运行记录已删除
+    assert len(watcher.batches) == 2 and set(batch_runner.batches) == set(watcher.batches)
+    first, last = watcher.batches
+    assert set(batch_runner.engine.runs) == {f"{first}.0", f"{first}.1", f"{last}.0"}
+
+
+@pytest.mark.asyncio
+async def test_ingest_service_resume(batch_runner, tmp_path):
+    """导入任务的配置和启停状态持久化，服务重启后恢复"""
+    (tmp_path / "in").mkdir()
+    service = IngestService(batch_runner, lambda workflow_id: None, str(tmp_path / "state"))
+    with pytest.raises(ValueError):
+        service.create(IngestConfig(workflow_id="w", directory=str(tmp_path / "missing")))
+    running = service.create(IngestConfig(workflow_id="w", directory=str(tmp_path / "in"), poll_interval=60))
+    stopped = service.create(IngestConfig(workflow_id="w", directory=str(tmp_path / "in"), poll_interval=60))
+    await service.stop(stopped.ingest_id)
+    await service.shutdown()
+    assert not running.running
+
+    restarted = IngestService(batch_runner, lambda workflow_id: None, str(tmp_path / "state"))
+    restarted.resume()
+    assert restarted.get(running.ingest_id).running
+    assert not restarted.get(stopped.ingest_id).running
+    await restarted.delete(running.ingest_id)
+    assert not list((tmp_path / "state").glob(f"{running.ingest_id}.*"))
+    await restarted.shutdown()
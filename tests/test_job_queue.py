@@ -0,0 +1,146 @@
+"""持久化运行队列测试"""
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.plan import workflow_fingerprint
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+from app.models.run import RunStatus
+from app.services.job_queue import JobQueue
+from app.worker import Worker
+from tests.test_fusion import chain_workflow
+
+
+def make_payload(path: str = "") -> dict:
+    workflow = chain_workflow(path, [("Grayscale", {})])
+    return {"workflow": workflow.model_dump(mode="json"), "options": {}, "progressive": False, "preview_scale": None}
+
+
+def test_claim_lease_and_retry(tmp_path):
+    """按入队顺序领取；租约过期后由其他工作者重新领取，尝试次数用完后标记为失败"""
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2)
+    queue.enqueue("a", "fusion", make_payload())
+    queue.enqueue("b", "fusion", make_payload())
+
+    job = queue.claim("w1", lease_seconds=60)
+    assert job["job_id"] == "a" and job["attempts"] == 1 and job["payload"]["options"] == {}
+    assert queue.claim("w2", lease_seconds=-1)["job_id"] == "b"
+    # 租约有效的任务不会被重复领取；w2 的租约已过期（模拟进程崩溃），w3 接管
+    job = queue.claim("w3", lease_seconds=60)
+    assert job["job_id"] == "b" and job["attempts"] == 2
+    assert queue.heartbeat("b", "w2") == (False, False, None)
+    assert queue.heartbeat("b", "w3", snapshot={"status": "running"}) == (True, False, None)
+    assert not queue.complete("b", "w2", RunStatus.COMPLETED)
+
+    # 再次崩溃后尝试次数用完
+    queue.heartbeat("b", "w3", lease_seconds=-1)
+    assert queue.claim("w4") is None
+    job = queue.get("b")
+    assert job["status"] == RunStatus.FAILED and job["error"]
+
+    assert queue.complete("a", "w1", RunStatus.COMPLETED, {"status": "completed"})
+    # 其他进程打开同一数据库可读取状态
+    assert JobQueue(str(tmp_path / "jobs.db")).get("a")["status"] == RunStatus.COMPLETED
+
+
+def test_cancel(tmp_path):
+    """等待中的任务直接取消；运行中的任务在续约时通知工作者"""
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("a", "fusion", make_payload())
+    queue.enqueue("b", "fusion", make_payload())
+    queue.claim("w1")
+    assert queue.request_cancel("a") and queue.request_cancel("b")
+    assert not queue.request_cancel("missing")
+    assert queue.get("b")["status"] == RunStatus.CANCELLED
+    assert queue.claim("w2") is None
+    assert queue.heartbeat("a", "w1") == (True, True, None)
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_job(tmp_path):
+    """工作者执行队列中的运行，结果（含 Base64 图像输出）写回数据库"""
+    path = tmp_path / "input.png"
+    cv2.imwrite(str(path), np.full((8, 10, 3), 200, dtype=np.uint8))
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("ok", "fusion", make_payload(str(path)))
+    queue.enqueue("bad", "fusion", make_payload(str(tmp_path / "missing.png")))
+
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+    worker = Worker(queue, engine, worker_id="w1", lease_seconds=3)
+    assert await worker.run_once() and await worker.run_once()
+    assert not await worker.run_once()
+    assert engine.runs == {}
+
+    detail = queue.get_run("ok")
+    assert detail.status == RunStatus.COMPLETED
+    assert isinstance(detail.node_outputs["view"][0].value, str)
+    detail = queue.get_run("bad")
+    assert detail.status == RunStatus.FAILED and detail.error
+
+
+@pytest.mark.asyncio
+async def test_worker_cancel(tmp_path):
+    """执行中收到取消请求时停止执行并记录为已取消"""
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue("a", "fusion", make_payload())
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+
+    async def slow_execute(workflow, run_id, **options):
+        engine.runs[run_id] = {
+            "run_id": run_id, "workflow_id": workflow.workflow_id, "status": RunStatus.RUNNING,
+            "created_at": "", "logs": [],
+        }
+        await asyncio.sleep(10)
+
+    engine.execute = slow_execute
+    queue.request_cancel("a")  # 尚未领取：直接取消
+    assert queue.get("a")["status"] == RunStatus.CANCELLED
+
+    queue.enqueue("b", "fusion", make_payload())
+    worker = Worker(queue, engine, worker_id="w1", lease_seconds=0.3)
+    task = asyncio.create_task(worker.run_once())
+    await asyncio.sleep(0.2)
+    queue.request_cancel("b")
+    assert await asyncio.wait_for(task, 2)
+    assert queue.get_run("b").status == RunStatus.CANCELLED
+
+
+@pytest.mark.asyncio
+async def test_worker_progressive(tmp_path):
+    """渐进式运行每完成一代即可查询其输出；工作流修改后取消正在执行的一代，保留代理结果"""
+    from tests.test_workflow import SleepNode, chain_workflow as sleep_chain_workflow
+
+    registry = NodeRegistry()
+    registry.register("Sleep", SleepNode({"running": 0, "peak": 0, "order": []}))
+    engine = WorkflowEngine(registry)
+    workflow = sleep_chain_workflow(1)
+    workflow.nodes[0].params["delay"] = 0.5
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    payload = {"workflow": workflow.model_dump(mode="json"), "options": {}, "progressive": True, "preview_scale": None}
+    queue.enqueue("p", "chain", payload, workflow_fingerprint(workflow))
+
+    worker = Worker(queue, engine, worker_id="w1", lease_seconds=0.3, progress_interval=0.05)
+    task = asyncio.create_task(worker.run_once())
+
+    async def first_generation():
+        while not queue.get_run("p").node_outputs:
+            await asyncio.sleep(0.02)
+
+    await asyncio.wait_for(first_generation(), 2)
+    detail = queue.get_run("p")
+    assert detail.status == RunStatus.RUNNING and detail.preview_scale == 0.25
+    assert [g["status"] for g in detail.generations] == ["completed", "running"]
+
+    queue.update_workflow_version("chain", "edited")
+    assert await asyncio.wait_for(task, 2)
+    detail = queue.get_run("p")
+    assert detail.status == RunStatus.CANCELLED and detail.error == "工作流已修改，运行已取消"
+    assert [g["status"] for g in detail.generations] == ["completed", "cancelled"]
+    assert set(detail.node_outputs) == {"c0"}
@@ -99,3 +99,25 @@ async def test_dilate_node(sample_image):
     assert "image" in result
     assert result["image"].shape == binary.shape
 
+
+
+def test_scale_params_for_preview():
+    """代理分辨率下像素参数按比例换算"""
+    from app.core.nodes.image_process import CropNode, GaussianBlurNode
+
+    assert CropNode().scale_params({"x": 100, "y": 50, "width": 300, "height": 3}, 0.25) == {
+        "x": 25, "y": 12, "width": 75, "height": 1,
+    }
+    blurred = GaussianBlurNode().scale_params({"kernel_size": 15, "sigma_x": 2.0, "sigma_y": 0}, 0.25)
+    assert blurred["kernel_size"] == 5 and blurred["sigma_x"] == 0.5
+    assert ErodeNode().scale_params({"kernel_size": 3, "iterations": 2}, 0.1) == {"kernel_size": 1, "iterations": 2}
+
+
+@pytest.mark.parametrize("suffix", [".jpg", ".png"])
+def test_image_input_preview_scale(tmp_path, suffix):
+    """代理分辨率读取得到精确的缩小尺寸"""
+    path = str(tmp_path / f"input{suffix}")
+    cv2.imwrite(path, np.random.default_rng(0).integers(0, 256, (203, 301, 3), dtype=np.uint8))
+
+    image = ImageInputNode()._read(path, 0.25)
+    assert image.shape == (51, 75, 3)
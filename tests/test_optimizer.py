@@ -0,0 +1,200 @@
+"""执行计划优化器测试"""
+import numpy as np
+import pytest
+
+from app.models.workflow import Workflow, Node, Link, NodePort
+from app.models.run import RunStatus, NodeStatus
+from app.core.optimizer import PlanOptimizer, OptimizationRule
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+from tests.test_fusion import chain_workflow, write_image
+
+
+@pytest.fixture
+def engine():
+    registry = NodeRegistry()
+    registry.register_all()
+    return WorkflowEngine(registry)
+
+
+def fired_rules(plan) -> set:
+    return {record.rule for record in plan.optimizations}
+
+
+def test_level_off_keeps_plan(engine, tmp_path):
+    """off 级别不做任何改写"""
+    workflow = chain_workflow(write_image(tmp_path, (8, 8)), [("Grayscale", {}), ("Threshold", {})])
+    plan = engine.compile(workflow, level="off")
+
+    assert plan.order == ("input", "n0", "n1", "view")
+    assert plan.optimizations == ()
+    assert all(step.alias_of is None and not step.fused for step in plan.steps.values())
+
+
+def test_passthrough_viewer_is_alias(engine, tmp_path):
+    """查看器直接复用上游输出"""
+    plan = engine.compile(chain_workflow(write_image(tmp_path, (8, 8)), [("Blur", {})]))
+
+    assert plan.steps["view"].alias_of == "n0"
+    assert plan.steps["view"].alias_ports == {"image": "image"}
+    assert "passthrough" in fired_rules(plan)
+
+
+@pytest.mark.asyncio
+async def test_grayscale_noop(engine, tmp_path):
+    """单通道输入上的灰度化被跳过，结果不变"""
+    chain = [("Grayscale", {}), ("Blur", {}), ("Grayscale", {})]
+    workflow = chain_workflow(write_image(tmp_path, (20, 20, 3)), chain)
+    plan = engine.compile(workflow)
+    assert plan.steps["n2"].alias_of == "n1"
+    assert "grayscale_noop" in fired_rules(plan)
+
+    optimized = await engine.execute(workflow, "run-opt")
+    plain = await engine.execute(workflow, "run-plain", retain_all_outputs=True)
+    assert optimized["node_statuses"]["n2"] == NodeStatus.SUCCESS
+    np.testing.assert_array_equal(optimized["node_outputs"]["view"][0].value, plain["node_outputs"]["view"][0].value)
+
+
+@pytest.mark.asyncio
+async def test_crop_pushdown_bit_exact(engine, tmp_path):
+    """先裁剪再阈值与原顺序结果一致"""
+    chain = [("Threshold", {"threshold": 100}), ("Crop", {"x": 5, "y": 3, "width": 20, "height": 10})]
+    workflow = chain_workflow(write_image(tmp_path, (40, 40, 3)), chain)
+    plan = engine.compile(workflow)
+    assert plan.steps["n1"].node_type == "CropPushdown"
+    assert plan.steps["n0"].fused_into == "n1"
+
+    optimized = await engine.execute(workflow, "run-opt")
+    plain = await engine.execute(workflow, "run-plain", retain_all_outputs=True)
+    assert optimized["status"] == RunStatus.COMPLETED
+    np.testing.assert_array_equal(optimized["node_outputs"]["view"][0].value, plain["node_outputs"]["view"][0].value)
+
+
+def test_resize_collapse_only_aggressive(engine, tmp_path):
+    """连续 Resize 只在 aggressive 级别合并"""
+    chain = [("Resize", {"width": 10, "height": 10}), ("Resize", {"width": 30, "height": 20})]
+    workflow = chain_workflow(write_image(tmp_path, (40, 40)), chain)
+
+    assert "resize_collapse" not in fired_rules(engine.compile(workflow, level="safe"))
+    plan = engine.compile(workflow, level="aggressive")
+    assert "resize_collapse" in fired_rules(plan)
+    assert plan.order == ("input", "n1", "view")
+    assert plan.steps["n1"].params["width"] == 30
+
+
+def test_workflow_level_and_explain(engine, tmp_path):
+    """默认使用工作流的优化级别，explain 列出改写和节点执行方式"""
+    workflow = chain_workflow(write_image(tmp_path, (8, 8)), [("Grayscale", {}), ("Threshold", {})])
+    workflow.optimization = "off"
+    assert engine.compile(workflow).level == "off"
+
+    workflow.optimization = "safe"
+    explain = engine.compile(workflow).explain()
+    assert explain["level"] == "safe"
+    assert explain["nodes"]["n0"]["mode"] == "fused"
+    assert explain["nodes"]["view"]["mode"] == "alias"
+    assert {"rule": "pointwise_fusion", "nodes": ("n0", "n1"), "detail": ""} in explain["optimizations"]
+
+
+def test_register_custom_rule(tmp_path):
+    """自定义规则按注册位置应用"""
+    calls = []
+
+    class RecordingRule(OptimizationRule):
+        name = "recording"
+        description = "记录调用顺序"
+
+        def apply(self, order, steps):
+            calls.append(list(order))
+            return order, steps, [self.record(order[:1])]
+
+    optimizer = PlanOptimizer()
+    optimizer.register(RecordingRule(), before="common_steps")
+    assert optimizer.rules[0].name == "recording"
+
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry, optimizer=optimizer)
+    plan = engine.compile(chain_workflow(write_image(tmp_path, (8, 8)), [("Blur", {})]))
+    assert calls == [["input", "n0", "view"]]
+    assert plan.optimizations[0].rule == "recording"
+
+
+ROI_CHAIN = [
+    ("GaussianBlur", {"kernel_size": 7}),
+    ("Threshold", {"threshold": 120, "type": "THRESH_TOZERO"}),
+    ("Blur", {"kernel_size": 4}),
+    ("Erode", {"kernel_size": 3, "iterations": 2}),
+    ("Close", {"kernel_size": 5}),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("crop", [
+    {"x": 20, "y": 15, "width": 25, "height": 18},
+    {"x": 0, "y": 0, "width": 12, "height": 9},
+    {"x": 50, "y": 40, "width": 30, "height": 30},
+    {"x": -10, "y": 5, "width": 8, "height": 8},
+    {"x": 70, "y": 0, "width": 5, "height": 5},
+])
+async def test_crop_roi_propagation_bit_exact(engine, tmp_path, crop):
+    """上游邻域节点只计算裁剪窗口，裁剪结果与整幅图像处理逐位一致"""
+    workflow = chain_workflow(write_image(tmp_path, (60, 64, 3)), [*ROI_CHAIN, ("Crop", crop)])
+    plan = engine.compile(workflow)
+    assert plan.order == ("input", "n5", "view")
+    assert plan.steps["n5"].fused == ("n0", "n1", "n2", "n3", "n4")
+    assert plan.steps["n5"].node_impl.halo == 3 + 0 + 2 + 2 + 4
+
+    optimized = await engine.execute(workflow, "run-opt")
+    plain = await engine.execute(workflow, "run-plain", retain_all_outputs=True)
+    assert optimized["status"] == RunStatus.COMPLETED
+    np.testing.assert_array_equal(optimized["node_outputs"]["view"][0].value, plain["node_outputs"]["view"][0].value)
+
+
+def test_crop_pushdown_stops_at_resize(engine, tmp_path):
+    """缩放等非局部节点不参与裁剪下推"""
+    chain = [("Blur", {}), ("Resize", {"width": 30, "height": 30}), ("Blur", {}), ("Crop", {})]
+    plan = engine.compile(chain_workflow(write_image(tmp_path, (40, 40)), chain))
+    assert plan.order == ("input", "n0", "n1", "n3", "view")
+    assert plan.steps["n3"].fused == ("n2",)
+
+
+@pytest.mark.asyncio
+async def test_tiled_execution_matches_full_frame(engine, tmp_path):
+    """分块执行与整幅执行结果一致，不可分块的节点使用拼接后的输出"""
+    path = write_image(tmp_path, (150, 170, 3))
+    workflow = chain_workflow(path, [
+        ("GaussianBlur", {"kernel_size": 9}),
+        ("Grayscale", {}),
+        ("Threshold", {"threshold": 128}),
+        ("Dilate", {"kernel_size": 5, "iterations": 2}),
+        ("FindContours", {}),
+    ])
+
+    full = await engine.execute(workflow, "run-full", retain_outputs=["n3"])
+    tiled = await engine.execute(workflow, "run-tiled", retain_outputs=["n3"], tile_size=64)
+
+    assert tiled["status"] == RunStatus.COMPLETED
+    assert all(status == NodeStatus.SUCCESS for status in tiled["node_statuses"].values())
+    assert isinstance(tiled["node_outputs"]["n3"][0].value, np.memmap)
+    np.testing.assert_array_equal(tiled["node_outputs"]["n3"][0].value, full["node_outputs"]["n3"][0].value)
+    np.testing.assert_array_equal(tiled["node_outputs"]["view"][0].value, full["node_outputs"]["view"][0].value)
+    assert any(log["message"].startswith("分块执行 4 个节点") for log in tiled["logs"])
+
+
+@pytest.mark.asyncio
+async def test_preview_scale_run(engine, tmp_path):
+    """代理分辨率运行：图像缩小、参数换算、输出标记为代理结果"""
+    chain = [("GaussianBlur", {"kernel_size": 9}), ("Crop", {"x": 40, "y": 20, "width": 80, "height": 60})]
+    workflow = chain_workflow(write_image(tmp_path, (120, 160, 3)), chain)
+
+    run_data = await engine.execute(workflow, "run-preview", preview_scale=0.5)
+    assert run_data["status"] == RunStatus.COMPLETED
+    assert run_data["preview_scale"] == 0.5
+    output = run_data["node_outputs"]["view"][0]
+    assert output.value.shape == (30, 40, 3)
+    assert output.metadata == {"proxy": True, "preview_scale": 0.5}
+
+    full = await engine.execute(workflow, "run-full")
+    assert full["node_outputs"]["view"][0].value.shape == (60, 80, 3)
+    assert full["node_outputs"]["view"][0].metadata is None
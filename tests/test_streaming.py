@@ -0,0 +1,148 @@
+"""流式处理测试"""
+import cv2
+import numpy as np
+import pytest
+
+from app.models.workflow import Workflow, Node, Link, NodePort
+from app.models.run import RunStatus
+from app.core.streaming import StreamRunner
+from app.core.workflow import WorkflowEngine
+from app.core.nodes.registry import NodeRegistry
+
+
+@pytest.fixture
+def engine():
+    registry = NodeRegistry()
+    registry.register_all()
+    return WorkflowEngine(registry)
+
+
+def write_video(tmp_path, count=9) -> str:
+    """每 3 帧内容相同的视频"""
+    path = str(tmp_path / "input.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (32, 24))
+    for index in range(count):
+        frame = np.zeros((24, 32, 3), dtype=np.uint8)
+        frame[:, : 4 + (index // 3) * 8] = 200
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def video_workflow(path: str) -> Workflow:
+    nodes = [
+        Node(id="input", type="VideoInput", params={"path": path}),
+        Node(id="gray", type="Grayscale"),
+        Node(id="blur", type="Blur", params={"kernel_size": 3}),
+        Node(id="view", type="ImageViewer"),
+    ]
+    links = [
+        Link(from_=NodePort(node="input", port="image"), to=NodePort(node="gray", port="image")),
+        Link(from_=NodePort(node="gray", port="image"), to=NodePort(node="blur", port="image")),
+        Link(from_=NodePort(node="blur", port="image"), to=NodePort(node="view", port="image")),
+    ]
+    return Workflow(workflow_id="video", nodes=nodes, links=links)
+
+
+@pytest.mark.asyncio
+async def test_stream_frames_match_single_runs(engine, tmp_path):
+    """逐帧输出与单次运行对应帧的结果一致"""
+    workflow = video_workflow(write_video(tmp_path))
+    runner = StreamRunner(engine, prefetch=2)
+    results = [result async for result in runner.frames(workflow)]
+
+    assert [result["index"] for result in results] == list(range(9))
+    assert not any(result["skipped"] for result in results)
+    for index in (0, 4, 8):
+        workflow.nodes[0].params["frame_index"] = index
+        run_data = await engine.execute(workflow, f"frame-{index}")
+        np.testing.assert_array_equal(
+            results[index]["outputs"]["view"]["image"], run_data["node_outputs"]["view"][0].value
+        )
+
+
+@pytest.mark.asyncio
+async def test_stream_gate_and_early_stop(engine, tmp_path):
+    """帧差低于门限的帧跳过并沿用上一处理帧的输出；提前结束时停止解码"""
+    workflow = video_workflow(write_video(tmp_path))
+    runner = StreamRunner(engine)
+    results = [result async for result in runner.frames(workflow, gate_threshold=5)]
+    assert [result["index"] for result in results if not result["skipped"]] == [0, 3, 6]
+    assert results[2]["outputs"] is results[0]["outputs"]
+
+    frames = runner.frames(workflow, params={"frame_step": 2})
+    first = await frames.__anext__()
+    await frames.aclose()
+    assert first["index"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_video_sink(engine, tmp_path):
+    """输出节点的图像逐帧编码为视频"""
+    workflow = video_workflow(write_video(tmp_path))
+    runner = StreamRunner(engine)
+    runner.create(workflow, "stream", params={"max_frames": 6})
+    output_path = str(tmp_path / "out" / "result.avi")
+    stream = await runner.run("stream", output_path, gate_threshold=5)
+
+    assert stream["status"] == RunStatus.COMPLETED
+    assert (stream["frames"], stream["processed"], stream["skipped"]) == (6, 2, 4)
+    capture = cv2.VideoCapture(output_path)
+    assert int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) == 6
+    ok, frame = capture.read()
+    capture.release()
+    assert ok and frame.shape == (24, 32, 3)
+
+
+def write_moving_video(tmp_path, count=6) -> str:
+    """静止背景上移动的小方块"""
+    path = str(tmp_path / "moving.avi")
+    background = np.random.default_rng(3).integers(0, 256, (96, 128, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (128, 96))
+    for index in range(count):
+        frame = background.copy()
+        frame[40:56, 10 + index * 16:26 + index * 16] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+@pytest.mark.asyncio
+async def test_stream_incremental_bit_exact(engine, tmp_path):
+    """脏矩形增量执行与整帧执行结果逐位一致，非局部节点整帧重新计算"""
+    nodes = [
+        Node(id="input", type="VideoInput", params={"path": write_moving_video(tmp_path)}),
+        Node(id="blur", type="GaussianBlur", params={"kernel_size": 5}),
+        Node(id="gray", type="Grayscale"),
+        Node(id="thresh", type="Threshold", params={"threshold": 160}),
+        Node(id="dilate", type="Dilate", params={"kernel_size": 3}),
+        Node(id="contours", type="FindContours"),
+    ]
+    chain = [node.id for node in nodes]
+    links = [
+        Link(from_=NodePort(node=a, port="image"), to=NodePort(node=b, port="image"))
+        for a, b in zip(chain, chain[1:])
+    ]
+    workflow = Workflow(workflow_id="moving", nodes=nodes, links=links)
+    runner = StreamRunner(engine)
+    outputs = ["dilate", "contours"]
+
+    full = [result async for result in runner.frames(workflow, outputs=outputs)]
+    incremental = [
+        result async for result in runner.frames(workflow, outputs=outputs, incremental=True, dirty_cell=16)
+    ]
+
+    assert incremental[0]["dirty"] == 1.0
+    # 编码噪声可能使个别帧整帧变化，其余帧只重新计算方块移动的区域
+    assert sum(0 < result["dirty"] < 0.5 for result in incremental[1:]) >= 3
+    for expected, result in zip(full, incremental):
+        np.testing.assert_array_equal(result["outputs"]["dilate"]["image"], expected["outputs"]["dilate"]["image"])
+        assert result["outputs"]["contours"]["contours"] == expected["outputs"]["contours"]["contours"]
+
+
+def test_stream_requires_video_input(engine, tmp_path):
+    """工作流中没有 VideoInput 节点时报错"""
+    workflow = video_workflow("")
+    workflow.nodes[0].type = "ImageInput"
+    with pytest.raises(ValueError, match="VideoInput"):
+        StreamRunner(engine).create(workflow, "stream")
@@ -1,8 +1,15 @@
 """工作流测试"""
+import asyncio
+
 import pytest
 from app.models.workflow import Workflow, Node, Link, NodePort
+from app.models.run import RunStatus, NodeStatus
 from app.core.workflow import WorkflowEngine
+from app.core.plan import workflow_fingerprint
+from app.core.nodes.base import BaseNode, NodeContext, ExecutionKind
 from app.core.nodes.registry import NodeRegistry
+from app.core.nodes.viewer import OutputNode
+from app.services.storage import WorkflowStorage
 
 
 @pytest.fixture
@@ -55,3 +62,419 @@ def test_topological_sort(simple_workflow):
     assert order[0] == "n1"
     assert order[1] == "n2"
 
+
+
+class SleepNode(BaseNode):
+    """测试用节点：休眠后透传输入，并记录并发数"""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    @property
+    def node_type(self) -> str:
+        return "Sleep"
+
+    @property
+    def name(self) -> str:
+        return "休眠"
+
+    @property
+    def description(self) -> str:
+        return "测试用休眠节点"
+
+    @property
+    def input_ports(self):
+        return {"value": "输入"}
+
+    @property
+    def output_ports(self):
+        return {"value": "输出"}
+
+    @property
+    def param_schema(self):
+        return {"type": "object", "properties": {}}
+
+    @property
+    def execution_kind(self):
+        return ExecutionKind.TRIVIAL
+
+    @property
+    def deterministic(self):
+        # 需要记录每个节点的执行，不参与合并
+        return False
+
+    async def execute(self, context: NodeContext):
+        if context.params.get("fail"):
+            raise ValueError("故意失败")
+        self.tracker["running"] += 1
+        self.tracker["peak"] = max(self.tracker["peak"], self.tracker["running"])
+        await asyncio.sleep(context.params.get("delay", 0.05))
+        self.tracker["running"] -= 1
+        self.tracker["order"].append(context.node_id)
+        return {"value": context.inputs.get("value", context.node_id)}
+
+
+@pytest.fixture
+def sleep_engine():
+    """注册了休眠节点的引擎"""
+    tracker = {"running": 0, "peak": 0, "order": []}
+    registry = NodeRegistry()
+    registry.register("Sleep", SleepNode(tracker))
+    registry.register("Output", OutputNode())
+    return WorkflowEngine(registry), tracker
+
+
+def fan_out_workflow(branches: int, fail_branch: int = -1) -> Workflow:
+    """一个源节点扇出到多个分支"""
+    nodes = [Node(id="src", type="Sleep", params={"delay": 0.01})]
+    links = []
+    for i in range(branches):
+        nodes.append(Node(id=f"b{i}", type="Sleep", params={"fail": i == fail_branch}))
+        links.append(Link(from_=NodePort(node="src", port="value"), to=NodePort(node=f"b{i}", port="value")))
+    return Workflow(workflow_id="fan-out", nodes=nodes, links=links)
+
+
+@pytest.mark.asyncio
+async def test_parallel_branches_respect_max_concurrent(sleep_engine):
+    """独立分支并行执行，且不超过 max_concurrent"""
+    engine, tracker = sleep_engine
+    result = await engine.execute(fan_out_workflow(6), "run-parallel", max_concurrent=3)
+
+    assert result["status"] == RunStatus.COMPLETED
+    assert tracker["peak"] == 3
+    assert tracker["order"][0] == "src"
+    assert all(status == NodeStatus.SUCCESS for status in result["node_statuses"].values())
+    assert result["node_cache"]["b5"]["value"] == "src"
+
+
+@pytest.mark.asyncio
+async def test_max_concurrent_one_runs_sequentially(sleep_engine):
+    """并发度为 1 时按拓扑顺序逐个执行"""
+    engine, tracker = sleep_engine
+    await engine.execute(fan_out_workflow(3), "run-serial", max_concurrent=1)
+
+    assert tracker["peak"] == 1
+    assert tracker["order"] == ["src", "b0", "b1", "b2"]
+
+
+@pytest.mark.asyncio
+async def test_failure_stops_scheduling(sleep_engine):
+    """节点失败后不再启动新节点"""
+    engine, tracker = sleep_engine
+    result = await engine.execute(fan_out_workflow(4, fail_branch=0), "run-fail", max_concurrent=1)
+
+    assert result["status"] == RunStatus.FAILED
+    assert result["node_statuses"]["b0"] == NodeStatus.FAILED
+    assert "b1" not in result["node_statuses"]
+    assert result["logs"][-1]["type"] == "error"
+
+
+def test_build_graph_resolves_default_ports():
+    """依赖图的输入边已解析默认端口名称"""
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+    workflow = Workflow(
+        workflow_id="default-ports",
+        nodes=[
+            Node(id="n1", type="ImageInput", params={"path": "test.jpg"}),
+            Node(id="n2", type="FindContours"),
+            Node(id="n3", type="BoundingRect"),
+        ],
+        links=[
+            Link(from_=NodePort(node="n1", port="output"), to=NodePort(node="n2", port="input")),
+            Link(from_=NodePort(node="n2", port="contours"), to=NodePort(node="n3", port="default")),
+        ],
+    )
+
+    graph = engine._build_graph(workflow)
+    assert graph["n2"]["inputs"] == [{"from_node": "n1", "from_port": "image", "to_port": "image"}]
+    assert graph["n3"]["inputs"] == [{"from_node": "n2", "from_port": "contours", "to_port": "contours"}]
+    assert graph["n1"]["inputs"] == []
+
+
+def test_compile_caches_plan_by_content(simple_workflow):
+    """相同内容的工作流复用执行计划，参数变更后重新编译"""
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+
+    plan = engine.compile(simple_workflow)
+    assert engine.compile(simple_workflow) is plan
+    assert plan.order == ("n1", "n2")
+    assert plan.steps["n2"].inputs[0].from_node == "n1"
+
+    # 仅移动节点位置不影响计划
+    simple_workflow.nodes[1].position = {"x": 10, "y": 20}
+    assert engine.compile(simple_workflow) is plan
+
+    simple_workflow.nodes[1].params = {"width": 50, "height": 50}
+    changed = engine.compile(simple_workflow)
+    assert changed is not plan
+    assert changed.steps["n2"].params["width"] == 50
+
+    engine.invalidate_plans("test-workflow")
+    assert len(engine.plan_cache) == 0
+
+
+def test_compile_validates_params(simple_workflow):
+    """编译时填充默认参数并校验类型"""
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+
+    simple_workflow.nodes[1].params = {"width": 100.0, "height": "80"}
+    step = engine.compile(simple_workflow).steps["n2"]
+    assert step.params == {"width": 100, "height": 80, "interpolation": "INTER_LINEAR"}
+
+    simple_workflow.nodes[1].params = {"width": 100, "height": 80, "interpolation": "INTER_FOO"}
+    with pytest.raises(ValueError):
+        engine.compile(simple_workflow)
+
+
+def test_storage_save_notifies_listeners(tmp_path, simple_workflow):
+    """工作流保存后通知监听器（用于使计划缓存失效）"""
+    storage = WorkflowStorage(storage_dir=str(tmp_path))
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+    storage.add_listener(engine.invalidate_plans)
+
+    engine.compile(simple_workflow)
+    storage.save(simple_workflow)
+    assert len(engine.plan_cache) == 0
+
+
+def chain_workflow(length: int, fail_last: bool = False) -> Workflow:
+    """线性链 c0 -> c1 -> ... """
+    nodes = [
+        Node(id=f"c{i}", type="Sleep", params={"delay": 0, "fail": fail_last and i == length - 1})
+        for i in range(length)
+    ]
+    links = [
+        Link(from_=NodePort(node=f"c{i}", port="value"), to=NodePort(node=f"c{i + 1}", port="value"))
+        for i in range(length - 1)
+    ]
+    return Workflow(workflow_id="chain", nodes=nodes, links=links)
+
+
+@pytest.mark.asyncio
+async def test_intermediate_outputs_released(sleep_engine):
+    """中间结果在下游完成后释放，只保留末端节点和显式指定的节点"""
+    engine, _ = sleep_engine
+    result = await engine.execute(chain_workflow(4), "run-release")
+
+    assert set(result["node_cache"]) == {"c3"}
+    assert set(result["node_outputs"]) == {"c3"}
+    assert all(status == NodeStatus.SUCCESS for status in result["node_statuses"].values())
+
+    result = await engine.execute(chain_workflow(4), "run-retain", retain_outputs=["c1"])
+    assert set(result["node_outputs"]) == {"c1", "c3"}
+
+    result = await engine.execute(chain_workflow(4), "run-retain-all", retain_all_outputs=True)
+    assert set(result["node_outputs"]) == {"c0", "c1", "c2", "c3"}
+
+
+@pytest.mark.asyncio
+async def test_failed_run_keeps_frontier_outputs(sleep_engine):
+    """运行失败时保留失败节点的输入，已完成下游的上游结果仍被释放"""
+    engine, _ = sleep_engine
+    result = await engine.execute(chain_workflow(4, fail_last=True), "run-frontier")
+
+    assert result["status"] == RunStatus.FAILED
+    assert set(result["node_cache"]) == {"c2"}
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_recomputes_dirty_subgraph(sleep_engine):
+    """增量执行只重新计算参数变化的节点及其下游"""
+    engine, tracker = sleep_engine
+    await engine.execute(chain_workflow(4), "run-base", retain_all_outputs=True)
+
+    workflow = chain_workflow(4)
+    workflow.nodes[2].params["delay"] = 0.001
+    tracker["order"].clear()
+    result = await engine.execute(workflow, "run-incremental", base_run_id="run-base")
+
+    assert result["status"] == RunStatus.COMPLETED
+    assert tracker["order"] == ["c2", "c3"]
+    assert all(status == NodeStatus.SUCCESS for status in result["node_statuses"].values())
+    assert result["node_cache"]["c3"]["value"] == "c0"
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_recomputes_released_inputs(sleep_engine):
+    """基准运行中已释放且无法取回的输入连同上游一起重新计算"""
+    engine, tracker = sleep_engine
+    await engine.execute(chain_workflow(4), "run-base")
+
+    workflow = chain_workflow(4)
+    workflow.nodes[3].params["delay"] = 0.001
+    tracker["order"].clear()
+    result = await engine.execute(workflow, "run-incremental", base_run_id="run-base")
+
+    assert result["status"] == RunStatus.COMPLETED
+    assert tracker["order"] == ["c0", "c1", "c2", "c3"]
+
+    # 未变化时直接复用保留的末端输出
+    tracker["order"].clear()
+    result = await engine.execute(workflow, "run-unchanged", base_run_id="run-incremental")
+    assert tracker["order"] == []
+    assert set(result["node_outputs"]) == {"c3"}
+
+
+@pytest.mark.asyncio
+async def test_retry_resumes_from_failed_node(sleep_engine):
+    """失败重试从失败节点继续，上游使用失败运行保留的输入"""
+    engine, tracker = sleep_engine
+    await engine.execute(chain_workflow(4, fail_last=True), "run-failed")
+
+    tracker["order"].clear()
+    result = await engine.execute(chain_workflow(4), "run-retry", base_run_id="run-failed")
+
+    assert result["status"] == RunStatus.COMPLETED
+    assert tracker["order"] == ["c3"]
+    assert result["node_cache"]["c3"]["value"] == "c0"
+
+
+@pytest.mark.asyncio
+async def test_single_step_reuses_prior_run(sleep_engine):
+    """单步调试时目标节点重新执行，上游复用历史运行的输出"""
+    engine, tracker = sleep_engine
+    await engine.execute(chain_workflow(4), "run-full", retain_all_outputs=True)
+
+    tracker["order"].clear()
+    result = await engine.execute(chain_workflow(4), "run-step", start_node_id="c2", base_run_id="run-full")
+
+    assert result["status"] == RunStatus.COMPLETED
+    assert tracker["order"] == ["c2"]
+    assert "c3" not in result["node_statuses"]
+    assert set(result["node_outputs"]) == {"c2"}
+
+
+@pytest.mark.asyncio
+async def test_branches_without_output_are_skipped(sleep_engine):
+    """未连接到输出节点的分支不执行，状态为跳过"""
+    engine, tracker = sleep_engine
+    workflow = fan_out_workflow(3)
+    workflow.nodes.append(Node(id="out", type="Output"))
+    workflow.links.append(Link(from_=NodePort(node="b0", port="value"), to=NodePort(node="out", port="value")))
+
+    result = await engine.execute(workflow, "run-prune")
+    assert result["status"] == RunStatus.COMPLETED
+    assert set(tracker["order"]) == {"src", "b0"}
+    assert result["node_statuses"]["b1"] == NodeStatus.SKIPPED
+    assert result["node_statuses"]["b2"] == NodeStatus.SKIPPED
+    assert set(result["node_outputs"]) == {"out"}
+
+    # 请求中指定的输出节点及其上游同样执行
+    tracker["order"].clear()
+    result = await engine.execute(workflow, "run-outputs", outputs=["b1"])
+    assert set(tracker["order"]) == {"src", "b0", "b1"}
+    assert result["node_statuses"]["b2"] == NodeStatus.SKIPPED
+    assert set(result["node_outputs"]) == {"out", "b1"}
+
+
+def duplicated_branch_workflow(path: str) -> Workflow:
+    """复制粘贴的两条相同分支：模糊 -> 阈值 -> 查看器"""
+    nodes = [Node(id="input", type="ImageInput", params={"path": path})]
+    links = []
+    for suffix, params in (("a", {"kernel_size": 5}), ("b", {"sigma_x": 0, "kernel_size": 5})):
+        nodes += [
+            Node(id=f"blur_{suffix}", type="GaussianBlur", params=params),
+            Node(id=f"thresh_{suffix}", type="Threshold", params={"threshold": 100}),
+            Node(id=f"view_{suffix}", type="ImageViewer"),
+        ]
+        links += [
+            Link(from_=NodePort(node="input", port="image"), to=NodePort(node=f"blur_{suffix}", port="image")),
+            Link(from_=NodePort(node=f"blur_{suffix}", port="image"), to=NodePort(node=f"thresh_{suffix}", port="image")),
+            Link(from_=NodePort(node=f"thresh_{suffix}", port="image"), to=NodePort(node=f"view_{suffix}", port="image")),
+        ]
+    return Workflow(workflow_id="duplicated", nodes=nodes, links=links)
+
+
+@pytest.mark.asyncio
+async def test_identical_nodes_run_once(tmp_path):
+    """相同类型、参数和输入的节点只执行一次，每个节点仍报告状态和输出"""
+    import cv2
+    import numpy as np
+
+    path = tmp_path / "input.png"
+    cv2.imwrite(str(path), np.random.default_rng(0).integers(0, 256, (32, 32), dtype=np.uint8))
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+
+    plan = engine.compile(duplicated_branch_workflow(str(path)))
+    assert plan.steps["blur_b"].alias_of == "blur_a"
+    assert plan.steps["thresh_b"].alias_of == "thresh_a"
+    assert plan.steps["view_b"].alias_of == "view_a"
+
+    result = await engine.execute(duplicated_branch_workflow(str(path)), "run-cse")
+    assert result["status"] == RunStatus.COMPLETED
+    assert all(status == NodeStatus.SUCCESS for status in result["node_statuses"].values())
+    aliased = {log["node_id"] for log in result["logs"] if "复用其输出" in log["message"]}
+    assert aliased == {"blur_b", "thresh_b", "view_b"}
+    np.testing.assert_array_equal(
+        result["node_outputs"]["view_a"][0].value, result["node_outputs"]["view_b"][0].value
+    )
+
+
+@pytest.mark.asyncio
+async def test_progressive_run_generations(sleep_engine):
+    """渐进式运行依次产生代理结果和全分辨率结果"""
+    engine, _ = sleep_engine
+    result = await engine.execute_progressive(chain_workflow(2), "run-progressive", preview_scale=0.5)
+
+    assert result["status"] == RunStatus.COMPLETED
+    assert [g["preview_scale"] for g in result["generations"]] == [0.5, None]
+    assert [g["status"] for g in result["generations"]] == [RunStatus.COMPLETED] * 2
+    assert engine.get_run("run-progressive.0")["preview_scale"] == 0.5
+    assert result["preview_scale"] is None
+    assert set(result["node_outputs"]) == {"c1"}
+
+
+@pytest.mark.asyncio
+async def test_progressive_run_as_base_run(tmp_path):
+    """以渐进式运行作为基准运行时复用其最近完成的一代"""
+    import cv2
+    import numpy as np
+    from tests.test_fusion import chain_workflow as image_chain_workflow
+
+    path = tmp_path / "input.png"
+    cv2.imwrite(str(path), np.random.default_rng(0).integers(0, 256, (32, 32, 3), dtype=np.uint8))
+    registry = NodeRegistry()
+    registry.register_all()
+    engine = WorkflowEngine(registry)
+    workflow = image_chain_workflow(str(path), [("Grayscale", {})])
+
+    await engine.execute_progressive(workflow, "run-base")
+    result = await engine.execute(workflow, "run-inc", base_run_id="run-base")
+    assert result["status"] == RunStatus.COMPLETED
+    reused = {log["node_id"] for log in result["logs"] if log["message"] == "复用运行 run-base.1 的输出"}
+    assert reused == {"input", "n0", "view"}
+
+
+@pytest.mark.asyncio
+async def test_progressive_run_cancelled_on_edit(sleep_engine):
+    """全分辨率运行期间工作流被修改时取消，保留代理结果"""
+    engine, _ = sleep_engine
+    workflow = chain_workflow(3)
+    for node in workflow.nodes:
+        node.params["delay"] = 0.1
+    task = asyncio.create_task(engine.execute_progressive(workflow, "run-edit"))
+    while len((engine.get_run("run-edit") or {}).get("generations", [])) < 2:
+        await asyncio.sleep(0.01)
+
+    # 内容未变化的保存不取消
+    engine.cancel_stale_runs("chain", workflow_fingerprint(workflow))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+
+    engine.cancel_stale_runs("chain", "edited")
+    result = await task
+    assert result["status"] == RunStatus.CANCELLED
+    assert [g["status"] for g in result["generations"]] == [RunStatus.COMPLETED, RunStatus.CANCELLED]
+    assert engine.get_run("run-edit.1")["status"] == RunStatus.CANCELLED
+    assert result["preview_scale"] == 0.25
+    assert set(result["node_outputs"]) == {"c2"}